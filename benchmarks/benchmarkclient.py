@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Benchmarks MujinGraphClient and ProductionCycleOrderManager against a MockMujinController running in a separate process, reporting:
+#
+# - per-call latency percentiles of each GraphQL query, sync and async
+# - subscription lag, from writing an IO variable until the subscription delivers the new value
+# - order throughput and order latency percentiles through the production cycle order queue
+# - CPU time used by the client process in each benchmark
+#
+
+import argparse
+import asyncio
+import math
+import multiprocessing
+import time
+
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.mockcontroller import MockMujinController
+from mujinproductioncycleclient.multiqueueordermanager import MultiQueueOrderManager
+from mujinproductioncycleclient.ordermanager import ProductionCycleOrderManager
+from mujinproductioncycleclient.recorder import StreamRecorder
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _GetPercentile(sortedSamples, percentile):
+    """ Returns nearest-rank percentile of sorted samples.
+    """
+    index = max(0, min(len(sortedSamples) - 1, int(math.ceil(percentile / 100.0 * len(sortedSamples))) - 1))
+    return sortedSamples[index]
+
+def _PrintLatencies(name, latencies, wallTime, cpuTime):
+    """ Prints count, rate, latency percentiles in milliseconds and CPU use of a benchmark.
+    """
+    latencies = sorted(latencies)
+    print('%-40s n=%-6d %8.1f/s  p50=%7.3fms  p90=%7.3fms  p99=%7.3fms  max=%7.3fms  cpu=%5.1f%%' % (
+        name,
+        len(latencies),
+        len(latencies) / wallTime,
+        _GetPercentile(latencies, 50) * 1000,
+        _GetPercentile(latencies, 90) * 1000,
+        _GetPercentile(latencies, 99) * 1000,
+        latencies[-1] * 1000,
+        100.0 * cpuTime / wallTime,
+    ))
+
+async def _Measure(name, numCalls, callFunction):
+    """ Calls an async function numCalls times sequentially and prints its latencies.
+    """
+    latencies = []
+    startWallTime, startCpuTime = time.monotonic(), time.process_time()
+    for index in range(numCalls):
+        startTime = time.monotonic()
+        await callFunction(index)
+        latencies.append(time.monotonic() - startTime)
+    _PrintLatencies(name, latencies, time.monotonic() - startWallTime, time.process_time() - startCpuTime)
+
+async def _BenchmarkCalls(graphClient, numCalls):
+    """ Measures per-call latency of each GraphQL query.
+    """
+    loop = asyncio.get_running_loop()
+    await _Measure('SetControllerIOVariables', numCalls, lambda index: loop.run_in_executor(None, graphClient.SetControllerIOVariables, [('benchmarkValue', index)]))
+    await _Measure('SetControllerIOVariablesAsync', numCalls, lambda index: graphClient.SetControllerIOVariablesAsync([('benchmarkValue', index)]))
+    await _Measure('SetControllerIOVariablesBatched', numCalls, lambda index: graphClient.SetControllerIOVariablesBatched([('benchmarkValue', index)]))
+    await _Measure('GetControllerIOVariable', numCalls, lambda index: loop.run_in_executor(None, lambda: graphClient.GetControllerIOVariable('benchmarkValue', useCache=False)))
+    await _Measure('GetControllerIOVariableAsync', numCalls, lambda index: graphClient.GetControllerIOVariableAsync('benchmarkValue', useCache=False))
+    await _Measure('GetControllerIOVariables', numCalls, lambda index: loop.run_in_executor(None, lambda: graphClient.GetControllerIOVariables(['benchmarkValue', 'location1OrderReadPointer'], useCache=False)))
+    await _Measure('GetControllerIOVariablesAsync', numCalls, lambda index: graphClient.GetControllerIOVariablesAsync(['benchmarkValue', 'location1OrderReadPointer'], useCache=False))
+
+    # reads served from the read cache after a write, and from the subscription IO state
+    await _Measure('GetControllerIOVariableAsync cached', numCalls, lambda index: graphClient.GetControllerIOVariableAsync('benchmarkValue'))
+    await _Measure('GetControllerIOVariablesAsync cached', numCalls, lambda index: graphClient.GetControllerIOVariablesAsync(['benchmarkValue', 'location1OrderReadPointer']))
+
+    # concurrent async writes share pooled connections and get merged by the write batcher
+    startWallTime, startCpuTime = time.monotonic(), time.process_time()
+    latencies = []
+
+    async def _SetConcurrently(index):
+        startTime = time.monotonic()
+        await graphClient.SetControllerIOVariablesBatched([('benchmarkValue%d' % (index % 10), index)])
+        latencies.append(time.monotonic() - startTime)
+    await asyncio.gather(*[_SetConcurrently(index) for index in range(numCalls)])
+    _PrintLatencies('SetControllerIOVariablesBatched x%d' % numCalls, latencies, time.monotonic() - startWallTime, time.process_time() - startCpuTime)
+
+async def _BenchmarkSubscriptionLag(graphClient, numSamples):
+    """ Measures time from writing an IO variable until the subscription delivers its new value.
+    """
+    async def _WriteAndWait(index):
+        await graphClient.SetControllerIOVariablesAsync([('benchmarkCounter', index)])
+        await graphClient.WaitForIO('benchmarkCounter', lambda ioValue: ioValue == index)
+    await _Measure('write until subscription update', numSamples, _WriteAndWait)
+
+async def _BenchmarkOrders(graphClient, numOrders, numQueues):
+    """ Measures order throughput through order queues and order result queues.
+    """
+    if numQueues > 1:
+        orderManager = MultiQueueOrderManager(graphClient, queueIndices=range(1, numQueues + 1))
+    else:
+        orderManager = ProductionCycleOrderManager(graphClient)
+    await orderManager.InitializeOrderPointers()
+
+    # start production cycle
+    await graphClient.SetControllerIOVariablesAsync([('startProductionCycle', True)])
+    await graphClient.WaitForIO('isRunningProductionCycle')
+    await graphClient.SetControllerIOVariablesAsync([('startProductionCycle', False)])
+
+    async def _DequeueOrderResults():
+        while True:
+            await orderManager.WaitForOrderResult()
+            await orderManager.DequeueOrderResultsAsync()
+
+    dequeueTask = asyncio.ensure_future(_DequeueOrderResults())
+    try:
+        startWallTime, startCpuTime = time.monotonic(), time.process_time()
+        # submit all orders at once, submission pipeline keeps order queue full
+        resultFutures = await asyncio.gather(*[orderManager.SubmitOrder({
+            'orderUniqueId': 'benchmark%d_%d' % (int(startWallTime), index),
+            'orderNumber': 1,
+        }) for index in range(numOrders)])
+        await asyncio.gather(*resultFutures)
+        wallTime, cpuTime = time.monotonic() - startWallTime, time.process_time() - startCpuTime
+    finally:
+        dequeueTask.cancel()
+
+    print('%-40s n=%-6d %8.1f orders/s  cpu=%5.1f%%' % ('orders x%d queues' % numQueues, numOrders, numOrders / wallTime, 100.0 * cpuTime / wallTime))
+    for stageName, latencyStatistics in orderManager.orderTracker.GetLatencyStatistics().items():
+        print('  %-38s p50=%7.3fms  p90=%7.3fms  p99=%7.3fms' % ((stageName,) + tuple(latencyStatistics['percentiles'][percentile] * 1000 for percentile in (50, 90, 99))))
+
+def _RunMockController(options, urlQueue):
+    """ Runs mock controller until the process is terminated.
+    """
+    async def _Run():
+        mockController = MockMujinController(
+            numQueues=options.numQueues,
+            queueLength=options.queueLength,
+            requestDelay=options.requestDelay,
+            processingDelay=options.processingDelay,
+            publishInterval=options.publishInterval,
+        )
+        await mockController.Start()
+        urlQueue.put(mockController.url)
+        await asyncio.Event().wait()
+
+    logging.basicConfig(level=options.logLevel)
+    asyncio.run(_Run())
+
+async def _RunMain(options, url):
+    recorder = None
+    if options.recordPath:
+        recorder = StreamRecorder(options.recordPath, compressionLevel=options.recordCompressionLevel)
+    graphClient = MujinGraphClient(url, poolSize=options.poolSize, recorder=recorder)
+    subscriptionTask = asyncio.ensure_future(graphClient.SubscribeRobotBridgesState(reconnect=True))
+    try:
+        await graphClient.WaitForIO('isRunningProductionCycle', lambda ioValue: ioValue is not None, timeout=5)
+        await _BenchmarkCalls(graphClient, options.numCalls)
+        await _BenchmarkSubscriptionLag(graphClient, options.numCalls)
+        await _BenchmarkOrders(graphClient, options.numOrders, options.numQueues)
+        if options.printMetrics:
+            print(graphClient.metrics.FormatPrometheusText())
+    finally:
+        subscriptionTask.cancel()
+        await graphClient.CloseAsync()
+        if recorder is not None:
+            recorder.Close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the production cycle client against a mock controller')
+    parser.add_argument('--logLevel', type=str, default='WARNING', help='The python log level, e.g. DEBUG, VERBOSE, ERROR, INFO, WARNING, CRITICAL (default: %(default)s)')
+    parser.add_argument('--numCalls', type=int, default=500, help='Number of calls to measure for each query (default: %(default)s)')
+    parser.add_argument('--numOrders', type=int, default=1000, help='Number of orders to run through the order queue (default: %(default)s)')
+    parser.add_argument('--poolSize', type=int, default=10, help='Number of pooled connections of the client (default: %(default)s)')
+    parser.add_argument('--numQueues', type=int, default=1, help='Number of order queues to run orders through (default: %(default)s)')
+    parser.add_argument('--queueLength', type=int, default=100, help='Length of the mock order queue (default: %(default)s)')
+    parser.add_argument('--requestDelay', type=float, default=0, help='Seconds the mock controller takes to handle each request (default: %(default)s)')
+    parser.add_argument('--processingDelay', type=float, default=0, help='Seconds the mock controller takes to process each order (default: %(default)s)')
+    parser.add_argument('--publishInterval', type=float, default=0, help='Seconds between mock subscription messages, 0 to publish on each change (default: %(default)s)')
+    parser.add_argument('--printMetrics', action='store_true', default=False, help='Print client metrics in Prometheus text format after benchmarks')
+    parser.add_argument('--recordPath', type=str, default=None, help='Record subscription messages and GraphQL queries to recording files with this base path, for benchmarkreplay.py')
+    parser.add_argument('--recordCompressionLevel', type=int, default=None, help='zlib compression level of recorded payloads, none by default')
+    options = parser.parse_args()
+
+    logging.basicConfig(level=options.logLevel)
+
+    # run mock controller in its own process so it does not share the event loop or CPU time of the client
+    urlQueue = multiprocessing.Queue()
+    mockControllerProcess = multiprocessing.Process(target=_RunMockController, args=(options, urlQueue), daemon=True)
+    mockControllerProcess.start()
+    try:
+        asyncio.run(_RunMain(options, urlQueue.get(timeout=10)))
+    finally:
+        mockControllerProcess.terminate()
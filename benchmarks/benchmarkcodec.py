@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Microbenchmarks per-call encoding of GraphQL requests and decoding of responses and subscription messages, comparing:
+#
+# - building and json.dumps-ing the whole request envelope with the unminified query each call, as before
+# - GraphQLRequestTemplate encoding only the variables with each installed JSON library
+#
+
+import argparse
+import json
+import timeit
+
+from mujinproductioncycleclient import graphqlclient
+from mujinproductioncycleclient.jsoncodec import GraphQLRequestTemplate, JsonCodec
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _GetInstalledCodecs():
+    """ Returns JsonCodec of each installed JSON library.
+    """
+    codecs = []
+    for name in ('json', 'ujson', 'orjson'):
+        try:
+            codecs.append(JsonCodec(name))
+        except Exception:
+            pass
+    return codecs
+
+def _Measure(function, numCalls):
+    """ Returns microseconds per call of function, best of three runs.
+    """
+    return min(timeit.repeat(function, number=numCalls, repeat=3)) / numCalls * 1e6
+
+def _PrintResult(name, microseconds, baselineMicroseconds):
+    print('%-70s %8.2fus  %5.1fx' % (name, microseconds, baselineMicroseconds / microseconds))
+
+def _BenchmarkEncode(codecs, numIONames, numCalls):
+    """ Measures encoding of a SetControllerIOVariables request.
+    """
+    query = graphqlclient._setControllerIOVariablesQuery
+    variables = {'parameters': {'ioNameValues': [('productionQueue1Order[%d]' % index, {'orderUniqueId': 'order%d' % index, 'orderNumber': 1, 'orderPickLocationName': 'sc1'}) for index in range(numIONames)]}}
+    baseline = _Measure(lambda: json.dumps({'query': query, 'variables': variables}), numCalls)
+    _PrintResult('encode %d io json.dumps envelope' % numIONames, baseline, baseline)
+    for codec in codecs:
+        requestTemplate = GraphQLRequestTemplate('SetControllerIOVariables', query, codec)
+        _PrintResult('encode %d io template %s' % (numIONames, codec.name), _Measure(lambda: requestTemplate.Encode(variables), numCalls), baseline)
+    print('  request bytes: envelope %d, template %d' % (len(json.dumps({'query': query, 'variables': variables})), len(requestTemplate.Encode(variables))))
+
+def _BenchmarkDecode(codecs, name, data, numCalls):
+    """ Measures decoding of JSON bytes.
+    """
+    baseline = _Measure(lambda: json.loads(data), numCalls)
+    _PrintResult('decode %s json.loads' % name, baseline, baseline)
+    for codec in codecs:
+        _PrintResult('decode %s %s' % (name, codec.name), _Measure(lambda: codec.Loads(data), numCalls), baseline)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Microbenchmarks JSON encoding and decoding of the production cycle client')
+    parser.add_argument('--numCalls', type=int, default=20000, help='Number of calls to measure for each case (default: %(default)s)')
+    parser.add_argument('--numSignals', type=int, default=300, help='Number of IO signals in subscription messages (default: %(default)s)')
+    options = parser.parse_args()
+
+    codecs = _GetInstalledCodecs()
+    print('installed JSON libraries: %s' % ', '.join(codec.name for codec in codecs))
+
+    _BenchmarkEncode(codecs, 1, options.numCalls)
+    _BenchmarkEncode(codecs, 10, options.numCalls)
+
+    response = json.dumps({'data': {'CommandRobotBridges': {'location1OrderReadPointer': 3, 'location1OrderWritePointer': 5}}}).encode('utf-8')
+    _BenchmarkDecode(codecs, 'response', response, options.numCalls)
+
+    ioValues = dict(('signal%d' % index, index if index % 3 else 'value%d' % index) for index in range(options.numSignals))
+    message = json.dumps({'type': 'data', 'id': '1', 'payload': {'data': {'SubscribeRobotBridgesState': {'sentiovalues': ioValues, 'receivediovalues': ioValues}}}}).encode('utf-8')
+    _BenchmarkDecode(codecs, 'subscription message (%d signals, %d bytes)' % (options.numSignals, len(message)), message, max(1, options.numCalls // 10))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Replays a recording made with StreamRecorder, e.g. by benchmarkclient.py --recordPath, into a MujinGraphClient, reporting:
+#
+# - number of recorded subscription messages and GraphQL queries per operation, and their recorded request latencies
+# - replay throughput, and how far replay fell behind the recorded pace
+# - time to apply each subscription message to the IO state and notify IO change callbacks
+#
+
+import argparse
+import asyncio
+import collections
+import json
+import math
+import time
+
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.metrics import MetricType
+from mujinproductioncycleclient.recorder import ReadRecording, RecordType, StreamReplayer
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _GetPercentile(sortedSamples, percentile):
+    """ Returns nearest-rank percentile of sorted samples.
+    """
+    index = max(0, min(len(sortedSamples) - 1, int(math.ceil(percentile / 100.0 * len(sortedSamples))) - 1))
+    return sortedSamples[index]
+
+def _PrintPercentiles(name, samples):
+    """ Prints count and exact percentiles in milliseconds of raw samples in seconds.
+    """
+    samples = sorted(samples)
+    print('%-40s n=%-6d p50=%7.3fms  p90=%7.3fms  p99=%7.3fms  max=%7.3fms' % ((name, len(samples)) + tuple(_GetPercentile(samples, percentile) * 1000 for percentile in (50, 90, 99)) + (samples[-1] * 1000,)))
+
+def _PrintRecordingSummary(recordPath):
+    """ Prints counts of recorded records and recorded latency of GraphQL queries per operation.
+    """
+    numSubscriptionMessages = 0
+    requestLatencies = collections.defaultdict(list) # mapping of operation name to recorded latencies in seconds
+    pendingRequests = collections.deque() # tuple(operationName, timestamp) of requests not matched with a response yet
+    for recordType, timestamp, payload in ReadRecording(recordPath):
+        if recordType == RecordType.SubscriptionMessage:
+            numSubscriptionMessages += 1
+        elif recordType == RecordType.GraphQLRequest:
+            query = json.loads(payload)['query']
+            operationName = query.split('(', 1)[0].split()[-1]
+            pendingRequests.append((operationName, timestamp))
+        elif recordType == RecordType.GraphQLResponse and pendingRequests:
+            # concurrent queries are matched to responses in order, so latencies are approximate
+            operationName, requestTimestamp = pendingRequests.popleft()
+            requestLatencies[operationName].append(timestamp - requestTimestamp)
+    print('%-40s n=%d' % ('subscription messages', numSubscriptionMessages))
+    for operationName, latencies in sorted(requestLatencies.items()):
+        _PrintPercentiles(operationName, latencies)
+
+async def _Replay(options):
+    graphClient = MujinGraphClient(options.url)
+    numChanges = [0]
+
+    def _OnIOChanged(changedIoNameValues):
+        numChanges[0] += len(changedIoNameValues)
+    graphClient.RegisterIOChangeCallback(options.watch, _OnIOChanged)
+
+    # keep raw apply durations, as client histograms only resolve bucket bounds
+    applyDurations = []
+
+    def _OnObservation(metricType, name, value, labels):
+        if metricType == MetricType.Histogram and name == 'subscription_apply_duration_seconds':
+            applyDurations.append(value)
+    graphClient.metrics.AddSink(_OnObservation)
+    try:
+        replayer = StreamReplayer(options.recordPath, speed=options.speed or None)
+        startWallTime, startCpuTime = time.monotonic(), time.process_time()
+        numMessages = await replayer.Replay(graphClient)
+        wallTime, cpuTime = time.monotonic() - startWallTime, time.process_time() - startCpuTime
+        print('%-40s n=%-6d %8.1f/s  cpu=%5.1f%%  maxLag=%.3fms  ioChanges=%d' % ('replay', numMessages, numMessages / wallTime, 100.0 * cpuTime / wallTime, replayer.maxLag * 1000, numChanges[0]))
+        if applyDurations:
+            _PrintPercentiles('apply', applyDurations)
+    finally:
+        await graphClient.CloseAsync()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replays a recording of subscription messages into the production cycle client')
+    parser.add_argument('recordPath', type=str, help='Base path of recording files')
+    parser.add_argument('--logLevel', type=str, default='WARNING', help='The python log level, e.g. DEBUG, VERBOSE, ERROR, INFO, WARNING, CRITICAL (default: %(default)s)')
+    parser.add_argument('--speed', type=float, default=0, help='Factor by which replay is faster than recorded pace, 0 to replay as fast as possible (default: %(default)s)')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1', help='URL of Mujin controller GraphQL queries made during replay go to (default: %(default)s)')
+    parser.add_argument('--watch', type=str, nargs='*', default=['*'], help='IO names or glob patterns to register an IO change callback for (default: %(default)s)')
+    options = parser.parse_args()
+
+    logging.basicConfig(level=options.logLevel)
+
+    _PrintRecordingSummary(options.recordPath)
+    asyncio.run(_Replay(options))
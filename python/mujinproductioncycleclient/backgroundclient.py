@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+from .graphqlclient import MujinGraphClient, SubscriptionState
+from .ordermanager import ProductionCycleOrderManager
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class MujinBackgroundClient(object):
+    """ Runs a MujinGraphClient and its IO subscription on a dedicated background thread and event loop, for synchronous hosts without an asyncio event loop
+    such as PLC gateways and web services. Methods are thread-safe and block the calling thread, IO state is read without locking or round trip to the background thread.
+    """
+
+    _graphClientKwargs = None # dict of keyword arguments to create MujinGraphClient with
+    _minReconnectDelay = None # seconds to wait before first subscription reconnect attempt
+    _maxReconnectDelay = None # maximum seconds to wait between subscription reconnect attempts
+
+    _loop = None # asyncio event loop run by background thread, created by Start
+    _thread = None # threading.Thread running event loop, created by Start
+    _graphClient = None # MujinGraphClient owned by background thread, created by Start
+    _subscriptionTask = None # asyncio.Task running subscription on background thread
+
+    def __init__(self, url='http://127.0.0.1', username='mujin', password='mujin', minReconnectDelay=0.1, maxReconnectDelay=10.0, **graphClientKwargs):
+        """
+        Args:
+            url (str): URL of Mujin controller, e.g. http://127.0.0.1
+            username (str): Username to login with.
+            password (str): Password to login with.
+            minReconnectDelay (float): Seconds to wait before first subscription reconnect attempt.
+            maxReconnectDelay (float): Maximum seconds to wait between subscription reconnect attempts.
+            graphClientKwargs: Other keyword arguments of MujinGraphClient, such as poolSize or readCacheTtls.
+        """
+        self._graphClientKwargs = dict(graphClientKwargs, url=url, username=username, password=password)
+        self._minReconnectDelay = minReconnectDelay
+        self._maxReconnectDelay = maxReconnectDelay
+
+    @property
+    def graphClient(self):
+        """ MujinGraphClient running on background thread. Its methods must only be called on the background thread, e.g. through RunCoroutine.
+        """
+        return self._graphClient
+
+    @property
+    def metrics(self):
+        """ ClientMetrics of MujinGraphClient.
+        """
+        return self._graphClient.metrics
+
+    @property
+    def isRunning(self):
+        """ Whether background thread is running.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def Start(self):
+        """ Starts background thread and event loop, creates MujinGraphClient on it and starts its subscription, reconnecting whenever it fails.
+        Use WaitForConnection to wait until IO state is fresh.
+        """
+        if self._thread is not None:
+            raise Exception('Background client is already started')
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._RunLoop, name='MujinBackgroundClient', daemon=True)
+        self._thread.start()
+        try:
+            self.RunCoroutine(self._StartAsync())
+        except Exception:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+            self._loop = None
+            raise
+
+    async def _StartAsync(self):
+        self._graphClient = MujinGraphClient(**self._graphClientKwargs)
+        self._subscriptionTask = asyncio.ensure_future(self._graphClient.SubscribeRobotBridgesState(reconnect=True, minReconnectDelay=self._minReconnectDelay, maxReconnectDelay=self._maxReconnectDelay))
+
+    def _RunLoop(self):
+        """ Runs event loop on background thread until Stop.
+        """
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def Stop(self):
+        """ Stops subscription, closes connections and stops background thread.
+        """
+        if self._thread is None:
+            return
+        try:
+            self.RunCoroutine(self._StopAsync())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+            self._loop = None
+
+    async def _StopAsync(self):
+        if self._subscriptionTask is not None:
+            self._subscriptionTask.cancel()
+            await asyncio.gather(self._subscriptionTask, return_exceptions=True)
+            self._subscriptionTask = None
+        await self._graphClient.CloseAsync()
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.Stop()
+
+    def RunCoroutine(self, coroutine):
+        """ Runs a coroutine on the background event loop and blocks until it completes.
+
+        Args:
+            coroutine (coroutine): Coroutine to run, e.g. created by an async method of graphClient.
+
+        Returns:
+            Result of coroutine.
+        """
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise Exception('Cannot block background thread waiting for itself, await the coroutine instead')
+        if not self.isRunning:
+            coroutine.close()
+            raise Exception('Background client is not running')
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _CallOnLoop(self, function, *args):
+        """ Calls a function on the background thread and blocks until it returns.
+        """
+        async def _Call():
+            return function(*args)
+        return self.RunCoroutine(_Call())
+
+    @property
+    def subscriptionState(self):
+        """ Connection state of the IO subscription, one of SubscriptionState values.
+        """
+        return self._graphClient.subscriptionState
+
+    @property
+    def ioState(self):
+        """ Latest IOStateSnapshot. Snapshots are immutable and replaced as a whole, so they can be read from any thread without locking.
+        """
+        return self._graphClient.ioState
+
+    @property
+    def receivedIoMap(self):
+        """ Read-only mapping of IO name to IO value of last received receivediovalues.
+        """
+        return self._graphClient.ioState.receivedIoMap
+
+    @property
+    def sentIoMap(self):
+        """ Read-only mapping of IO name to IO value of last received sentiovalues.
+        """
+        return self._graphClient.ioState.sentIoMap
+
+    def GetIOValue(self, ioName, defaultValue=None):
+        """ Looks up IO value in latest IO state, sent IO values first, then received IO values.
+
+        Args:
+            ioName (str): Name of IO variable.
+            defaultValue: Value to return when IO variable is in neither map.
+
+        Returns:
+            Value of IO variable.
+        """
+        return self._graphClient.ioState.GetIOValue(ioName, defaultValue)
+
+    def WaitForConnection(self, timeout=None):
+        """ Blocks until the subscription is connected and IO state is fresh.
+
+        Args:
+            timeout (float): Seconds to wait before raising asyncio.TimeoutError. None to wait forever.
+        """
+        self.RunCoroutine(self._WaitForConnectionAsync(timeout))
+
+    async def _WaitForConnectionAsync(self, timeout):
+        future = asyncio.get_running_loop().create_future()
+
+        def _Notify(subscriptionState):
+            if subscriptionState == SubscriptionState.Connected and not future.done():
+                future.set_result(None)
+        if self._graphClient.subscriptionState == SubscriptionState.Connected:
+            return
+        self._graphClient.RegisterSubscriptionStateCallback(_Notify)
+        try:
+            await asyncio.wait_for(future, timeout)
+        finally:
+            self._graphClient.UnregisterSubscriptionStateCallback(_Notify)
+
+    def WaitForIO(self, ioName, predicate=bool, timeout=None):
+        """ Blocks until the value of an IO variable satisfies predicate.
+
+        Args:
+            ioName (str): IO name to watch. Sent IO values take precedence over received IO values of same name.
+            predicate (callable): Called on background thread with IO value, returns True when done waiting. Defaults to waiting for truthy value.
+            timeout (float): Seconds to wait before raising asyncio.TimeoutError. None to wait forever.
+
+        Returns:
+            Value of IO variable satisfying predicate.
+        """
+        return self.RunCoroutine(self._graphClient.WaitForIO(ioName, predicate=predicate, timeout=timeout))
+
+    def WaitForAnyChange(self, ioNames, timeout=None):
+        """ Blocks until a subscription message changes the value of any of the given IO variables.
+
+        Args:
+            ioNames (list(str)): IO names or glob patterns of IO names to watch.
+            timeout (float): Seconds to wait before raising asyncio.TimeoutError. None to wait forever.
+
+        Returns:
+            dict: Mapping of changed IO name to new IO value.
+        """
+        return self.RunCoroutine(self._graphClient.WaitForAnyChange(ioNames, timeout=timeout))
+
+    def RegisterIOChangeCallback(self, ioNames, callbackFunction):
+        """ Registers a function called on the background thread whenever any of the given IO variables changes. It must not block.
+
+        Args:
+            ioNames (list(str)): IO names or glob patterns of IO names to watch.
+            callbackFunction (callable): Called with dict mapping changed IO name to new IO value.
+        """
+        self._CallOnLoop(self._graphClient.RegisterIOChangeCallback, ioNames, callbackFunction)
+
+    def UnregisterIOChangeCallback(self, callbackFunction):
+        """ Unregisters a function registered with RegisterIOChangeCallback.
+        """
+        self._CallOnLoop(self._graphClient.UnregisterIOChangeCallback, callbackFunction)
+
+    def GetControllerIOVariable(self, ioName, useCache=True, timeout=None):
+        """ Gets single IO variable, see MujinGraphClient.GetControllerIOVariable.
+        """
+        return self.RunCoroutine(self._graphClient.GetControllerIOVariableAsync(ioName, useCache=useCache, timeout=timeout))
+
+    def GetControllerIOVariables(self, ioNames, useCache=True, timeout=None):
+        """ Gets multiple IO variables, see MujinGraphClient.GetControllerIOVariables.
+        """
+        return self.RunCoroutine(self._graphClient.GetControllerIOVariablesAsync(ioNames, useCache=useCache, timeout=timeout))
+
+    def SetControllerIOVariables(self, ioNameValues):
+        """ Sets IO variables to Mujin controller, merged with writes of other threads made within the write batch window.
+
+        Args:
+            ioNameValues (list(tuple(ioName, ioValue))): List of tuple(ioName, ioValue) for IO variables to set
+        """
+        self.RunCoroutine(self._SetControllerIOVariablesAsync(ioNameValues))
+
+    async def _SetControllerIOVariablesAsync(self, ioNameValues):
+        await self._graphClient.SetControllerIOVariablesBatched(ioNameValues)
+
+    def CreateOrderManager(self, queueIndex=1, maxPendingOrders=100, orderTracker=None, timeout=5, orderJournal=None):
+        """ Creates ProductionCycleOrderManager of an order queue on the background thread and initializes its order queue pointers.
+
+        Args:
+            queueIndex (int): Index of order queue, starting from 1.
+            maxPendingOrders (int): Maximum number of orders waiting for a free order queue slot in SubmitOrder.
+            orderTracker (OrderTracker): Tracker recording order lifecycle timestamps, can be shared by several managers. Defaults to a new OrderTracker.
+            timeout (float): Seconds to wait for valid order queue pointers.
+            orderJournal (OrderJournal): Journal of in-flight orders recovered after a restart. None to not journal orders.
+
+        Returns:
+            BackgroundOrderManager: Thread-safe order manager.
+        """
+        return self.RunCoroutine(self._CreateOrderManagerAsync(queueIndex, maxPendingOrders, orderTracker, timeout, orderJournal))
+
+    async def _CreateOrderManagerAsync(self, queueIndex, maxPendingOrders, orderTracker, timeout, orderJournal):
+        orderManager = ProductionCycleOrderManager(self._graphClient, queueIndex=queueIndex, maxPendingOrders=maxPendingOrders, orderTracker=orderTracker, orderJournal=orderJournal)
+        await orderManager.InitializeOrderPointers(timeout=timeout)
+        return BackgroundOrderManager(self, orderManager)
+
+
+class BackgroundOrderManager(object):
+    """ Thread-safe blocking facade of a ProductionCycleOrderManager running on the background thread of a MujinBackgroundClient. Created by MujinBackgroundClient.CreateOrderManager.
+    """
+
+    _backgroundClient = None # MujinBackgroundClient running orderManager
+    _orderManager = None # ProductionCycleOrderManager owned by background thread
+
+    def __init__(self, backgroundClient, orderManager):
+        self._backgroundClient = backgroundClient
+        self._orderManager = orderManager
+
+    @property
+    def orderManager(self):
+        """ ProductionCycleOrderManager running on background thread. Its methods must only be called on the background thread.
+        """
+        return self._orderManager
+
+    @property
+    def orderTracker(self):
+        """ OrderTracker recording lifecycle timestamps of orders queued through this manager.
+        """
+        return self._orderManager.orderTracker
+
+    @property
+    def numQueuedOrders(self):
+        """ Number of order entries written to the order queue and not yet picked up by Mujin controller.
+        """
+        return self._orderManager.numQueuedOrders
+
+    @property
+    def numFreeOrderSlots(self):
+        """ Number of order entries that can be queued before the order queue is full.
+        """
+        return self._orderManager.numFreeOrderSlots
+
+    @property
+    def numUnreadOrderResults(self):
+        """ Number of result entries in order result queue not yet dequeued.
+        """
+        return self._orderManager.numUnreadOrderResults
+
+    def QueueOrder(self, orderEntry):
+        """ Queues an order entry to the order queue, blocking until Mujin controller acknowledges the write.
+
+        Args:
+            orderEntry (dict): Order information to queue to the system.
+        """
+        self._backgroundClient.RunCoroutine(self._orderManager.QueueOrderAsync(orderEntry))
+
+    def QueueOrders(self, orderEntries):
+        """ Queues as many order entries as fit in the order queue with a single request.
+
+        Args:
+            orderEntries (list(dict)): Order information to queue to the system, in queuing order.
+
+        Returns:
+            list(dict): Order entries not accepted because order queue is full, in queuing order.
+        """
+        return self._backgroundClient.RunCoroutine(self._orderManager.QueueOrdersAsync(orderEntries))
+
+    def DequeueOrderResult(self):
+        """ Dequeues next result entry in order result queue.
+
+        Returns:
+            dict: Order result information. None if there is no result entry to be read.
+        """
+        return self._backgroundClient.RunCoroutine(self._orderManager.DequeueOrderResultAsync())
+
+    def DequeueOrderResults(self, maxCount=None):
+        """ Dequeues all readable result entries in order result queue with a single read and a single read pointer update.
+
+        Args:
+            maxCount (int): Maximum number of result entries to dequeue. None to dequeue all readable result entries.
+
+        Returns:
+            list(dict): Order result information in order result queue order.
+        """
+        return self._backgroundClient.RunCoroutine(self._orderManager.DequeueOrderResultsAsync(maxCount))
+
+    def WaitForOrderResult(self, timeout=None):
+        """ Blocks until order result queue has a result entry to be read.
+
+        Args:
+            timeout (float): Seconds to wait before raising asyncio.TimeoutError. None to wait forever.
+        """
+        self._backgroundClient.RunCoroutine(self._orderManager.WaitForOrderResult(timeout=timeout))
+
+    def Close(self):
+        """ Unregisters gauges and IO change callbacks of the order manager on the background thread. Call when the order manager is no longer used.
+        """
+        self._backgroundClient.RunCoroutine(self._CloseAsync())
+
+    async def _CloseAsync(self):
+        self._orderManager.Close()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from .errors import CircuitOpenError
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class CircuitState(object):
+    """ States of a circuit breaker.
+    """
+    Closed = 'Closed'     # requests are sent
+    Open = 'Open'         # requests fail fast with CircuitOpenError until resetTimeout passes
+    HalfOpen = 'HalfOpen' # one trial request is sent, closing the circuit on success and opening it again on failure, another one if it ends without outcome
+
+
+class CircuitBreaker(object):
+    """ Fails requests to an unhealthy Mujin controller fast instead of letting each one wait for its deadline. Opens after failureThreshold consecutive
+    failures, and lets one trial request through every resetTimeout seconds until one succeeds. Thread-safe.
+    """
+
+    _name = None # name of protected Mujin controller used in errors and logs, such as its URL
+    _failureThreshold = None # number of consecutive failures opening the circuit
+    _resetTimeout = None # seconds the circuit stays open before letting a trial request through
+    _lock = None # threading.Lock protecting state, as sync requests may run on several threads
+    _state = None # CircuitState value
+    _numConsecutiveFailures = None # number of failures since last success
+    _openedTime = None # time.monotonic() when the circuit last opened, or the last trial request started
+    _isTrialRunning = False # whether the trial request of a half open circuit is running
+
+    def __init__(self, name, failureThreshold=5, resetTimeout=5.0):
+        """
+        Args:
+            name (str): Name of protected Mujin controller used in errors and logs, such as its URL.
+            failureThreshold (int): Number of consecutive failures opening the circuit.
+            resetTimeout (float): Seconds the circuit stays open before letting a trial request through.
+        """
+        self._name = name
+        self._failureThreshold = failureThreshold
+        self._resetTimeout = resetTimeout
+        self._lock = threading.Lock()
+        self._state = CircuitState.Closed
+        self._numConsecutiveFailures = 0
+
+    @property
+    def state(self):
+        """ CircuitState value.
+        """
+        return self._state
+
+    def BeforeRequest(self):
+        """ Checks whether a request may be sent.
+
+        Returns:
+            bool: Whether the request is the trial request of a half open circuit, which has to end with RecordSuccess, RecordFailure or ReleaseTrial.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with a trial request already running.
+        """
+        if self._state == CircuitState.Closed:
+            return False
+        with self._lock:
+            if self._state == CircuitState.Closed:
+                return False
+            now = time.monotonic()
+            if (self._state == CircuitState.Open or self._isTrialRunning) and now < self._openedTime + self._resetTimeout:
+                raise CircuitOpenError('Circuit breaker of %s is open after %d consecutive failures' % (self._name, self._numConsecutiveFailures))
+            # let one trial request through, and another one if it does not complete within resetTimeout or ends without outcome
+            if self._state == CircuitState.Open:
+                log.info('circuit breaker of %s is half open, sending trial request', self._name)
+            self._state = CircuitState.HalfOpen
+            self._openedTime = now
+            self._isTrialRunning = True
+            return True
+
+    def ReleaseTrial(self):
+        """ Records that the trial request ended without outcome, e.g. because it was cancelled or its deadline passed before sending it, so that
+        the next request becomes the trial request right away.
+        """
+        with self._lock:
+            self._isTrialRunning = False
+
+    def RecordSuccess(self):
+        """ Records a successful request, closing the circuit.
+        """
+        if self._state == CircuitState.Closed and self._numConsecutiveFailures == 0:
+            return
+        with self._lock:
+            if self._state != CircuitState.Closed:
+                log.info('circuit breaker of %s is closed', self._name)
+            self._state = CircuitState.Closed
+            self._numConsecutiveFailures = 0
+            self._isTrialRunning = False
+
+    def RecordFailure(self):
+        """ Records a failed request, opening the circuit when the trial request failed or failureThreshold consecutive requests failed.
+        """
+        with self._lock:
+            self._numConsecutiveFailures += 1
+            if self._state == CircuitState.HalfOpen or (self._state == CircuitState.Closed and self._numConsecutiveFailures >= self._failureThreshold):
+                if self._state == CircuitState.Closed:
+                    log.warning('circuit breaker of %s is open after %d consecutive failures', self._name, self._numConsecutiveFailures)
+                self._state = CircuitState.Open
+                self._openedTime = time.monotonic()
+            self._isTrialRunning = False
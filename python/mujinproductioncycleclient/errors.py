@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class ControllerError(Exception):
+    """ Base of errors communicating with Mujin controller.
+    """
+
+
+class ControllerTimeoutError(ControllerError):
+    """ Request did not complete before its deadline. For writes, whether Mujin controller applied them is unknown.
+    """
+
+
+class ControllerConnectionError(ControllerError):
+    """ Connection to Mujin controller failed.
+    """
+
+    isRequestSent = None # whether the request may have reached Mujin controller before the connection failed, False if connecting failed
+
+    def __init__(self, message, isRequestSent=True):
+        super(ControllerConnectionError, self).__init__(message)
+        self.isRequestSent = isRequestSent
+
+
+class ControllerResponseError(ControllerError):
+    """ Mujin controller returned an error status, an invalid response, or GraphQL errors.
+    """
+
+    statusCode = None # HTTP status code of response
+    response = None # decoded JSON response, None if not decodable
+
+    def __init__(self, message, statusCode=200, response=None):
+        super(ControllerResponseError, self).__init__(message)
+        self.statusCode = statusCode
+        self.response = response
+
+
+class CircuitOpenError(ControllerError):
+    """ Request was not sent because the circuit breaker of Mujin controller is open after consecutive failures.
+    """
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import aiohttp
+
+from .graphqlclient import MujinGraphClient, SubscriptionState
+from .metrics import ClientMetrics, Histogram
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class MujinFleetClient(object):
+    """ Runs MujinGraphClients of many Mujin controllers on one event loop. Async GraphQL queries of all controllers share one connection pool
+    bounded per host, and each controller keeps its own supervised subscription, so a failing controller does not stall the others.
+    """
+
+    _controllers = None # list of dict configuring controllers, each with controllerName, url, and optional username and password
+    _poolSizePerHost = None # maximum number of pooled keep-alive connections to each Mujin controller
+    _maxConnections = None # maximum number of connections to all Mujin controllers, 0 for no limit
+    _defaultTimeout = None # seconds each controller has to complete a fanned out operation, None for no deadline
+    _minReconnectDelay = None # seconds to wait before first subscription reconnect attempt
+    _maxReconnectDelay = None # maximum seconds to wait between subscription reconnect attempts
+
+    _metrics = None # ClientMetrics shared by clients of all controllers
+    _asyncSession = None # aiohttp.ClientSession shared by clients of all controllers, created by Start
+    _clients = None # dict mapping controller name to MujinGraphClient, created by Start
+    _subscriptionTasks = None # dict mapping controller name to asyncio.Task running its subscription
+
+    def __init__(self, controllers, poolSizePerHost=4, maxConnections=0, defaultTimeout=5.0, minReconnectDelay=0.1, maxReconnectDelay=10.0, metrics=None):
+        """
+        Args:
+            controllers (list(dict)): Controllers to connect to, each with controllerName, url, and optional username and password.
+            poolSizePerHost (int): Maximum number of pooled keep-alive connections to each Mujin controller.
+            maxConnections (int): Maximum number of connections to all Mujin controllers, 0 for no limit.
+            defaultTimeout (float): Seconds each controller has to complete a fanned out operation, None for no deadline.
+            minReconnectDelay (float): Seconds to wait before first subscription reconnect attempt.
+            maxReconnectDelay (float): Maximum seconds to wait between subscription reconnect attempts.
+            metrics (ClientMetrics): Metrics shared by clients of all controllers. Defaults to a new ClientMetrics.
+        """
+        self._controllers = list(controllers)
+        controllerNames = [controller['controllerName'] for controller in self._controllers]
+        if len(set(controllerNames)) != len(controllerNames):
+            raise Exception('Controller names are not unique: %r' % controllerNames)
+        self._poolSizePerHost = poolSizePerHost
+        self._maxConnections = maxConnections
+        self._defaultTimeout = defaultTimeout
+        self._minReconnectDelay = minReconnectDelay
+        self._maxReconnectDelay = maxReconnectDelay
+        self._metrics = metrics or ClientMetrics()
+        self._clients = {}
+        self._subscriptionTasks = {}
+        self._metrics.RegisterGauge('fleet_controllers', lambda: len(self._clients), helpText='Number of controllers in the fleet.')
+        self._metrics.RegisterGauge('fleet_connected_controllers', lambda: self.numConnectedControllers, helpText='Number of controllers in the fleet with connected and fresh IO subscription.')
+
+    @property
+    def metrics(self):
+        """ ClientMetrics shared by clients of all controllers, labelled by controller url.
+        """
+        return self._metrics
+
+    @property
+    def controllerNames(self):
+        """ Names of controllers in the fleet.
+        """
+        return [controller['controllerName'] for controller in self._controllers]
+
+    @property
+    def numConnectedControllers(self):
+        """ Number of controllers with connected and fresh IO subscription.
+        """
+        return sum(1 for client in self._clients.values() if client.subscriptionState == SubscriptionState.Connected)
+
+    def GetClient(self, controllerName):
+        """ Returns MujinGraphClient of a controller. Available once started.
+        """
+        return self._clients[controllerName]
+
+    async def Start(self):
+        """ Creates clients of all controllers and starts their subscriptions.
+        """
+        self._asyncSession = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._maxConnections, limit_per_host=self._poolSizePerHost))
+        for controller in self._controllers:
+            controllerName = controller['controllerName']
+            client = MujinGraphClient(
+                url=controller['url'],
+                username=controller.get('username', 'mujin'),
+                password=controller.get('password', 'mujin'),
+                poolSize=self._poolSizePerHost,
+                metrics=self._metrics,
+                asyncSession=self._asyncSession,
+            )
+            self._clients[controllerName] = client
+            subscriptionTask = asyncio.ensure_future(client.SubscribeRobotBridgesState(reconnect=True, minReconnectDelay=self._minReconnectDelay, maxReconnectDelay=self._maxReconnectDelay))
+            subscriptionTask.add_done_callback(lambda task, controllerName=controllerName: self._OnSubscriptionDone(controllerName, task))
+            self._subscriptionTasks[controllerName] = subscriptionTask
+
+    async def Stop(self):
+        """ Stops subscriptions and closes connections of all controllers.
+        """
+        subscriptionTasks = list(self._subscriptionTasks.values())
+        self._subscriptionTasks = {}
+        for subscriptionTask in subscriptionTasks:
+            subscriptionTask.cancel()
+        await asyncio.gather(*subscriptionTasks, return_exceptions=True)
+        for client in self._clients.values():
+            await client.CloseAsync()
+        self._clients = {}
+        if self._asyncSession is not None:
+            await self._asyncSession.close()
+            self._asyncSession = None
+
+    async def __aenter__(self):
+        await self.Start()
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        await self.Stop()
+
+    def _OnSubscriptionDone(self, controllerName, subscriptionTask):
+        """ Logs subscriptions that stopped other than by Stop.
+        """
+        if subscriptionTask.cancelled():
+            return
+        exception = subscriptionTask.exception()
+        if exception is not None:
+            log.error('subscription of controller "%s" stopped: %s', controllerName, exception)
+        else:
+            log.warning('subscription of controller "%s" stopped', controllerName)
+
+    async def RunOnControllers(self, function, timeout=None, controllerNames=None):
+        """ Calls an async function with the client of each controller concurrently, each controller with its own deadline.
+        Failures and timeouts of a controller do not affect results of the others.
+
+        Args:
+            function (callable): Called with MujinGraphClient, returns an awaitable.
+            timeout (float): Seconds each controller has to complete. None to use defaultTimeout.
+            controllerNames (list(str)): Names of controllers to run on. None for all controllers.
+
+        Returns:
+            dict: Mapping of controller name to result, or to raised Exception, asyncio.TimeoutError if deadline passed.
+        """
+        if timeout is None:
+            timeout = self._defaultTimeout
+        if controllerNames is None:
+            controllerNames = self.controllerNames
+        results = await asyncio.gather(*[asyncio.wait_for(function(self._clients[controllerName]), timeout) for controllerName in controllerNames], return_exceptions=True)
+        return dict(zip(controllerNames, results))
+
+    async def GetControllerIOVariablesAsync(self, ioNames, timeout=None, controllerNames=None):
+        """ Reads IO variables of each controller concurrently, each controller with its own deadline.
+
+        Args:
+            ioNames (list(str)): Names of IO variables to read from each controller.
+            timeout (float): Seconds each controller has to complete. None to use defaultTimeout.
+            controllerNames (list(str)): Names of controllers to read from. None for all controllers.
+
+        Returns:
+            dict: Mapping of controller name to dict mapping IO name to IO value, or to raised Exception.
+        """
+        return await self.RunOnControllers(lambda client: client.GetControllerIOVariablesAsync(ioNames), timeout=timeout, controllerNames=controllerNames)
+
+    def GetIOValues(self, ioNames, controllerNames=None):
+        """ Returns IO values of each controller from its subscription without sending requests.
+
+        Args:
+            ioNames (list(str)): Names of IO variables. Sent IO values take precedence over received IO values of same name.
+            controllerNames (list(str)): Names of controllers. None for all controllers.
+
+        Returns:
+            dict: Mapping of controller name to dict mapping IO name to IO value. Values are stale while GetClient(controllerName).ioState.isStale.
+        """
+        if controllerNames is None:
+            controllerNames = self.controllerNames
+        ioValues = {}
+        for controllerName in controllerNames:
+            ioState = self._clients[controllerName].ioState
+            ioValues[controllerName] = dict((ioName, ioState.GetIOValue(ioName)) for ioName in ioNames)
+        return ioValues
+
+    def GetFleetStatistics(self, percentiles=(50, 90, 99)):
+        """ Aggregates statistics of all controllers in the fleet.
+
+        Args:
+            percentiles (list(float)): Percentiles of GraphQL request latency to estimate, between 0 and 100.
+
+        Returns:
+            dict: numControllers, numConnectedControllers, subscriptionStates mapping controller name to SubscriptionState value,
+            numRequests, numRequestErrors, numSubscriptionMessages, numSubscriptionFailures, and requestLatencyPercentiles mapping percentile to
+            upper bound of latency histogram bucket in seconds, None if there were no requests.
+        """
+        urls = set(controller['url'] for controller in self._controllers)
+
+        def _SumCounter(name):
+            return sum(value for labels, value in self._metrics.GetCounterValues(name) if labels.get('url') in urls)
+
+        requestLatencies = None
+        for labels, histogram in self._metrics.GetHistograms('graphql_request_duration_seconds'):
+            if labels.get('url') in urls:
+                if requestLatencies is None:
+                    requestLatencies = Histogram(histogram.buckets)
+                requestLatencies.Merge(histogram)
+
+        requestLatencyPercentiles = {}
+        for percentile in percentiles:
+            requestLatencyPercentiles[percentile] = requestLatencies.GetPercentile(percentile) if requestLatencies is not None else None
+        return {
+            'numControllers': len(self._clients),
+            'numConnectedControllers': self.numConnectedControllers,
+            'subscriptionStates': dict((controllerName, client.subscriptionState) for controllerName, client in self._clients.items()),
+            'numRequests': _SumCounter('graphql_requests_total'),
+            'numRequestErrors': _SumCounter('graphql_request_errors_total'),
+            'numSubscriptionMessages': _SumCounter('subscription_messages_total'),
+            'numSubscriptionFailures': _SumCounter('subscription_failures_total'),
+            'requestLatencyPercentiles': requestLatencyPercentiles,
+        }
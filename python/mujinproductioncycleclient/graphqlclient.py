@@ -1,13 +1,56 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import base64
 import json
+import random
+import time
+import aiohttp
 import requests
+import requests.adapters
+import urllib3
 import websockets
 
+from .circuitbreaker import CircuitBreaker, CircuitState
+from .errors import ControllerConnectionError, ControllerError, ControllerResponseError, ControllerTimeoutError
+from .iobatcher import IOWriteBatcher
+from .iocache import IOReadCache
+from .iostate import IOStateSnapshot
+from .iowatcher import IOWatcherRegistry
+from .jsoncodec import GetDefaultJsonCodec, GraphQLRequestTemplate, MinifyGraphQLQuery
+from .metrics import ClientMetrics
+from .recorder import RecordType
+
 import logging
 log = logging.getLogger(__name__)
 
+_setControllerIOVariablesQuery = '''
+    mutation SetControllerIOVariables($parameters: Any!) {
+        CommandRobotBridges(command: "SetControllerIOVariables", parameters: $parameters)
+    }
+'''
+
+_getControllerIOVariableQuery = '''
+    mutation GetControllerIOVariable($parameters: Any!) {
+        CommandRobotBridges(command: "GetControllerIOVariable", parameters: $parameters)
+    }
+'''
+
+_getControllerIOVariablesQuery = '''
+    mutation GetControllerIOVariables($parameters: Any!) {
+        CommandRobotBridges(command: "GetControllerIOVariables", parameters: $parameters)
+    }
+'''
+
+
+class SubscriptionState(object):
+    """ Connection states of the IO subscription.
+    """
+    Disconnected = 'Disconnected' # not connected, IO state is stale
+    Connecting = 'Connecting'     # opening WebSocket connection and starting subscription
+    Resyncing = 'Resyncing'       # connected, reading resync IO names before marking IO state fresh, or waiting for the first IO change if reading failed
+    Connected = 'Connected'       # connected and receiving IO changes, IO state is fresh
+
 
 class MujinGraphClient(object):
 
@@ -17,15 +60,78 @@ class MujinGraphClient(object):
     _headers = None # request headers information
     _cookies = None # request cookies information
 
+    _poolSize = None # maximum number of pooled keep-alive connections to Mujin controller
+    _session = None # requests.Session, shared keep-alive connection pool used by sync GraphQL queries
+    _asyncSession = None # aiohttp.ClientSession, pooled keep-alive connections used by async GraphQL queries, created on first use
+    _ownsAsyncSession = True # whether asyncSession is created and closed by this client, False if shared with other clients
+    _ioWriteBatcher = None # IOWriteBatcher, merges IO writes of SetControllerIOVariablesBatched into shared requests
+    _metrics = None # ClientMetrics recording GraphQL and subscription activity
+    _codec = None # JsonCodec encoding requests and decoding responses and subscription messages
+    _setControllerIOVariablesTemplate = None # GraphQLRequestTemplate of SetControllerIOVariables
+    _getControllerIOVariableTemplate = None # GraphQLRequestTemplate of GetControllerIOVariable
+    _getControllerIOVariablesTemplate = None # GraphQLRequestTemplate of GetControllerIOVariables
+    _lastSubscriptionMessageTime = None # time.monotonic() when last subscription message was received
+    _subscriptionMessageInterval = None # exponentially weighted moving average of seconds between subscription messages
+    _recorder = None # StreamRecorder recording subscription messages and GraphQL queries, None to not record
+    _timeout = None # default seconds each GraphQL call has to complete including retries, None for no deadline
+    _attemptTimeout = None # seconds each attempt of a read has to complete before it is retried, None to let it use the whole deadline
+    _maxRetries = None # maximum number of retries of a failed GraphQL call
+    _retryBackoff = None # seconds of first retry backoff, doubled for each further retry and jittered
+    _hedgeDelay = None # seconds after which a duplicate of a slow async read is sent, None to not hedge
+    _circuitBreaker = None # CircuitBreaker failing requests fast while Mujin controller is unhealthy, None to disable
+
     _websocket = None # WebSocketClientProtocol, used to subscribe to IO changes on Mujin controller
     _robotBridgeState = None # dict storing last received RobotBridgesState from subscription
+    _ioState = None # IOStateSnapshot of last received RobotBridgesState
+    _ioWatchers = None # IOWatcherRegistry of waiters, callbacks and queues notified of IO changes
+    _ioChangeCallbacks = None # list of tuple(callbackFunction, IOWatcher) registered by RegisterIOChangeCallback
+    _ioChangeQueues = None # dict mapping asyncio.Queue to IOWatcher registered by RegisterIOChangeQueue
+    _subscriptionState = None # SubscriptionState value of the IO subscription
+    _subscriptionStateCallbacks = None # list of functions called with new SubscriptionState value on change
+    _resyncIONames = None # list of IO names read in bulk each time subscription (re)connects
+    _ioReadCache = None # IOReadCache of IO values read from or written to Mujin controller
+    _ioValueLengths = None # dict memoizing lengths of array IO variables such as order queues, cleared when subscription resyncs
+    _writtenIoNames = None # set of IO names mirrored by the subscription whose written values are cached until the subscription delivers its next IO state
 
-    def __init__(self, url='http://127.0.0.1', username='mujin', password='mujin'):
+    def __init__(self, url='http://127.0.0.1', username='mujin', password='mujin', poolSize=10, writeBatchWindow=0, writeBatchMaxSize=100, metrics=None, asyncSession=None, codec=None, readCacheMaxSize=1000, readCacheTtls=None, recorder=None,
+                 timeout=10.0, attemptTimeout=None, maxRetries=2, retryBackoff=0.05, hedgeDelay=None, circuitBreakerThreshold=5, circuitBreakerResetTimeout=5.0):
+        """
+        Args:
+            url (str): URL of Mujin controller, e.g. http://127.0.0.1
+            username (str): Username to login with.
+            password (str): Password to login with.
+            poolSize (int): Maximum number of pooled keep-alive connections to Mujin controller.
+            writeBatchWindow (float): Seconds SetControllerIOVariablesBatched waits for more writes to merge before sending.
+            writeBatchMaxSize (int): Number of pending writes at which SetControllerIOVariablesBatched sends without waiting for writeBatchWindow.
+            metrics (ClientMetrics): Metrics to record into, can be shared by several clients. Defaults to a new ClientMetrics.
+            asyncSession (aiohttp.ClientSession): Session shared with other clients for async GraphQL queries, not closed by CloseAsync. Defaults to a session owned by this client.
+            codec (JsonCodec): JSON codec for requests, responses and subscription messages. Defaults to the fastest installed JSON library.
+            readCacheMaxSize (int): Number of IO values kept in the read cache above which least recently used ones are evicted.
+            readCacheTtls (dict): Mapping of IO name, or glob pattern of IO names, to seconds values read from Mujin controller are kept in the read cache. None keeps them until evicted. IO names not listed are not cached.
+            recorder (StreamRecorder): Recorder to append subscription messages and GraphQL queries and responses to, for replay with StreamReplayer. None to not record.
+            timeout (float): Default seconds each GraphQL call has to complete including retries, raising ControllerTimeoutError otherwise. None for no deadline.
+            attemptTimeout (float): Seconds each attempt of a read has to complete before it is retried, within the deadline of the call. None to let an attempt use the whole deadline.
+            maxRetries (int): Maximum number of retries of a failed GraphQL call. Reads are retried on timeouts, connection failures and server errors, writes only when connecting failed.
+            retryBackoff (float): Seconds of first retry backoff, doubled for each further retry and jittered.
+            hedgeDelay (float): Seconds after which a duplicate of a slow async read is sent, using the first response. None to not hedge.
+            circuitBreakerThreshold (int): Number of consecutive failed requests after which requests fail fast with CircuitOpenError. 0 to disable.
+            circuitBreakerResetTimeout (float): Seconds requests fail fast before a trial request is let through.
+        """
         assert url.startswith('http://') or url.startswith('https://'), 'URL "%s" is invalid, should start with "http(s)://"' % url
         assert not url.endswith('/'), 'URL "%s" is invalid, should not end with "/"' % url
         self._url = url
         self._graphEndpoint = '%s/api/v2/graphql' % url
         self._robotBridgeState = {}
+        self._ioState = IOStateSnapshot()
+        self._ioWatchers = IOWatcherRegistry()
+        self._ioChangeCallbacks = []
+        self._ioChangeQueues = {}
+        self._subscriptionState = SubscriptionState.Disconnected
+        self._subscriptionStateCallbacks = []
+        self._resyncIONames = []
+        self._ioReadCache = IOReadCache(maxSize=readCacheMaxSize, ttls=readCacheTtls)
+        self._ioValueLengths = {}
+        self._writtenIoNames = set()
 
         usernamePassword = '%s:%s' % (username, password)
         encodedUsernamePassword = base64.b64encode(usernamePassword.encode('utf-8')).decode('ascii')
@@ -39,16 +145,311 @@ class MujinGraphClient(object):
             'csrftoken': 'token',
         }
 
+        self._poolSize = poolSize
+        if asyncSession is not None:
+            self._asyncSession = asyncSession
+            self._ownsAsyncSession = False
+        self._session = requests.Session()
+        self._session.headers.update(self._headers)
+        self._session.cookies.update(self._cookies)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._codec = codec or GetDefaultJsonCodec()
+        self._recorder = recorder
+        self._timeout = timeout
+        self._attemptTimeout = attemptTimeout
+        self._maxRetries = maxRetries
+        self._retryBackoff = retryBackoff
+        self._hedgeDelay = hedgeDelay
+        if circuitBreakerThreshold:
+            self._circuitBreaker = CircuitBreaker(url, failureThreshold=circuitBreakerThreshold, resetTimeout=circuitBreakerResetTimeout)
+        self._setControllerIOVariablesTemplate = GraphQLRequestTemplate('SetControllerIOVariables', _setControllerIOVariablesQuery, self._codec)
+        self._getControllerIOVariableTemplate = GraphQLRequestTemplate('GetControllerIOVariable', _getControllerIOVariableQuery, self._codec)
+        self._getControllerIOVariablesTemplate = GraphQLRequestTemplate('GetControllerIOVariables', _getControllerIOVariablesQuery, self._codec)
+        self._ioWriteBatcher = IOWriteBatcher(self.SetControllerIOVariablesAsync, batchWindow=writeBatchWindow, maxBatchSize=writeBatchMaxSize)
+
+        self._metrics = metrics or ClientMetrics()
+        self._metrics.RegisterGauge('subscription_message_rate', self._GetSubscriptionMessageRate, labels={'url': url}, helpText='Recent subscription messages per second.')
+        self._metrics.RegisterGauge('subscription_connected', lambda: self._subscriptionState == SubscriptionState.Connected, labels={'url': url}, helpText='Whether the IO subscription is connected and fresh.')
+        if self._circuitBreaker is not None:
+            self._metrics.RegisterGauge('circuit_open', lambda: self._circuitBreaker.state != CircuitState.Closed, labels={'url': url}, helpText='Whether requests to the controller fail fast after consecutive failures.')
+
+    @property
+    def url(self):
+        """ URL of Mujin controller, used as url label of metrics.
+        """
+        return self._url
+
+    @property
+    def metrics(self):
+        """ ClientMetrics recording GraphQL request counts, latencies and bytes, and subscription message rate, sizes and processing times.
+        """
+        return self._metrics
+
+    def _GetSubscriptionMessageRate(self):
+        """ Returns recent subscription messages per second, 0 if no message was received for a while.
+        """
+        if self._subscriptionMessageInterval is None or self._lastSubscriptionMessageTime is None:
+            return 0
+        messageInterval = max(self._subscriptionMessageInterval, time.monotonic() - self._lastSubscriptionMessageTime)
+        if messageInterval <= 0:
+            return 0
+        return 1.0 / messageInterval
+
+    def _RecordSubscriptionMessage(self, receiveTime, numBytes, parseDuration):
+        """ Records size, parse time and arrival rate of a received subscription message.
+        """
+        labels = {'url': self._url}
+        self._metrics.IncrementCounter('subscription_messages_total', labels=labels, helpText='Number of received subscription messages.')
+        self._metrics.IncrementCounter('subscription_received_bytes_total', numBytes, labels=labels, helpText='Bytes of received subscription messages.')
+        self._metrics.ObserveHistogram('subscription_parse_duration_seconds', parseDuration, labels=labels, helpText='Time spent decoding subscription messages.')
+        if self._lastSubscriptionMessageTime is not None:
+            messageInterval = receiveTime - self._lastSubscriptionMessageTime
+            if self._subscriptionMessageInterval is None:
+                self._subscriptionMessageInterval = messageInterval
+            else:
+                self._subscriptionMessageInterval += 0.1 * (messageInterval - self._subscriptionMessageInterval)
+        self._lastSubscriptionMessageTime = receiveTime
+
+    def _RecordGraphQLRequest(self, operationName, duration, numSentBytes, numReceivedBytes, isError):
+        """ Records count, latency and size of a GraphQL request.
+        """
+        labels = {'url': self._url, 'operation': operationName}
+        self._metrics.IncrementCounter('graphql_requests_total', labels=labels, helpText='Number of GraphQL requests.')
+        self._metrics.ObserveHistogram('graphql_request_duration_seconds', duration, labels=labels, helpText='Latency of GraphQL requests.')
+        self._metrics.IncrementCounter('graphql_sent_bytes_total', numSentBytes, labels=labels, helpText='Bytes of GraphQL request bodies.')
+        self._metrics.IncrementCounter('graphql_received_bytes_total', numReceivedBytes, labels=labels, helpText='Bytes of GraphQL response bodies.')
+        if isError:
+            self._metrics.IncrementCounter('graphql_request_errors_total', labels=labels, helpText='Number of failed GraphQL requests.')
+
+    @property
+    def circuitBreaker(self):
+        """ CircuitBreaker of Mujin controller, None if disabled.
+        """
+        return self._circuitBreaker
+
+    @property
+    def ioReadCache(self):
+        """ IOReadCache of IO values read from or written to Mujin controller, use IOReadCache.SetTtl to configure which IO names are cached.
+        """
+        return self._ioReadCache
+
+    @property
+    def ioState(self):
+        """ IOStateSnapshot of last received RobotBridgesState, carrying version and receive timestamp.
+        """
+        return self._ioState
+
     @property
     def receivedIoMap(self):
-        return dict(self._robotBridgeState.get('receivediovalues', {}))
+        """ Read-only mapping of IO name to IO value of last received receivediovalues.
+        """
+        return self._ioState.receivedIoMap
 
     @property
     def sentIoMap(self):
-        return dict(self._robotBridgeState.get('sentiovalues', {}))
+        """ Read-only mapping of IO name to IO value of last received sentiovalues.
+        """
+        return self._ioState.sentIoMap
 
-    async def SubscribeRobotBridgesState(self):
-        """ Subscribes to IO changes on Mujin controller.
+    async def WaitForAnyChange(self, ioNames, timeout=None):
+        """ Waits until a subscription message changes the value of any of the given IO variables.
+
+        Args:
+            ioNames (list(str)): IO names or glob patterns of IO names to watch. Sent IO values take precedence over received IO values of same name.
+            timeout (float): Seconds to wait before raising asyncio.TimeoutError. None to wait forever.
+
+        Returns:
+            dict: Mapping of changed IO name to new IO value.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def _Notify(changedIoNameValues):
+            if not future.done():
+                future.set_result(changedIoNameValues)
+        watcher = self._ioWatchers.AddWatcher(ioNames, _Notify)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._ioWatchers.RemoveWatcher(watcher)
+
+    async def WaitForIO(self, ioName, predicate=bool, timeout=None):
+        """ Waits until the value of an IO variable satisfies predicate. Wakes up only when a subscription message changes the IO variable.
+
+        Args:
+            ioName (str): IO name to watch. Sent IO values take precedence over received IO values of same name.
+            predicate (callable): Called with IO value, returns True when done waiting. Defaults to waiting for truthy value.
+            timeout (float): Seconds to wait before raising asyncio.TimeoutError. None to wait forever.
+
+        Returns:
+            Value of IO variable satisfying predicate.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        ioValue = self._ioState.GetIOValue(ioName)
+        while not predicate(ioValue):
+            remainingTime = None
+            if deadline is not None:
+                remainingTime = deadline - loop.time()
+                if remainingTime <= 0:
+                    raise asyncio.TimeoutError()
+            ioValue = (await self.WaitForAnyChange([ioName], timeout=remainingTime))[ioName]
+        return ioValue
+
+    def RegisterIOChangeCallback(self, ioNames, callbackFunction):
+        """ Registers a function called each time the IO state changes the value of any of the given IO variables.
+        Only callbacks watching changed IO variables are visited for each subscription message.
+
+        Args:
+            ioNames (list(str)): IO names or glob patterns of IO names, such as location*OrderReadPointer, to watch. Sent IO values take precedence over received IO values of same name.
+            callbackFunction (callable): Called with dict mapping changed IO name to new IO value.
+        """
+        self._ioChangeCallbacks.append((callbackFunction, self._ioWatchers.AddWatcher(ioNames, callbackFunction)))
+
+    def UnregisterIOChangeCallback(self, callbackFunction):
+        """ Unregisters a function registered with RegisterIOChangeCallback.
+
+        Args:
+            callbackFunction (callable): Previously registered function.
+        """
+        for registeredCallbackFunction, watcher in self._ioChangeCallbacks:
+            if registeredCallbackFunction == callbackFunction:
+                self._ioWatchers.RemoveWatcher(watcher)
+        self._ioChangeCallbacks = [(registeredCallbackFunction, watcher) for registeredCallbackFunction, watcher in self._ioChangeCallbacks if registeredCallbackFunction != callbackFunction]
+
+    def RegisterIOChangeQueue(self, ioNames, maxsize=0):
+        """ Creates a queue receiving a dict mapping changed IO name to new IO value each time the IO state changes the value of any of the given IO variables.
+
+        Args:
+            ioNames (list(str)): IO names or glob patterns of IO names to watch. Sent IO values take precedence over received IO values of same name.
+            maxsize (int): Maximum number of change sets kept in the queue, further change sets are dropped while it is full. 0 for no limit.
+
+        Returns:
+            asyncio.Queue: Queue of change sets, to pass to UnregisterIOChangeQueue when no longer read.
+        """
+        queue = asyncio.Queue(maxsize)
+
+        def _Put(changedIoNameValues):
+            try:
+                queue.put_nowait(changedIoNameValues)
+            except asyncio.QueueFull:
+                log.warning('dropped io change set of %d io names because queue is full', len(changedIoNameValues))
+        self._ioChangeQueues[queue] = self._ioWatchers.AddWatcher(ioNames, _Put)
+        return queue
+
+    def UnregisterIOChangeQueue(self, queue):
+        """ Stops putting change sets into a queue created by RegisterIOChangeQueue.
+        """
+        watcher = self._ioChangeQueues.pop(queue, None)
+        if watcher is not None:
+            self._ioWatchers.RemoveWatcher(watcher)
+
+    def GetIOStableDuration(self, ioName):
+        """ Returns seconds since the value of an IO variable last changed.
+
+        Args:
+            ioName (str): Name of IO variable.
+
+        Returns:
+            float: Seconds since value last changed, None if no value was received yet.
+        """
+        lastChangeTimestamp = self._ioWatchers.GetLastChangeTimestamp(ioName)
+        if lastChangeTimestamp is None:
+            return None
+        return time.time() - lastChangeTimestamp
+
+    def _NotifyIOWaiters(self, previousIoState):
+        """ Computes IO variables changed since the previous IO state once, and notifies waiters, callbacks and queues watching them.
+        """
+        if self._writtenIoNames:
+            # IO state delivered after a write was acknowledged reflects it or later changes, even when the subscription reported the echo before the
+            # acknowledgement, or missed a value reset by Mujin controller in between, so written values are no longer served from the read cache
+            writtenIoNames = self._writtenIoNames
+            self._writtenIoNames = set()
+            self._ioReadCache.Discard(writtenIoNames)
+        changedIoNameValues = self._ioState.GetChangedIoNameValues(previousIoState)
+        if changedIoNameValues:
+            self._ioReadCache.Discard(changedIoNameValues)
+            self._ioWatchers.Dispatch(changedIoNameValues, self._ioState.timestamp)
+
+    @property
+    def subscriptionState(self):
+        """ Connection state of the IO subscription, one of SubscriptionState values.
+        """
+        return self._subscriptionState
+
+    def RegisterSubscriptionStateCallback(self, callbackFunction):
+        """ Registers a function called with the new SubscriptionState value each time the connection state of the IO subscription changes.
+
+        Args:
+            callbackFunction (callable): Called with new SubscriptionState value.
+        """
+        self._subscriptionStateCallbacks.append(callbackFunction)
+
+    def UnregisterSubscriptionStateCallback(self, callbackFunction):
+        """ Unregisters a function registered with RegisterSubscriptionStateCallback.
+
+        Args:
+            callbackFunction (callable): Previously registered function.
+        """
+        self._subscriptionStateCallbacks.remove(callbackFunction)
+
+    def AddResyncIONames(self, ioNames):
+        """ Adds IO names to read with one bulk GetControllerIOVariables query each time the subscription (re)connects, before the IO state is marked fresh.
+
+        Args:
+            ioNames (list(str)): IO names to resync, such as order queue pointers.
+        """
+        for ioName in ioNames:
+            if ioName not in self._resyncIONames:
+                self._resyncIONames.append(ioName)
+
+    def _SetSubscriptionState(self, subscriptionState):
+        """ Updates connection state of the IO subscription and notifies registered callbacks.
+        """
+        if subscriptionState == self._subscriptionState:
+            return
+        log.debug('subscription state changed from %s to %s', self._subscriptionState, subscriptionState)
+        self._subscriptionState = subscriptionState
+        for callbackFunction in list(self._subscriptionStateCallbacks):
+            try:
+                callbackFunction(subscriptionState)
+            except Exception as e:
+                log.exception('subscription state callback failed: %s', e)
+
+    def _UpdateIOState(self, sentIoMap, receivedIoMap, isStale):
+        """ Replaces IO state with a new snapshot and wakes up waiters of changed IO variables.
+        """
+        previousIoState = self._ioState
+        self._ioState = IOStateSnapshot(
+            version=previousIoState.version + 1,
+            timestamp=time.time(),
+            sentIoMap=sentIoMap,
+            receivedIoMap=receivedIoMap,
+            isStale=isStale,
+        )
+        self._NotifyIOWaiters(previousIoState)
+
+    async def _ResyncIOState(self):
+        """ Clears values cached while disconnected, reads resync IO names with one bulk query and marks IO state fresh.
+        """
+        self._ioReadCache.Clear()
+        self._writtenIoNames = set()
+        self._ioValueLengths.clear()
+        receivedIoMap = self._ioState.receivedIoMap
+        if len(self._resyncIONames) > 0:
+            receivedIoMap = dict(receivedIoMap)
+            receivedIoMap.update(await self.GetControllerIOVariablesAsync(self._resyncIONames, useCache=False))
+        self._UpdateIOState(self._ioState.sentIoMap, receivedIoMap, isStale=False)
+
+    async def SubscribeRobotBridgesState(self, reconnect=False, minReconnectDelay=0.1, maxReconnectDelay=10.0):
+        """ Subscribes to IO changes on Mujin controller. IO state is marked stale while not connected.
+
+        Args:
+            reconnect (bool): Whether to keep reconnecting when the connection fails or closes, waiting with jittered exponential backoff and resyncing resync IO names before marking IO state fresh again. Otherwise returns once the connection closes.
+            minReconnectDelay (float): Seconds to wait before first reconnect attempt.
+            maxReconnectDelay (float): Maximum seconds to wait between reconnect attempts.
         """
         query = '''
             subscription {
@@ -60,142 +461,610 @@ class MujinGraphClient(object):
         '''
         # create the client for executing the subscription
 
-        async def _Subscribe(callbackFunction):
+        async def _Subscribe():
+            self._SetSubscriptionState(SubscriptionState.Connecting)
             async with websockets.connect(
                 uri='ws%s' % self._graphEndpoint[len('http'):], # replace http:// with ws://, https:// with wss://
                 subprotocols=['graphql-ws'],
                 extra_headers=self._headers,
             ) as websocket:
-                self.websocket = websocket
+                self._websocket = websocket
                 # send the WebSocket connection initialization request
                 await websocket.send(json.dumps({'type': 'connection_init', 'payload': {}}))
 
                 # start a new subscription on the WebSocket connection
-                await websocket.send(json.dumps({'type': 'start', 'payload': {'query': query}}))
+                await websocket.send(json.dumps({'type': 'start', 'payload': {'query': MinifyGraphQLQuery(query)}}))
+
+                # resync state missed while disconnected, incoming messages are buffered meanwhile
+                self._SetSubscriptionState(SubscriptionState.Resyncing)
+                try:
+                    await self._ResyncIOState()
+                except Exception as e:
+                    # subscription messages carry the whole IO state, so the first one makes it fresh
+                    log.warning('failed to resync io state from %s, waiting for subscription to deliver it: %s', self._graphEndpoint, e)
+                else:
+                    self._SetSubscriptionState(SubscriptionState.Connected)
 
                 # read incoming messages
                 async for response in websocket:
-                    data = json.loads(response)
-                    if data['type'] == 'connection_ack':
-                        log.debug('received connection_ack')
-                    elif data['type'] == 'ka':
-                        # received keep-alive "ka" message
-                        pass
-                    else:
-                        # call the calback function to process the payload
-                        callbackFunction(data['payload'])
+                    if self._recorder is not None:
+                        self._recorder.Record(RecordType.SubscriptionMessage, response)
+                    self.HandleSubscriptionMessage(response)
+                    if self._subscriptionState != SubscriptionState.Connected and not self._ioState.isStale:
+                        self._SetSubscriptionState(SubscriptionState.Connected)
 
                 # stop the subscription on the WebSocket connection
                 await websocket.send(json.dumps({"type": "stop", "payload": {}}))
 
-        def _Callback(response):
+        numFailedAttempts = 0
+        while True:
+            try:
+                await _Subscribe()
+            except Exception as e:
+                self._metrics.IncrementCounter('subscription_failures_total', labels={'url': self._url}, helpText='Number of failed subscription connections.')
+                if not reconnect:
+                    raise
+                log.warning('subscription to %s failed: %s', self._graphEndpoint, e)
+            finally:
+                self._websocket = None
+                if self._subscriptionState == SubscriptionState.Connected:
+                    numFailedAttempts = 0
+                if not self._ioState.isStale:
+                    self._UpdateIOState(self._ioState.sentIoMap, self._ioState.receivedIoMap, isStale=True)
+                self._SetSubscriptionState(SubscriptionState.Disconnected)
+            if not reconnect:
+                return
+
+            # wait with jittered exponential backoff before reconnecting
+            reconnectDelay = min(maxReconnectDelay, minReconnectDelay * (2 ** numFailedAttempts))
+            reconnectDelay = random.uniform(reconnectDelay / 2, reconnectDelay)
+            numFailedAttempts += 1
+            log.info('reconnecting subscription to %s in %.3f seconds', self._graphEndpoint, reconnectDelay)
+            await asyncio.sleep(reconnectDelay)
+
+    def HandleSubscriptionMessage(self, response):
+        """ Applies a graphql-ws message of the IO subscription to the IO state and notifies waiters of changed IO variables.
+        Called for each message received by SubscribeRobotBridgesState, or by StreamReplayer to replay recorded messages.
+
+        Args:
+            response (str or bytes): Raw graphql-ws message.
+        """
+        receiveTime = time.monotonic()
+        data = self._codec.Loads(response)
+        if data['type'] == 'connection_ack':
+            log.debug('received connection_ack')
+        elif data['type'] == 'ka':
+            # received keep-alive "ka" message
+            pass
+        else:
             # update with response robotBridgeState
-            self._robotBridgeState = response.get('data', {}).get('SubscribeRobotBridgesState') or {}
+            self._RecordSubscriptionMessage(receiveTime, len(response), time.monotonic() - receiveTime)
+            self._robotBridgeState = data['payload'].get('data', {}).get('SubscribeRobotBridgesState') or {}
+            self._UpdateIOState(
+                sentIoMap=dict(self._robotBridgeState.get('sentiovalues', {})),
+                receivedIoMap=dict(self._robotBridgeState.get('receivediovalues', {})),
+                isStale=False,
+            )
+            self._metrics.ObserveHistogram('subscription_apply_duration_seconds', time.monotonic() - receiveTime, labels={'url': self._url}, helpText='Time from receiving a subscription message until its IO state is applied and waiters are notified.')
 
-        await _Subscribe(_Callback)
+    def _GetAsyncSession(self):
+        """ Returns the aiohttp session used for async GraphQL queries, creating it on first use.
+
+        Has to be called from within a running event loop.
+        """
+        if not self._ownsAsyncSession:
+            return self._asyncSession
+        if self._asyncSession is None or self._asyncSession.closed:
+            self._asyncSession = aiohttp.ClientSession(
+                headers=self._headers,
+                connector=aiohttp.TCPConnector(limit=self._poolSize),
+            )
+        return self._asyncSession
+
+    def _GetDeadline(self, timeout):
+        """ Returns time.monotonic() by which a call has to complete, None for no deadline.
+
+        Args:
+            timeout (float): Seconds the call has to complete. None to use the default timeout of the client.
+        """
+        if timeout is None:
+            timeout = self._timeout
+        if timeout is None:
+            return None
+        return time.monotonic() + timeout
 
-    def SetControllerIOVariables(self, ioNameValues):
+    def _GetAttemptDeadline(self, deadline, isIdempotent):
+        """ Returns time.monotonic() by which an attempt of a call has to complete, None for no deadline. Attempts of reads are limited to attemptTimeout
+        so that stalled ones are retried, attempts of writes may use the whole deadline as they are not retried after a timeout.
+        """
+        if not isIdempotent or self._attemptTimeout is None:
+            return deadline
+        attemptDeadline = time.monotonic() + self._attemptTimeout
+        if deadline is not None:
+            attemptDeadline = min(deadline, attemptDeadline)
+        return attemptDeadline
+
+    def _GetRemainingTime(self, operationName, deadline):
+        """ Returns seconds until deadline, None for no deadline.
+
+        Raises:
+            ControllerTimeoutError: If deadline has passed.
+        """
+        if deadline is None:
+            return None
+        remainingTime = deadline - time.monotonic()
+        if remainingTime <= 0:
+            raise ControllerTimeoutError('GraphQL query %s to %s did not complete before its deadline' % (operationName, self._graphEndpoint))
+        return remainingTime
+
+    def _GetRetryDelay(self, operationName, error, numAttempts, deadline, isIdempotent):
+        """ Decides whether a failed GraphQL query is retried. Idempotent reads are retried on timeouts, connection failures and server errors.
+        Writes are only retried when connecting failed, so the request never reached Mujin controller.
+
+        Returns:
+            float: Jittered seconds to wait before retrying, None to not retry.
+        """
+        if numAttempts > self._maxRetries:
+            return None
+        if isIdempotent:
+            isRetryable = isinstance(error, (ControllerTimeoutError, ControllerConnectionError)) or (isinstance(error, ControllerResponseError) and error.statusCode >= 500)
+        else:
+            isRetryable = isinstance(error, ControllerConnectionError) and not error.isRequestSent
+        if not isRetryable:
+            return None
+        retryDelay = random.uniform(0, self._retryBackoff * (2 ** (numAttempts - 1)))
+        if deadline is not None and time.monotonic() + retryDelay >= deadline:
+            return None
+        log.debug('retrying GraphQL query %s to %s in %.3f seconds after %s', operationName, self._graphEndpoint, retryDelay, error)
+        self._metrics.IncrementCounter('graphql_retries_total', labels={'url': self._url, 'operation': operationName}, helpText='Number of retried GraphQL requests.')
+        return retryDelay
+
+    def _DecodeGraphQLResponse(self, statusCode, content):
+        """ Decodes GraphQL response body.
+
+        Raises:
+            ControllerResponseError: If response has an error status or is not valid JSON.
+        """
+        if self._recorder is not None:
+            self._recorder.Record(RecordType.GraphQLResponse, content)
+        try:
+            responseJson = self._codec.Loads(content)
+        except Exception as e:
+            raise ControllerResponseError('Invalid GraphQL response from %s with status %d: %s' % (self._graphEndpoint, statusCode, e), statusCode=statusCode)
+        if statusCode >= 500:
+            raise ControllerResponseError('GraphQL query to %s failed with status %d. response: %r' % (self._graphEndpoint, statusCode, responseJson), statusCode=statusCode, response=responseJson)
+        return responseJson
+
+    def _RecordCircuitBreakerResult(self, error):
+        """ Records outcome of a GraphQL request in the circuit breaker. Only failures indicating an unhealthy controller count, not GraphQL errors.
+        """
+        if self._circuitBreaker is None:
+            return
+        if error is None or (isinstance(error, ControllerResponseError) and error.statusCode < 500):
+            self._circuitBreaker.RecordSuccess()
+        else:
+            self._circuitBreaker.RecordFailure()
+
+    def _ExecuteGraphQL(self, requestTemplate, variables, timeout=None, isIdempotent=False):
+        """ Sends GraphQL query to Mujin controller over the shared keep-alive session, retrying failed attempts as allowed before the deadline.
+
+        Args:
+            requestTemplate (GraphQLRequestTemplate): Precompiled request of GraphQL operation.
+            variables (dict): GraphQL query variables.
+            timeout (float): Seconds the query has to complete including retries. None to use the default timeout of the client.
+            isIdempotent (bool): Whether the query can be retried after it may have reached Mujin controller.
+
+        Returns:
+            dict: Decoded JSON response.
+        """
+        deadline = self._GetDeadline(timeout)
+        data = requestTemplate.Encode(variables)
+        numAttempts = 0
+        while True:
+            numAttempts += 1
+            try:
+                return self._PostGraphQL(requestTemplate.operationName, data, self._GetAttemptDeadline(deadline, isIdempotent))
+            except ControllerError as e:
+                retryDelay = self._GetRetryDelay(requestTemplate.operationName, e, numAttempts, deadline, isIdempotent)
+                if retryDelay is None:
+                    raise
+            time.sleep(retryDelay)
+
+    def _PostGraphQL(self, operationName, data, deadline):
+        """ Sends one attempt of a GraphQL query. As requests applies the timeout to connecting and to each read, a response trickling in may exceed the deadline.
+        """
+        remainingTime = self._GetRemainingTime(operationName, deadline)
+        isTrialRequest = False
+        if self._circuitBreaker is not None:
+            isTrialRequest = self._circuitBreaker.BeforeRequest()
+        if self._recorder is not None:
+            self._recorder.Record(RecordType.GraphQLRequest, data)
+        startTime = time.monotonic()
+        content = b''
+        responseJson = None
+        try:
+            try:
+                response = self._session.post(
+                    url=self._graphEndpoint,
+                    data=data,
+                    timeout=remainingTime,
+                )
+                content = response.content
+            except requests.exceptions.Timeout as e:
+                raise ControllerTimeoutError('GraphQL query %s to %s did not complete before its deadline: %s' % (operationName, self._graphEndpoint, e))
+            except requests.exceptions.ConnectionError as e:
+                isRequestSent = not isinstance(getattr(e.args[0] if e.args else None, 'reason', None), urllib3.exceptions.NewConnectionError)
+                raise ControllerConnectionError('GraphQL query %s to %s failed: %s' % (operationName, self._graphEndpoint, e), isRequestSent=isRequestSent)
+            except requests.exceptions.RequestException as e:
+                raise ControllerConnectionError('GraphQL query %s to %s failed: %s' % (operationName, self._graphEndpoint, e))
+            responseJson = self._DecodeGraphQLResponse(response.status_code, content)
+        except ControllerError as e:
+            self._RecordCircuitBreakerResult(e)
+            self._RecordGraphQLRequest(operationName, time.monotonic() - startTime, len(data), len(content), True)
+            raise
+        except BaseException:
+            # ended without outcome, e.g. interrupted
+            if isTrialRequest:
+                self._circuitBreaker.ReleaseTrial()
+            raise
+        self._RecordCircuitBreakerResult(None)
+        self._RecordGraphQLRequest(operationName, time.monotonic() - startTime, len(data), len(content), 'errors' in responseJson)
+        return responseJson
+
+    async def _ExecuteGraphQLAsync(self, requestTemplate, variables, timeout=None, isIdempotent=False):
+        """ Sends GraphQL query to Mujin controller over the pooled async session without blocking the event loop, retrying failed attempts as allowed
+        before the deadline. Idempotent queries are hedged when hedgeDelay is set.
+
+        Args:
+            requestTemplate (GraphQLRequestTemplate): Precompiled request of GraphQL operation.
+            variables (dict): GraphQL query variables.
+            timeout (float): Seconds the query has to complete including retries. None to use the default timeout of the client.
+            isIdempotent (bool): Whether the query can be retried or hedged after it may have reached Mujin controller.
+
+        Returns:
+            dict: Decoded JSON response.
+        """
+        deadline = self._GetDeadline(timeout)
+        data = requestTemplate.Encode(variables)
+        numAttempts = 0
+        while True:
+            numAttempts += 1
+            try:
+                attemptDeadline = self._GetAttemptDeadline(deadline, isIdempotent)
+                if isIdempotent and self._hedgeDelay is not None:
+                    return await self._PostGraphQLHedgedAsync(requestTemplate.operationName, data, attemptDeadline)
+                return await self._PostGraphQLAsync(requestTemplate.operationName, data, attemptDeadline)
+            except ControllerError as e:
+                retryDelay = self._GetRetryDelay(requestTemplate.operationName, e, numAttempts, deadline, isIdempotent)
+                if retryDelay is None:
+                    raise
+            await asyncio.sleep(retryDelay)
+
+    async def _PostGraphQLHedgedAsync(self, operationName, data, deadline):
+        """ Sends one attempt of a GraphQL query, and a duplicate if it does not complete within hedgeDelay. Returns the first successful response,
+        cancelling the other request.
+        """
+        tasks = [asyncio.ensure_future(self._PostGraphQLAsync(operationName, data, deadline))]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=self._hedgeDelay)
+            if not done:
+                self._metrics.IncrementCounter('graphql_hedged_requests_total', labels={'url': self._url, 'operation': operationName}, helpText='Number of duplicate GraphQL requests sent because the first one was slow.')
+                tasks.append(asyncio.ensure_future(self._PostGraphQLAsync(operationName, data, deadline)))
+                pending = set(tasks)
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception() # mark exception of losing request retrieved
+
+    async def _PostGraphQLAsync(self, operationName, data, deadline):
+        """ Sends one attempt of a GraphQL query without blocking the event loop.
+        """
+        remainingTime = self._GetRemainingTime(operationName, deadline)
+        isTrialRequest = False
+        if self._circuitBreaker is not None:
+            isTrialRequest = self._circuitBreaker.BeforeRequest()
+        if self._recorder is not None:
+            self._recorder.Record(RecordType.GraphQLRequest, data)
+        startTime = time.monotonic()
+        content = b''
+        responseJson = None
+        try:
+            try:
+                async with self._GetAsyncSession().post(
+                    self._graphEndpoint,
+                    headers=self._headers,
+                    cookies=self._cookies,
+                    data=data,
+                    timeout=aiohttp.ClientTimeout(total=remainingTime),
+                ) as response:
+                    content = await response.read()
+            except asyncio.TimeoutError as e:
+                raise ControllerTimeoutError('GraphQL query %s to %s did not complete before its deadline: %r' % (operationName, self._graphEndpoint, e))
+            except aiohttp.ClientConnectorError as e:
+                raise ControllerConnectionError('GraphQL query %s to %s failed: %s' % (operationName, self._graphEndpoint, e), isRequestSent=False)
+            except aiohttp.ClientError as e:
+                raise ControllerConnectionError('GraphQL query %s to %s failed: %s' % (operationName, self._graphEndpoint, e))
+            responseJson = self._DecodeGraphQLResponse(response.status, content)
+        except ControllerError as e:
+            self._RecordCircuitBreakerResult(e)
+            self._RecordGraphQLRequest(operationName, time.monotonic() - startTime, len(data), len(content), True)
+            raise
+        except BaseException:
+            # ended without outcome, e.g. cancelled by the deadline of the caller or by a hedged request completing first
+            if isTrialRequest:
+                self._circuitBreaker.ReleaseTrial()
+            raise
+        self._RecordCircuitBreakerResult(None)
+        self._RecordGraphQLRequest(operationName, time.monotonic() - startTime, len(data), len(content), 'errors' in responseJson)
+        return responseJson
+
+    def Close(self):
+        """ Closes the pooled connections of the sync session.
+        """
+        self._session.close()
+
+    async def CloseAsync(self):
+        """ Closes the pooled connections of both the sync and async sessions. A shared async session is left open.
+        """
+        self.Close()
+        if self._asyncSession is not None and self._ownsAsyncSession:
+            await self._asyncSession.close()
+            self._asyncSession = None
+
+    def SetControllerIOVariables(self, ioNameValues, timeout=None):
         """ Sends GraphQL query to set IO variables to Mujin controller.
 
         Args:
             ioNameValues (list(tuple(ioName, ioValue))): List of tuple(ioName, ioValue) for IO variables to set
+            timeout (float): Seconds the call has to complete including retries. Not retried once the request may have reached Mujin controller. None to use the default timeout of the client.
+        """
+        responseJson = self._ExecuteGraphQL(self._setControllerIOVariablesTemplate, {'parameters': {'ioNameValues': ioNameValues}}, timeout=timeout)
+        self._CheckSetControllerIOVariablesResponse(ioNameValues, responseJson)
+        self._CacheWrittenIOValues(ioNameValues)
+
+    async def SetControllerIOVariablesAsync(self, ioNameValues, timeout=None):
+        """ Sends GraphQL query to set IO variables to Mujin controller without blocking the event loop.
+
+        Args:
+            ioNameValues (list(tuple(ioName, ioValue))): List of tuple(ioName, ioValue) for IO variables to set
+            timeout (float): Seconds the call has to complete including retries. Not retried once the request may have reached Mujin controller. None to use the default timeout of the client.
+        """
+        responseJson = await self._ExecuteGraphQLAsync(self._setControllerIOVariablesTemplate, {'parameters': {'ioNameValues': ioNameValues}}, timeout=timeout)
+        self._CheckSetControllerIOVariablesResponse(ioNameValues, responseJson)
+        self._CacheWrittenIOValues(ioNameValues)
+
+    def SetControllerIOVariablesBatched(self, ioNameValues, writeGroups=None):
+        """ Queues IO variables to be set to Mujin controller together with other writes made within the write batch window.
+        Later writes to the same IO name overwrite earlier pending ones. Has to be called from within a running event loop.
+
+        Args:
+            ioNameValues (list(tuple(ioName, ioValue))): List of tuple(ioName, ioValue) for IO variables to set
+            writeGroups (list): Write groups the writes belong to. Once a batch fails, pending and later writes of its write groups fail until ResumeBatchedWriteGroup is called. None if the writes do not depend on other writes.
+
+        Returns:
+            asyncio.Future: Resolves when the batch containing the writes is acknowledged by Mujin controller.
+        """
+        return self._ioWriteBatcher.SetControllerIOVariables(ioNameValues, writeGroups=writeGroups)
+
+    def ResumeBatchedWriteGroup(self, writeGroup):
+        """ Lets writes of a write group passed to SetControllerIOVariablesBatched be sent again after a batch containing some of them failed.
+
+        Args:
+            writeGroup: Write group passed to SetControllerIOVariablesBatched.
+        """
+        self._ioWriteBatcher.ResumeWriteGroup(writeGroup)
+
+    def _CheckSetControllerIOVariablesResponse(self, ioNameValues, responseJson):
+        """ Raises if SetControllerIOVariables response contains errors.
         """
-        query = '''
-            mutation SetControllerIOVariables($parameters: Any!) {
-                CommandRobotBridges(command: "SetControllerIOVariables", parameters: $parameters)
-            }
-        '''
-        data = json.dumps({
-            'query': query,
-            'variables': {
-                'parameters': {
-                    'ioNameValues': ioNameValues,
-                },
-            },
-        })
-        response = requests.post(
-            url=self._graphEndpoint,
-            headers=self._headers,
-            cookies=self._cookies,
-            data=data,
-        )
-        responseJson = response.json()
         if 'errors' in responseJson:
             # command failed
-            raise Exception('Failed to set io variables for %r. response: %s' % (ioNameValues, responseJson))
+            raise ControllerResponseError('Failed to set io variables for %r. response: %s' % (ioNameValues, responseJson), response=responseJson)
+
+    def _CacheWrittenIOValues(self, ioNameValues):
+        """ Caches IO values acknowledged by Mujin controller, so that reads see them before the subscription does. IO values mirrored by the subscription
+        are kept until the subscription delivers its next IO state, others for their configured ttl.
+        """
+        ioState = self._ioState
+        for ioName, ioValue in ioNameValues:
+            if ioName in ioState.sentIoMap or ioName in ioState.receivedIoMap:
+                self._ioReadCache.Set(ioName, ioValue, ttl=None)
+                self._writtenIoNames.add(ioName)
+            else:
+                self._ioReadCache.Set(ioName, ioValue)
+
+    def _LookupIOValues(self, ioNames):
+        """ Looks up IO values in the read cache, then in the IO state while the subscription is connected.
+
+        Args:
+            ioNames (list(str)): List of IO names to look up.
+
+        Returns:
+            tuple(dict, list(str)): Mapping of IO name to IO value found, and list of IO names to read from Mujin controller.
+        """
+        ioNameValues = {}
+        missingIoNames = []
+        numCacheHits = 0
+        ioState = self._ioState
+        for ioName in ioNames:
+            isCached, ioValue = self._ioReadCache.Get(ioName)
+            if isCached:
+                ioNameValues[ioName] = ioValue
+                numCacheHits += 1
+            elif not ioState.isStale and (ioName in ioState.sentIoMap or ioName in ioState.receivedIoMap):
+                ioNameValues[ioName] = ioState.GetIOValue(ioName)
+            else:
+                missingIoNames.append(ioName)
+        helpText = 'Number of IO values read, by where they were served from.'
+        if numCacheHits > 0:
+            self._metrics.IncrementCounter('io_reads_total', numCacheHits, labels={'url': self._url, 'source': 'cache'}, helpText=helpText)
+        if len(ioNameValues) > numCacheHits:
+            self._metrics.IncrementCounter('io_reads_total', len(ioNameValues) - numCacheHits, labels={'url': self._url, 'source': 'subscription'}, helpText=helpText)
+        if len(missingIoNames) > 0:
+            self._metrics.IncrementCounter('io_reads_total', len(missingIoNames), labels={'url': self._url, 'source': 'controller'}, helpText=helpText)
+        return ioNameValues, missingIoNames
+
+    def _CacheReadIOValues(self, ioNameValues):
+        """ Caches IO values read from Mujin controller, keeping values written or read meanwhile.
+        """
+        for ioName, ioValue in ioNameValues.items():
+            isCached, cachedIoValue = self._ioReadCache.Get(ioName)
+            if not isCached:
+                self._ioReadCache.Set(ioName, ioValue)
 
-    def GetControllerIOVariable(self, ioName):
-        """ Sends GraphQL query to get single IO variable from Mujin controller.
+    def GetControllerIOVariable(self, ioName, useCache=True, timeout=None):
+        """ Gets single IO variable, from the read cache or the subscription IO state if available, otherwise by sending GraphQL query to Mujin controller.
 
         Args:
             ioName (str): Name of IO variable to get.
+            useCache (bool): Whether to serve IO value from the read cache or the subscription IO state. False always queries Mujin controller and bypasses the read cache.
+            timeout (float): Seconds the call has to complete including retries. Reads are retried within it. None to use the default timeout of the client.
 
         Returns:
             Value of IO variable.
         """
-        query = '''
-            mutation GetControllerIOVariable($parameters: Any!) {
-                CommandRobotBridges(command: "GetControllerIOVariable", parameters: $parameters)
-            }
-        '''
-        data = json.dumps({
-            'query': query,
-            'variables': {
-                'parameters': {
-                    'parametername': ioName,
-                },
-            },
-        })
-        response = requests.post(
-            url=self._graphEndpoint,
-            headers=self._headers,
-            cookies=self._cookies,
-            data=data,
-        )
-        responseJson = response.json()
+        if useCache:
+            ioNameValues, missingIoNames = self._LookupIOValues([ioName])
+            if not missingIoNames:
+                return ioNameValues[ioName]
+        responseJson = self._ExecuteGraphQL(self._getControllerIOVariableTemplate, {'parameters': {'parametername': ioName}}, timeout=timeout, isIdempotent=True)
+        ioValue = self._ParseGetControllerIOVariableResponse(ioName, responseJson)
+        if useCache:
+            self._CacheReadIOValues({ioName: ioValue})
+        return ioValue
+
+    async def GetControllerIOVariableAsync(self, ioName, useCache=True, timeout=None):
+        """ Gets single IO variable, from the read cache or the subscription IO state if available, otherwise by sending GraphQL query to Mujin controller without blocking the event loop.
+
+        Args:
+            ioName (str): Name of IO variable to get.
+            useCache (bool): Whether to serve IO value from the read cache or the subscription IO state. False always queries Mujin controller and bypasses the read cache.
+            timeout (float): Seconds the call has to complete including retries. Reads are retried and hedged within it. None to use the default timeout of the client.
+
+        Returns:
+            Value of IO variable.
+        """
+        if useCache:
+            ioNameValues, missingIoNames = self._LookupIOValues([ioName])
+            if not missingIoNames:
+                return ioNameValues[ioName]
+        responseJson = await self._ExecuteGraphQLAsync(self._getControllerIOVariableTemplate, {'parameters': {'parametername': ioName}}, timeout=timeout, isIdempotent=True)
+        ioValue = self._ParseGetControllerIOVariableResponse(ioName, responseJson)
+        if useCache:
+            self._CacheReadIOValues({ioName: ioValue})
+        return ioValue
+
+    def _ParseGetControllerIOVariableResponse(self, ioName, responseJson):
+        """ Extracts IO value from GetControllerIOVariable response.
+        """
         if 'errors' in responseJson:
             # command failed
-            raise Exception('Failed to get io variables for IO name %r. response: %s' % (ioName, responseJson))
+            raise ControllerResponseError('Failed to get io variables for IO name %r. response: %s' % (ioName, responseJson), response=responseJson)
         parameterValue = responseJson.get('data', {}).get('CommandRobotBridges', {}).get('parametervalue')
         if parameterValue is None:
             # failed to fetch parameter values
-            raise Exception('Failed to get io variables for IO name %r. response: %r' % (ioName, responseJson))
+            raise ControllerResponseError('Failed to get io variables for IO name %r. response: %r' % (ioName, responseJson), response=responseJson)
         return parameterValue
 
-    def GetControllerIOVariables(self, ioNames):
-        """ Sends GraphQL query to get multiple IO variables from Mujin controller.
+    def GetControllerIOVariables(self, ioNames, useCache=True, timeout=None):
+        """ Gets multiple IO variables, serving those available from the read cache or the subscription IO state, and querying the rest from Mujin controller with a single GraphQL query.
 
         Args:
             ioNames (list(str)): List of IO names for IO variables to get.
+            useCache (bool): Whether to serve IO values from the read cache or the subscription IO state. False always queries Mujin controller and bypasses the read cache.
+            timeout (float): Seconds the call has to complete including retries. Reads are retried within it. None to use the default timeout of the client.
 
         Returns:
             dict: Mapping of IO name to IO value for queried IO variables.
         """
-        query = '''
-            mutation GetControllerIOVariables($parameters: Any!) {
-                CommandRobotBridges(command: "GetControllerIOVariables", parameters: $parameters)
-            }
-        '''
-        data = json.dumps({
-            'query': query,
-            'variables': {
-                'parameters': {
-                    'parameternames': ioNames,
-                },
-            },
-        })
-        response = requests.post(
-            url=self._graphEndpoint,
-            headers=self._headers,
-            cookies=self._cookies,
-            data=data,
-        )
-        responseJson = response.json()
+        ioNameValues = {}
+        missingIoNames = list(ioNames)
+        if useCache:
+            ioNameValues, missingIoNames = self._LookupIOValues(ioNames)
+        if len(missingIoNames) > 0:
+            responseJson = self._ExecuteGraphQL(self._getControllerIOVariablesTemplate, {'parameters': {'parameternames': missingIoNames}}, timeout=timeout, isIdempotent=True)
+            readIoNameValues = self._ParseGetControllerIOVariablesResponse(missingIoNames, responseJson)
+            if useCache:
+                self._CacheReadIOValues(readIoNameValues)
+            ioNameValues.update(readIoNameValues)
+        return ioNameValues
+
+    def GetControllerIOVariableLengths(self, ioNames):
+        """ Gets lengths of array IO variables such as order queues, querying only those not memoized yet with a single GraphQL query.
+        Lengths are memoized until the subscription reconnects.
+
+        Args:
+            ioNames (list(str)): List of IO names of array IO variables.
+
+        Returns:
+            dict: Mapping of IO name to length of IO value.
+        """
+        missingIoNames = [ioName for ioName in ioNames if ioName not in self._ioValueLengths]
+        if len(missingIoNames) > 0:
+            ioNameValues = self.GetControllerIOVariables(missingIoNames, useCache=False)
+            for ioName, ioValue in ioNameValues.items():
+                self._ioValueLengths[ioName] = len(ioValue)
+        return dict((ioName, self._ioValueLengths[ioName]) for ioName in ioNames)
+
+    async def GetControllerIOVariablesAsync(self, ioNames, useCache=True, timeout=None):
+        """ Gets multiple IO variables, serving those available from the read cache or the subscription IO state, and querying the rest from Mujin controller with a single GraphQL query without blocking the event loop.
+
+        Args:
+            ioNames (list(str)): List of IO names for IO variables to get.
+            useCache (bool): Whether to serve IO values from the read cache or the subscription IO state. False always queries Mujin controller and bypasses the read cache.
+            timeout (float): Seconds the call has to complete including retries. Reads are retried and hedged within it. None to use the default timeout of the client.
+
+        Returns:
+            dict: Mapping of IO name to IO value for queried IO variables.
+        """
+        ioNameValues = {}
+        missingIoNames = list(ioNames)
+        if useCache:
+            ioNameValues, missingIoNames = self._LookupIOValues(ioNames)
+        if len(missingIoNames) > 0:
+            responseJson = await self._ExecuteGraphQLAsync(self._getControllerIOVariablesTemplate, {'parameters': {'parameternames': missingIoNames}}, timeout=timeout, isIdempotent=True)
+            readIoNameValues = self._ParseGetControllerIOVariablesResponse(missingIoNames, responseJson)
+            if useCache:
+                self._CacheReadIOValues(readIoNameValues)
+            ioNameValues.update(readIoNameValues)
+        return ioNameValues
+
+    async def GetControllerIOVariableLengthsAsync(self, ioNames):
+        """ Gets lengths of array IO variables such as order queues, querying only those not memoized yet with a single GraphQL query without blocking the event loop.
+        Lengths are memoized until the subscription reconnects.
+
+        Args:
+            ioNames (list(str)): List of IO names of array IO variables.
+
+        Returns:
+            dict: Mapping of IO name to length of IO value.
+        """
+        missingIoNames = [ioName for ioName in ioNames if ioName not in self._ioValueLengths]
+        if len(missingIoNames) > 0:
+            ioNameValues = await self.GetControllerIOVariablesAsync(missingIoNames, useCache=False)
+            for ioName, ioValue in ioNameValues.items():
+                self._ioValueLengths[ioName] = len(ioValue)
+        return dict((ioName, self._ioValueLengths[ioName]) for ioName in ioNames)
+
+    def _ParseGetControllerIOVariablesResponse(self, ioNames, responseJson):
+        """ Extracts mapping of IO name to IO value from GetControllerIOVariables response.
+        """
         if 'errors' in responseJson:
             # command failed
-            raise Exception('Failed to get io variables for IO names %r. response: %s' % (ioNames, responseJson))
+            raise ControllerResponseError('Failed to get io variables for IO names %r. response: %s' % (ioNames, responseJson), response=responseJson)
         parameterValues = responseJson.get('data', {}).get('CommandRobotBridges', {}).get('parametervalue')
         if parameterValues is None or len(ioNames) != len(parameterValues):
             # failed to fetch parameter values
-            raise Exception('Failed to get io variables for IO names %r. response: %r' % (ioNames, responseJson))
+            raise ControllerResponseError('Failed to get io variables for IO names %r. response: %r' % (ioNames, responseJson), response=responseJson)
         return dict(zip(ioNames, parameterValues))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class IOWriteBatcher(object):
+    """ Merges IO writes from many coroutines into as few SetControllerIOVariables requests as possible.
+
+    Writes are sent in the order they were made. When an IO name is written again before being sent, the earlier write is dropped and the new value is placed after all writes made before it, so a pointer written after its queue entries is still sent after them. Only one batch is in flight at a time, writes made meanwhile are merged into the next batch.
+
+    Writes can belong to write groups, such as all writes of one order queue. Once a batch fails, pending and later writes of its write groups fail with the same error
+    until ResumeWriteGroup is called, so that writes depending on the failed ones, such as order queue entries following unwritten ones, are not applied.
+    """
+
+    _setControllerIOVariablesAsync = None # coroutine function sending list(tuple(ioName, ioValue)) to Mujin controller
+    _batchWindow = None  # seconds to wait for more writes before sending a batch, 0 to send on next event loop iteration
+    _maxBatchSize = None # number of pending writes at which batch is sent without waiting for batch window
+
+    _pendingWrites = None # list of tuple(ioNameValues, writeGroups, asyncio.Future) of pending writes, in the order they were made
+    _numPendingIoNameValues = 0 # number of IO variables set by pending writes, counting rewritten IO names once per write
+    _failedWriteGroups = None # dict mapping write group to exception of the failed batch, writes of these write groups fail until ResumeWriteGroup is called
+    _flushHandle = None # asyncio.Handle of scheduled flush
+    _sendTask = None # asyncio.Task sending the batch in flight
+
+    def __init__(self, setControllerIOVariablesAsync, batchWindow=0, maxBatchSize=100):
+        """
+        Args:
+            setControllerIOVariablesAsync (coroutine function): Sends list(tuple(ioName, ioValue)) to Mujin controller.
+            batchWindow (float): Seconds to wait for more writes before sending a batch. 0 to send on next event loop iteration.
+            maxBatchSize (int): Number of pending writes at which batch is sent without waiting for batch window.
+        """
+        self._setControllerIOVariablesAsync = setControllerIOVariablesAsync
+        self._batchWindow = batchWindow
+        self._maxBatchSize = maxBatchSize
+        self._pendingWrites = []
+        self._failedWriteGroups = {}
+
+    def SetControllerIOVariables(self, ioNameValues, writeGroups=None):
+        """ Adds IO writes to pending batch. Has to be called from within a running event loop.
+
+        Args:
+            ioNameValues (list(tuple(ioName, ioValue))): List of tuple(ioName, ioValue) for IO variables to set
+            writeGroups (list): Write groups the writes belong to. None if they do not depend on other writes.
+
+        Returns:
+            asyncio.Future: Resolves when the batch containing the writes is acknowledged by Mujin controller. Fails right away if a write group failed and was not resumed yet.
+        """
+        future = asyncio.get_running_loop().create_future()
+        for writeGroup in writeGroups or ():
+            if writeGroup in self._failedWriteGroups:
+                future.set_exception(self._failedWriteGroups[writeGroup])
+                return future
+        self._pendingWrites.append((ioNameValues, writeGroups, future))
+        self._numPendingIoNameValues += len(ioNameValues)
+        self._ScheduleFlush()
+        return future
+
+    def ResumeWriteGroup(self, writeGroup):
+        """ Lets writes of a write group be sent again after a batch containing some of them failed.
+
+        Args:
+            writeGroup: Write group passed to SetControllerIOVariables.
+        """
+        self._failedWriteGroups.pop(writeGroup, None)
+
+    def _ScheduleFlush(self):
+        """ Schedules sending of pending batch, unless a batch is already in flight or scheduled.
+        """
+        if self._sendTask is not None:
+            # pending batch is scheduled once batch in flight is acknowledged
+            return
+        if self._numPendingIoNameValues >= self._maxBatchSize:
+            if self._flushHandle is not None:
+                self._flushHandle.cancel()
+            self._Flush()
+        elif self._flushHandle is None:
+            loop = asyncio.get_running_loop()
+            if self._batchWindow > 0:
+                self._flushHandle = loop.call_later(self._batchWindow, self._Flush)
+            else:
+                self._flushHandle = loop.call_soon(self._Flush)
+
+    def _Flush(self):
+        """ Starts sending pending batch.
+        """
+        self._flushHandle = None
+        if len(self._pendingWrites) == 0:
+            return
+        writes = self._pendingWrites
+        self._pendingWrites = []
+        self._numPendingIoNameValues = 0
+        pendingIoNameValues = {}
+        for ioNameValues, writeGroups, future in writes:
+            for ioName, ioValue in ioNameValues:
+                # move rewritten IO name to the end to keep ordering against writes made before it
+                pendingIoNameValues.pop(ioName, None)
+                pendingIoNameValues[ioName] = ioValue
+        self._sendTask = asyncio.ensure_future(self._Send(list(pendingIoNameValues.items()), writes))
+
+    async def _Send(self, ioNameValues, writes):
+        """ Sends a batch and resolves futures of the writes in it.
+        """
+        try:
+            if len(ioNameValues) > 0:
+                await self._setControllerIOVariablesAsync(ioNameValues)
+        except Exception as e:
+            log.exception('failed to set batch of %d io variables: %s', len(ioNameValues), e)
+            for writeIoNameValues, writeGroups, future in writes:
+                for writeGroup in writeGroups or ():
+                    self._failedWriteGroups[writeGroup] = e
+                if not future.done():
+                    future.set_exception(e)
+            self._FailPendingWritesOfFailedGroups()
+        else:
+            for writeIoNameValues, writeGroups, future in writes:
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            self._sendTask = None
+            if len(self._pendingWrites) > 0:
+                self._ScheduleFlush()
+
+    def _FailPendingWritesOfFailedGroups(self):
+        """ Fails pending writes belonging to a failed write group instead of sending them.
+        """
+        pendingWrites = []
+        for ioNameValues, writeGroups, future in self._pendingWrites:
+            failedWriteGroups = [writeGroup for writeGroup in writeGroups or () if writeGroup in self._failedWriteGroups]
+            if len(failedWriteGroups) == 0:
+                pendingWrites.append((ioNameValues, writeGroups, future))
+            elif not future.done():
+                future.set_exception(self._failedWriteGroups[failedWriteGroups[0]])
+        self._pendingWrites = pendingWrites
+        self._numPendingIoNameValues = sum(len(ioNameValues) for ioNameValues, writeGroups, future in pendingWrites)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import fnmatch
+import time
+
+from .iowatcher import _IsPattern
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class IOReadCache(object):
+    """ Size-bounded LRU cache of IO values read from or written to Mujin controller, each IO name kept for a configurable time to live.
+    """
+
+    _maxSize = None # number of cached IO values above which least recently used ones are evicted
+    _defaultTtl = None # seconds IO values not matching any configured ttl are kept, 0 to not cache, None to keep until evicted
+    _ttls = None # dict mapping IO name to seconds its values are kept
+    _patternTtls = None # list of tuple(glob pattern, seconds) for IO names matching a pattern
+    _resolvedTtls = None # dict caching ttl resolved for IO name, cleared when ttls change
+    _entries = None # OrderedDict mapping IO name to tuple(IO value, expiry time.monotonic() or None), least recently used first
+
+    def __init__(self, maxSize=1000, defaultTtl=0, ttls=None):
+        """
+        Args:
+            maxSize (int): Number of cached IO values above which least recently used ones are evicted.
+            defaultTtl (float): Seconds IO values not matching any configured ttl are kept. 0 to not cache, None to keep until evicted.
+            ttls (dict): Mapping of IO name, or glob pattern of IO names, to seconds its values are kept. 0 to not cache, None to keep until evicted.
+        """
+        self._maxSize = maxSize
+        self._defaultTtl = defaultTtl
+        self._ttls = {}
+        self._patternTtls = []
+        self._resolvedTtls = {}
+        self._entries = collections.OrderedDict()
+        for ioNameOrPattern, ttl in (ttls or {}).items():
+            self.SetTtl(ioNameOrPattern, ttl)
+
+    @property
+    def size(self):
+        """ Number of cached IO values.
+        """
+        return len(self._entries)
+
+    def SetTtl(self, ioNameOrPattern, ttl):
+        """ Configures how long values of an IO name, or of IO names matching a glob pattern, are kept. Exact IO names take precedence over patterns,
+        earlier patterns over later ones.
+
+        Args:
+            ioNameOrPattern (str): IO name, or glob pattern of IO names such as location*ContainerId.
+            ttl (float): Seconds values are kept. 0 to not cache, None to keep until evicted.
+        """
+        if _IsPattern(ioNameOrPattern):
+            self._patternTtls = [(pattern, patternTtl) for pattern, patternTtl in self._patternTtls if pattern != ioNameOrPattern]
+            self._patternTtls.append((ioNameOrPattern, ttl))
+        else:
+            self._ttls[ioNameOrPattern] = ttl
+        self._resolvedTtls = {}
+
+    def GetTtl(self, ioName):
+        """ Returns seconds values of an IO name are kept, 0 if not cached, None if kept until evicted.
+        """
+        if ioName in self._ttls:
+            return self._ttls[ioName]
+        if ioName not in self._resolvedTtls:
+            ttl = self._defaultTtl
+            for pattern, patternTtl in self._patternTtls:
+                if fnmatch.fnmatchcase(ioName, pattern):
+                    ttl = patternTtl
+                    break
+            self._resolvedTtls[ioName] = ttl
+        return self._resolvedTtls[ioName]
+
+    def Get(self, ioName):
+        """ Looks up an unexpired cached IO value.
+
+        Args:
+            ioName (str): Name of IO variable.
+
+        Returns:
+            tuple(bool, value): Whether IO value is cached, and the IO value.
+        """
+        entry = self._entries.get(ioName)
+        if entry is None:
+            return False, None
+        ioValue, expiryTime = entry
+        if expiryTime is not None and expiryTime <= time.monotonic():
+            del self._entries[ioName]
+            return False, None
+        self._entries.move_to_end(ioName)
+        return True, ioValue
+
+    def Set(self, ioName, ioValue, ttl=-1):
+        """ Caches an IO value, evicting least recently used IO values above maxSize.
+
+        Args:
+            ioName (str): Name of IO variable.
+            ioValue: Value of IO variable.
+            ttl (float): Seconds to keep IO value, 0 to not cache, None to keep until evicted. Defaults to configured ttl of IO name.
+        """
+        if ttl == -1:
+            ttl = self.GetTtl(ioName)
+        if ttl == 0:
+            self._entries.pop(ioName, None)
+            return
+        self._entries[ioName] = (ioValue, None if ttl is None else time.monotonic() + ttl)
+        self._entries.move_to_end(ioName)
+        while len(self._entries) > self._maxSize:
+            self._entries.popitem(last=False)
+
+    def Discard(self, ioNames):
+        """ Removes cached values of IO names.
+
+        Args:
+            ioNames (iterable(str)): Names of IO variables.
+        """
+        for ioName in ioNames:
+            self._entries.pop(ioName, None)
+
+    def Clear(self):
+        """ Removes all cached IO values.
+        """
+        self._entries.clear()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import types
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _MakeReadOnly(ioMap):
+    """ Wraps IO map in a read-only view, unless it already is one.
+    """
+    if isinstance(ioMap, types.MappingProxyType):
+        return ioMap
+    return types.MappingProxyType(ioMap or {})
+
+
+class IOStateSnapshot(object):
+    """ Read-only IO state received from one SubscribeRobotBridgesState message. Snapshots are never modified once created, so taking one costs nothing.
+    """
+    __slots__ = ('_version', '_timestamp', '_sentIoMap', '_receivedIoMap', '_isStale')
+
+    def __init__(self, version=0, timestamp=0, sentIoMap=None, receivedIoMap=None, isStale=True):
+        """
+        Args:
+            version (int): Monotonically increasing version, incremented for each received subscription message.
+            timestamp (float): Time in seconds since epoch when the subscription message was received.
+            sentIoMap (dict): Mapping of IO name to IO value of sentiovalues. Must not be modified afterwards.
+            receivedIoMap (dict): Mapping of IO name to IO value of receivediovalues. Must not be modified afterwards.
+            isStale (bool): Whether the subscription is not connected, so IO values may be outdated.
+        """
+        self._version = version
+        self._timestamp = timestamp
+        self._sentIoMap = _MakeReadOnly(sentIoMap)
+        self._receivedIoMap = _MakeReadOnly(receivedIoMap)
+        self._isStale = isStale
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def timestamp(self):
+        return self._timestamp
+
+    @property
+    def isStale(self):
+        return self._isStale
+
+    @property
+    def sentIoMap(self):
+        return self._sentIoMap
+
+    @property
+    def receivedIoMap(self):
+        return self._receivedIoMap
+
+    def GetIOValue(self, ioName, defaultValue=None):
+        """ Looks up IO value in sent IO values first, then in received IO values.
+
+        Args:
+            ioName (str): Name of IO variable.
+            defaultValue: Value to return when IO variable is in neither map.
+
+        Returns:
+            Value of IO variable.
+        """
+        if ioName in self._sentIoMap:
+            return self._sentIoMap[ioName]
+        return self._receivedIoMap.get(ioName, defaultValue)
+
+    def GetChangedIoNameValues(self, previousIoState):
+        """ Computes which IO variables changed since a previous snapshot, comparing each IO name once.
+
+        Args:
+            previousIoState (IOStateSnapshot): Snapshot to compare with.
+
+        Returns:
+            dict: Mapping of changed IO name to new IO value, None if removed. Sent IO values take precedence over received IO values of same name.
+        """
+        changedIoNames = set()
+        for ioMap, previousIoMap in ((self._sentIoMap, previousIoState._sentIoMap), (self._receivedIoMap, previousIoState._receivedIoMap)):
+            if ioMap is previousIoMap or ioMap == previousIoMap:
+                continue
+            numAddedIoNames = 0
+            for ioName, ioValue in ioMap.items():
+                if ioName not in previousIoMap:
+                    numAddedIoNames += 1
+                    changedIoNames.add(ioName)
+                elif previousIoMap[ioName] != ioValue:
+                    changedIoNames.add(ioName)
+            if len(previousIoMap) > len(ioMap) - numAddedIoNames:
+                # some IO names were removed
+                for ioName in previousIoMap:
+                    if ioName not in ioMap:
+                        changedIoNames.add(ioName)
+
+        changedIoNameValues = {}
+        for ioName in changedIoNames:
+            ioValue = self.GetIOValue(ioName)
+            if ioValue != previousIoState.GetIOValue(ioName):
+                changedIoNameValues[ioName] = ioValue
+        return changedIoNameValues
+
+    def __repr__(self):
+        return '<IOStateSnapshot version=%d timestamp=%f isStale=%r>' % (self._version, self._timestamp, self._isStale)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import fnmatch
+import itertools
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _IsPattern(ioNameOrPattern):
+    """ Returns whether an IO name contains glob pattern characters.
+    """
+    return '*' in ioNameOrPattern or '?' in ioNameOrPattern or '[' in ioNameOrPattern
+
+
+class IOWatcher(object):
+    """ Registration of a function notified of changes of IO names matching a set of IO names and glob patterns.
+    """
+    __slots__ = ('ioNames', 'patterns', 'notifyFunction', 'sequence', 'isActive')
+
+    def __init__(self, ioNames, patterns, notifyFunction, sequence):
+        self.ioNames = ioNames               # frozenset of exact IO names watched
+        self.patterns = patterns             # tuple of glob patterns of IO names watched, such as location*OrderReadPointer
+        self.notifyFunction = notifyFunction # called with dict mapping changed IO name to new IO value
+        self.sequence = sequence             # registration order, watchers are notified in this order
+        self.isActive = True                 # False once removed
+
+
+class IOWatcherRegistry(object):
+    """ Indexes IO watchers by IO name, so that dispatching a change set only visits watchers of changed IO names. Also records when each IO name last changed.
+    """
+
+    _watchersByIoName = None # dict mapping IO name to list of IOWatcher watching it by exact name
+    _patternWatchers = None # list of IOWatcher watching glob patterns
+    _patternWatchersByIoName = None # dict caching list of pattern IOWatchers matching an IO name, cleared when pattern watchers change
+    _lastChangeTimestamps = None # dict mapping IO name to time in seconds since epoch when its value last changed
+    _sequence = None # itertools.count giving registration order of watchers
+
+    def __init__(self):
+        self._watchersByIoName = {}
+        self._patternWatchers = []
+        self._patternWatchersByIoName = {}
+        self._lastChangeTimestamps = {}
+        self._sequence = itertools.count()
+
+    def AddWatcher(self, ioNamesOrPatterns, notifyFunction):
+        """ Registers a function called with the changed IO values whenever IO names matching any of the given IO names or glob patterns change.
+
+        Args:
+            ioNamesOrPatterns (list(str)): IO names, or glob patterns of IO names such as location*OrderReadPointer.
+            notifyFunction (callable): Called with dict mapping changed IO name to new IO value.
+
+        Returns:
+            IOWatcher: Registration to pass to RemoveWatcher.
+        """
+        ioNames = []
+        patterns = []
+        for ioNameOrPattern in ioNamesOrPatterns:
+            (patterns if _IsPattern(ioNameOrPattern) else ioNames).append(ioNameOrPattern)
+        watcher = IOWatcher(frozenset(ioNames), tuple(patterns), notifyFunction, next(self._sequence))
+        for ioName in watcher.ioNames:
+            self._watchersByIoName.setdefault(ioName, []).append(watcher)
+        if watcher.patterns:
+            self._patternWatchers.append(watcher)
+            self._patternWatchersByIoName = {}
+        return watcher
+
+    def RemoveWatcher(self, watcher):
+        """ Unregisters a watcher returned by AddWatcher. Does nothing if already removed.
+        """
+        if not watcher.isActive:
+            return
+        watcher.isActive = False
+        for ioName in watcher.ioNames:
+            watchers = self._watchersByIoName[ioName]
+            watchers.remove(watcher)
+            if not watchers:
+                del self._watchersByIoName[ioName]
+        if watcher.patterns:
+            self._patternWatchers.remove(watcher)
+            self._patternWatchersByIoName = {}
+
+    def _GetPatternWatchers(self, ioName):
+        """ Returns pattern watchers matching an IO name, matching each IO name against patterns only once.
+        """
+        patternWatchers = self._patternWatchersByIoName.get(ioName)
+        if patternWatchers is None:
+            patternWatchers = [watcher for watcher in self._patternWatchers if any(fnmatch.fnmatchcase(ioName, pattern) for pattern in watcher.patterns)]
+            self._patternWatchersByIoName[ioName] = patternWatchers
+        return patternWatchers
+
+    def Dispatch(self, changedIoNameValues, timestamp):
+        """ Records change time of changed IO names and notifies watchers of them, in registration order.
+
+        Args:
+            changedIoNameValues (dict): Mapping of changed IO name to new IO value.
+            timestamp (float): Time in seconds since epoch when the change was received.
+        """
+        watcherChanges = {}
+        for ioName, ioValue in changedIoNameValues.items():
+            self._lastChangeTimestamps[ioName] = timestamp
+            for watcher in self._watchersByIoName.get(ioName, ()):
+                watcherChanges.setdefault(watcher, {})[ioName] = ioValue
+            if self._patternWatchers:
+                for watcher in self._GetPatternWatchers(ioName):
+                    watcherChanges.setdefault(watcher, {})[ioName] = ioValue
+        if not watcherChanges:
+            return
+        for watcher in sorted(watcherChanges, key=lambda watcher: watcher.sequence):
+            if not watcher.isActive:
+                continue
+            try:
+                watcher.notifyFunction(watcherChanges[watcher])
+            except Exception as e:
+                log.exception('io change callback failed: %s', e)
+
+    def GetLastChangeTimestamp(self, ioName):
+        """ Returns time in seconds since epoch when the value of an IO variable last changed, None if it never did.
+        """
+        return self._lastChangeTimestamps.get(ioName)
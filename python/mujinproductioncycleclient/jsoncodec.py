@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class JsonCodec(object):
+    """ Encodes values to compact JSON bytes and decodes JSON bytes or str, with orjson, ujson or the standard library json module.
+    """
+
+    name = None # name of JSON library used, one of orjson, ujson, json
+    _dumps = None # function encoding a value to JSON bytes
+    _loads = None # function decoding JSON bytes or str
+
+    def __init__(self, name=None):
+        """
+        Args:
+            name (str): JSON library to use, one of orjson, ujson, json. None for the fastest installed one.
+        """
+        if name is None:
+            name = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+        if name == 'orjson':
+            if orjson is None:
+                raise Exception('JSON library "orjson" is not installed')
+            self._dumps = _DumpsOrjson
+            self._loads = orjson.loads
+        elif name == 'ujson':
+            if ujson is None:
+                raise Exception('JSON library "ujson" is not installed')
+            self._dumps = _DumpsUjson
+            self._loads = ujson.loads
+        elif name == 'json':
+            self._dumps = _DumpsJson
+            self._loads = json.loads
+        else:
+            raise Exception('Unknown JSON library "%s"' % name)
+        self.name = name
+
+    def Dumps(self, value):
+        """ Encodes a value to compact UTF-8 JSON bytes.
+        """
+        return self._dumps(value)
+
+    def Loads(self, data):
+        """ Decodes JSON bytes or str.
+        """
+        return self._loads(data)
+
+    def __repr__(self):
+        return '<JsonCodec name=%r>' % self.name
+
+
+def _DumpsOrjson(value):
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+def _DumpsUjson(value):
+    return ujson.dumps(value, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+_jsonEncoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')) # created once, json.dumps with arguments creates an encoder each call
+
+def _DumpsJson(value):
+    return _jsonEncoder.encode(value).encode('utf-8')
+
+
+_defaultJsonCodec = None # JsonCodec shared by clients not given one, created on first use
+
+def GetDefaultJsonCodec():
+    """ Returns shared JsonCodec using the fastest installed JSON library.
+    """
+    global _defaultJsonCodec
+    if _defaultJsonCodec is None:
+        _defaultJsonCodec = JsonCodec()
+        log.debug('using JSON library "%s"', _defaultJsonCodec.name)
+    return _defaultJsonCodec
+
+
+def MinifyGraphQLQuery(query):
+    """ Collapses whitespace and drops line breaks of a GraphQL query outside of string literals.
+
+    Args:
+        query (str): GraphQL query text.
+
+    Returns:
+        str: Equivalent query text without redundant whitespace.
+    """
+    punctuators = '{}()[]:,!=$@|&'
+    parts = []
+    pendingWhitespace = False
+    inString = False
+    index = 0
+    while index < len(query):
+        character = query[index]
+        if inString:
+            parts.append(character)
+            if character == '\\' and index + 1 < len(query):
+                index += 1
+                parts.append(query[index])
+            elif character == '"':
+                inString = False
+        elif character.isspace():
+            pendingWhitespace = True
+        else:
+            if pendingWhitespace and parts and parts[-1][-1] not in punctuators and character not in punctuators:
+                parts.append(' ')
+            pendingWhitespace = False
+            parts.append(character)
+            if character == '"':
+                inString = True
+        index += 1
+    return ''.join(parts)
+
+
+class GraphQLRequestTemplate(object):
+    """ GraphQL request body of one operation with the minified query encoded once, so only variables are encoded per request.
+    """
+
+    operationName = None # name of GraphQL operation, used in metrics
+    _codec = None # JsonCodec used to encode variables
+    _prefix = None # bytes of request body before variables
+    _suffix = None # bytes of request body after variables
+
+    def __init__(self, operationName, query, codec):
+        """
+        Args:
+            operationName (str): Name of GraphQL operation.
+            query (str): GraphQL query text, minified before encoding.
+            codec (JsonCodec): Codec used to encode the query and variables.
+        """
+        self.operationName = operationName
+        self._codec = codec
+        self._prefix = b'{"query":' + codec.Dumps(MinifyGraphQLQuery(query)) + b',"variables":'
+        self._suffix = b'}'
+
+    def Encode(self, variables):
+        """ Encodes request body with given variables.
+
+        Args:
+            variables (dict): GraphQL query variables.
+
+        Returns:
+            bytes: JSON request body.
+        """
+        return self._prefix + self._codec.Dumps(variables) + self._suffix
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import inspect
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class _LocationState(object):
+    """ Configuration and container state of one managed location.
+    """
+    __slots__ = (
+        'locationName',
+        'containerIdIOName',
+        'hasContainerIOName',
+        'moveInIOName',
+        'moveOutIOName',
+        'hasContainer',
+        'containerId',
+    )
+
+    def __init__(self, locationName, containerIdIOName, hasContainerIOName, moveInIOName, moveOutIOName):
+        self.locationName = locationName              # name of the location set up in mujin controller
+        self.containerIdIOName = containerIdIOName    # io name used to set container id of the location
+        self.hasContainerIOName = hasContainerIOName  # io name used to set whether the location has a container
+        self.moveInIOName = moveInIOName              # io name of move-in request sent from mujin
+        self.moveOutIOName = moveOutIOName            # io name of move-out request sent from mujin
+        self.hasContainer = False                     # whether the location has a container as last written
+        self.containerId = ''                         # container id of the location as last written
+
+
+class LocationManager(object):
+    """ Manages container state of any number of pick and place locations upon move-in and move-out requests sent from Mujin.
+
+    Reacts only when move-in or move-out signals change, and writes container state updates of all locations changed at the same time with a single request.
+    """
+
+    _graphClient = None # instance of graphqlclient.GraphClient
+    _locations = None # dict mapping location name to _LocationState
+    _moveIOLocationNames = None # dict mapping move-in and move-out io names to location name
+    _containerIdProvider = None # function called with location name returning container id to move in, or awaitable of it
+    _staticContainerIds = None # dict mapping location name to containerId of location configuration, used when there is no container id provider
+    _retryInterval = None # seconds to wait before retrying locations whose container id lookup or update failed
+
+    _changedLocationNames = None # set of location names whose move signals changed since last handled
+    _changedEvent = None # asyncio.Event set when changedLocationNames becomes non-empty, created when running
+
+    def __init__(self, graphClient, locations, containerIdProvider=None, retryInterval=1.0):
+        """
+        Args:
+            graphClient (MujinGraphClient): For checking Mujin IO state and setting location state IO.
+            locations (list(dict)): Location configuration, each with locationName and locationIndex. IO names default to
+                location{locationIndex}ContainerId, location{locationIndex}HasContainer, moveInLocation{locationIndex}Container and moveOutLocation{locationIndex}Container,
+                and can be overridden with containerIdIOName, hasContainerIOName, moveInIOName and moveOutIOName. Optional containerId is moved in when there is no containerIdProvider.
+            containerIdProvider (callable): Called with location name on move-in, returns container id to move in or an awaitable of it, such as AGV id or barcode lookup.
+                Container id must not be constant when the container changes. Defaults to containerId of location configuration.
+            retryInterval (float): Seconds to wait before retrying locations whose container id lookup or update failed.
+        """
+        self._graphClient = graphClient
+        self._locations = {}
+        self._moveIOLocationNames = {}
+        self._staticContainerIds = {}
+        for location in locations:
+            locationName = location['locationName']
+            locationIndex = location.get('locationIndex')
+            locationState = _LocationState(
+                locationName=locationName,
+                containerIdIOName=location.get('containerIdIOName') or 'location%dContainerId' % locationIndex,
+                hasContainerIOName=location.get('hasContainerIOName') or 'location%dHasContainer' % locationIndex,
+                moveInIOName=location.get('moveInIOName') or 'moveInLocation%dContainer' % locationIndex,
+                moveOutIOName=location.get('moveOutIOName') or 'moveOutLocation%dContainer' % locationIndex,
+            )
+            if locationName in self._locations:
+                raise Exception('Location "%s" is configured more than once' % locationName)
+            self._locations[locationName] = locationState
+            self._moveIOLocationNames[locationState.moveInIOName] = locationName
+            self._moveIOLocationNames[locationState.moveOutIOName] = locationName
+            self._staticContainerIds[locationName] = location.get('containerId', '')
+        self._containerIdProvider = containerIdProvider or self._staticContainerIds.get
+        self._retryInterval = retryInterval
+        self._changedLocationNames = set()
+
+    @property
+    def locationNames(self):
+        """ Names of managed locations.
+        """
+        return list(self._locations)
+
+    def HasContainer(self, locationName):
+        """ Returns whether a location has a container as last written to Mujin controller.
+        """
+        return self._locations[locationName].hasContainer
+
+    def GetContainerId(self, locationName):
+        """ Returns container id of a location as last written to Mujin controller, empty if it has no container.
+        """
+        return self._locations[locationName].containerId
+
+    def _OnMoveIOChanged(self, changedIoNameValues):
+        """ Marks locations whose move-in or move-out signal changed to be handled.
+        """
+        for ioName in changedIoNameValues:
+            self._changedLocationNames.add(self._moveIOLocationNames[ioName])
+        if self._changedEvent is not None:
+            self._changedEvent.set()
+
+    async def Run(self):
+        """ Handles move-in and move-out requests of all managed locations until cancelled.
+        """
+        receivedIoMap = self._graphClient.receivedIoMap
+        for locationState in self._locations.values():
+            locationState.hasContainer = bool(receivedIoMap.get(locationState.hasContainerIOName))
+            locationState.containerId = receivedIoMap.get(locationState.containerIdIOName) or ''
+
+        self._changedEvent = asyncio.Event()
+        self._graphClient.RegisterIOChangeCallback(self._moveIOLocationNames, self._OnMoveIOChanged)
+        try:
+            # handle requests already pending before we started watching
+            self._changedLocationNames.update(self._locations)
+            while True:
+                if not self._changedLocationNames:
+                    self._changedEvent.clear()
+                    await self._changedEvent.wait()
+                failedLocationNames = await self._HandleChangedLocations()
+                if failedLocationNames:
+                    self._changedLocationNames.update(failedLocationNames)
+                    await asyncio.sleep(self._retryInterval)
+        finally:
+            self._graphClient.UnregisterIOChangeCallback(self._OnMoveIOChanged)
+            self._changedEvent = None
+
+    async def _HandleChangedLocations(self):
+        """ Handles move-in and move-out requests of locations whose move signals changed, writing all container state updates with a single request.
+
+        Returns:
+            list(str): Names of locations whose container id lookup or update failed.
+        """
+        changedLocationNames = self._changedLocationNames
+        self._changedLocationNames = set()
+
+        sentIoMap = self._graphClient.sentIoMap
+        moveInLocationStates = []
+        moveOutLocationStates = []
+        for locationName in changedLocationNames:
+            locationState = self._locations[locationName]
+            if sentIoMap.get(locationState.moveInIOName) and not locationState.hasContainer:
+                moveInLocationStates.append(locationState)
+            elif sentIoMap.get(locationState.moveOutIOName) and locationState.hasContainer:
+                moveOutLocationStates.append(locationState)
+        if not moveInLocationStates and not moveOutLocationStates:
+            return []
+
+        # look up container ids of all moved in locations concurrently
+        failedLocationNames = []
+        containerIds = await asyncio.gather(*[self._GetContainerId(locationState.locationName) for locationState in moveInLocationStates], return_exceptions=True)
+        updates = []
+        for locationState, containerId in zip(moveInLocationStates, containerIds):
+            if isinstance(containerId, Exception):
+                log.error('failed to get container id of location "%s": %s', locationState.locationName, containerId)
+                failedLocationNames.append(locationState.locationName)
+                continue
+            updates.append((locationState, True, containerId))
+        for locationState in moveOutLocationStates:
+            updates.append((locationState, False, ''))
+        if not updates:
+            return failedLocationNames
+
+        ioNameValues = []
+        for locationState, hasContainer, containerId in updates:
+            ioNameValues += [
+                (locationState.containerIdIOName, containerId),
+                (locationState.hasContainerIOName, hasContainer),
+            ]
+        try:
+            await self._graphClient.SetControllerIOVariablesBatched(ioNameValues)
+        except Exception as e:
+            log.exception('failed to update container state of locations %s: %s', [locationState.locationName for locationState, hasContainer, containerId in updates], e)
+            return failedLocationNames + [locationState.locationName for locationState, hasContainer, containerId in updates]
+
+        for locationState, hasContainer, containerId in updates:
+            if hasContainer:
+                log.info('Moved in container "%s" to location "%s"', containerId, locationState.locationName)
+            else:
+                log.info('Moved out container "%s" of location "%s"', locationState.containerId, locationState.locationName)
+            locationState.hasContainer = hasContainer
+            locationState.containerId = containerId
+        return failedLocationNames
+
+    async def _GetContainerId(self, locationName):
+        """ Calls container id provider, awaiting its result if it returns an awaitable.
+        """
+        containerId = self._containerIdProvider(locationName)
+        if inspect.isawaitable(containerId):
+            containerId = await containerId
+        return containerId
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+
+import logging
+log = logging.getLogger(__name__)
+
+# upper bounds in seconds of latency histogram buckets, an implicit +Inf bucket follows
+defaultLatencyBuckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricType(object):
+    """ Types of metrics kept by ClientMetrics, named as in the Prometheus text format.
+    """
+    Counter = 'counter'
+    Gauge = 'gauge'
+    Histogram = 'histogram'
+
+
+class Histogram(object):
+    """ Cumulative histogram of observed values with fixed bucket upper bounds.
+    """
+    __slots__ = ('buckets', 'bucketCounts', 'count', 'sum')
+
+    def __init__(self, buckets=defaultLatencyBuckets):
+        self.buckets = tuple(buckets)                   # sorted upper bounds of buckets
+        self.bucketCounts = [0] * (len(self.buckets) + 1) # number of observations per bucket, last one is +Inf
+        self.count = 0                                  # number of observations
+        self.sum = 0.0                                  # sum of observed values
+
+    def Observe(self, value):
+        self.bucketCounts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def Merge(self, other):
+        """ Adds observations of another histogram with the same buckets.
+
+        Args:
+            other (Histogram): Histogram to add.
+        """
+        assert other.buckets == self.buckets, 'cannot merge histograms with different buckets'
+        for index, bucketCount in enumerate(other.bucketCounts):
+            self.bucketCounts[index] += bucketCount
+        self.count += other.count
+        self.sum += other.sum
+
+    def GetPercentile(self, percentile):
+        """ Estimates percentile as the upper bound of the bucket containing it.
+
+        Args:
+            percentile (float): Percentile between 0 and 100.
+
+        Returns:
+            float: Upper bound of bucket, None if there are no observations, float('inf') if in +Inf bucket.
+        """
+        if self.count == 0:
+            return None
+        rank = percentile / 100.0 * self.count
+        cumulativeCount = 0
+        for index, bucketCount in enumerate(self.bucketCounts):
+            cumulativeCount += bucketCount
+            if cumulativeCount >= rank and cumulativeCount > 0:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+class ClientMetrics(object):
+    """ In-memory counters, histograms and gauges describing client activity.
+
+    Every counter increment and histogram observation is also passed to registered sinks as sinkFunction(metricType, name, value, labels),
+    so they can be forwarded to other monitoring or tracing systems. Gauges are computed on demand from registered functions.
+    """
+
+    _latencyBuckets = None # bucket upper bounds of new histograms
+    _metricTypes = None # dict mapping metric name to MetricType value
+    _metricHelps = None # dict mapping metric name to help text
+    _counters = None # dict mapping metric name to dict mapping labels key to counter value
+    _histograms = None # dict mapping metric name to dict mapping labels key to Histogram
+    _gauges = None # dict mapping metric name to dict mapping labels key to function returning gauge value
+    _sinks = None # list of functions called with (metricType, name, value, labels) for each counter increment and histogram observation
+
+    def __init__(self, latencyBuckets=defaultLatencyBuckets):
+        """
+        Args:
+            latencyBuckets (list(float)): Sorted upper bounds of histogram buckets.
+        """
+        self._latencyBuckets = tuple(latencyBuckets)
+        self._metricTypes = {}
+        self._metricHelps = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._sinks = []
+
+    def AddSink(self, sinkFunction):
+        """ Registers a function called with (metricType, name, value, labels) for each counter increment and histogram observation.
+
+        Args:
+            sinkFunction (callable): Called synchronously, should be fast.
+        """
+        self._sinks.append(sinkFunction)
+
+    def RemoveSink(self, sinkFunction):
+        """ Unregisters a function registered with AddSink.
+        """
+        self._sinks.remove(sinkFunction)
+
+    def _Register(self, metricType, name, helpText):
+        registeredMetricType = self._metricTypes.setdefault(name, metricType)
+        assert registeredMetricType == metricType, 'metric "%s" is a %s, not a %s' % (name, registeredMetricType, metricType)
+        if helpText and name not in self._metricHelps:
+            self._metricHelps[name] = helpText
+
+    def _CallSinks(self, metricType, name, value, labels):
+        for sinkFunction in self._sinks:
+            try:
+                sinkFunction(metricType, name, value, labels or {})
+            except Exception as e:
+                log.exception('metrics sink failed: %s', e)
+
+    def IncrementCounter(self, name, value=1, labels=None, helpText=None):
+        """ Increments a counter.
+
+        Args:
+            name (str): Metric name.
+            value (float): Amount to increment by.
+            labels (dict): Mapping of label name to label value.
+            helpText (str): Description of metric, used for first registration.
+        """
+        if name not in self._metricTypes:
+            self._Register(MetricType.Counter, name, helpText)
+        counters = self._counters.setdefault(name, {})
+        labelsKey = _GetLabelsKey(labels)
+        counters[labelsKey] = counters.get(labelsKey, 0) + value
+        if self._sinks:
+            self._CallSinks(MetricType.Counter, name, value, labels)
+
+    def ObserveHistogram(self, name, value, labels=None, helpText=None):
+        """ Records an observation in a histogram.
+
+        Args:
+            name (str): Metric name.
+            value (float): Observed value, such as a latency in seconds.
+            labels (dict): Mapping of label name to label value.
+            helpText (str): Description of metric, used for first registration.
+        """
+        if name not in self._metricTypes:
+            self._Register(MetricType.Histogram, name, helpText)
+        histograms = self._histograms.setdefault(name, {})
+        labelsKey = _GetLabelsKey(labels)
+        histogram = histograms.get(labelsKey)
+        if histogram is None:
+            histogram = histograms[labelsKey] = Histogram(self._latencyBuckets)
+        histogram.Observe(value)
+        if self._sinks:
+            self._CallSinks(MetricType.Histogram, name, value, labels)
+
+    def RegisterGauge(self, name, valueFunction, labels=None, helpText=None):
+        """ Registers a gauge whose value is computed by calling valueFunction when read.
+
+        Args:
+            name (str): Metric name.
+            valueFunction (callable): Returns current gauge value.
+            labels (dict): Mapping of label name to label value.
+            helpText (str): Description of metric, used for first registration.
+        """
+        self._Register(MetricType.Gauge, name, helpText)
+        self._gauges.setdefault(name, {})[_GetLabelsKey(labels)] = valueFunction
+
+    def UnregisterGauge(self, name, labels=None):
+        """ Unregisters a gauge registered with RegisterGauge.
+        """
+        self._gauges.get(name, {}).pop(_GetLabelsKey(labels), None)
+
+    def GetCounter(self, name, labels=None):
+        """ Returns value of a counter, 0 if never incremented.
+        """
+        return self._counters.get(name, {}).get(_GetLabelsKey(labels), 0)
+
+    def GetHistogram(self, name, labels=None):
+        """ Returns Histogram of a metric, None if never observed.
+        """
+        return self._histograms.get(name, {}).get(_GetLabelsKey(labels))
+
+    def GetCounterValues(self, name):
+        """ Returns values of a counter for all labels.
+
+        Returns:
+            list(tuple(dict, float)): Labels and counter value.
+        """
+        return [(dict(labelsKey), value) for labelsKey, value in self._counters.get(name, {}).items()]
+
+    def GetHistograms(self, name):
+        """ Returns Histograms of a metric for all labels.
+
+        Returns:
+            list(tuple(dict, Histogram)): Labels and histogram.
+        """
+        return [(dict(labelsKey), histogram) for labelsKey, histogram in self._histograms.get(name, {}).items()]
+
+    def GetGauge(self, name, labels=None):
+        """ Returns current value of a gauge, None if not registered.
+        """
+        valueFunction = self._gauges.get(name, {}).get(_GetLabelsKey(labels))
+        if valueFunction is None:
+            return None
+        return valueFunction()
+
+    def FormatPrometheusText(self, prefix='mujinproductioncycleclient_'):
+        """ Formats all metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): Prefix added to every metric name.
+
+        Returns:
+            str: Metrics in Prometheus text format.
+        """
+        lines = []
+        for name in sorted(self._metricTypes):
+            metricType = self._metricTypes[name]
+            fullName = prefix + name
+            if name in self._metricHelps:
+                lines.append('# HELP %s %s' % (fullName, self._metricHelps[name].replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE %s %s' % (fullName, metricType))
+            if metricType == MetricType.Counter:
+                for labelsKey, value in self._counters.get(name, {}).items():
+                    lines.append('%s%s %s' % (fullName, _FormatLabels(labelsKey), _FormatValue(value)))
+            elif metricType == MetricType.Gauge:
+                for labelsKey, valueFunction in self._gauges.get(name, {}).items():
+                    try:
+                        value = valueFunction()
+                    except Exception as e:
+                        log.exception('failed to compute gauge "%s": %s', name, e)
+                        continue
+                    if value is not None:
+                        lines.append('%s%s %s' % (fullName, _FormatLabels(labelsKey), _FormatValue(value)))
+            elif metricType == MetricType.Histogram:
+                for labelsKey, histogram in self._histograms.get(name, {}).items():
+                    cumulativeCount = 0
+                    for index, bucketCount in enumerate(histogram.bucketCounts):
+                        cumulativeCount += bucketCount
+                        upperBound = _FormatValue(histogram.buckets[index]) if index < len(histogram.buckets) else '+Inf'
+                        lines.append('%s_bucket%s %d' % (fullName, _FormatLabels(labelsKey + (('le', upperBound),)), cumulativeCount))
+                    lines.append('%s_sum%s %s' % (fullName, _FormatLabels(labelsKey), _FormatValue(histogram.sum)))
+                    lines.append('%s_count%s %d' % (fullName, _FormatLabels(labelsKey), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _GetLabelsKey(labels):
+    """ Returns hashable key of labels dict.
+    """
+    if not labels:
+        return ()
+    return tuple(sorted(labels.items()))
+
+def _FormatLabels(labelsKey):
+    if not labelsKey:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (labelName, str(labelValue).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for labelName, labelValue in labelsKey)
+
+def _FormatValue(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import base64
+import json
+import re
+
+from aiohttp import web
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class MockMujinController(object):
+    """ In-process stand-in for a Mujin controller, serving the GraphQL HTTP endpoint and the graphql-ws SubscribeRobotBridgesState subscription.
+
+    Simulates the production cycle order queues and order result queues with their four pointer signals, isRunningProductionCycle,
+    and the location move-in and move-out handshakes, with configurable delays. Meant for testing and benchmarking clients without a real controller.
+    """
+
+    _host = None # host to listen on
+    _port = None # port to listen on, 0 to pick a free port
+    _authorization = None # expected value of Authorization header
+
+    _numQueues = None # number of production queues simulated
+    _queueLength = None # length of each order queue and order result queue
+    _requestDelay = None # seconds each GraphQL request takes to be handled
+    _pickupDelay = None # seconds between order entry being written and order read pointer advancing past it
+    _processingDelay = None # seconds between order being picked up and its result entry being written
+    _startProductionCycleDelay = None # seconds between startProductionCycle and isRunningProductionCycle
+    _publishInterval = None # seconds between subscription messages, 0 to publish on next event loop iteration after a change
+    _keepAliveInterval = None # seconds between keep-alive messages on subscriptions
+    _locationIndices = None # dict mapping location name to location index for move-in and move-out handshakes
+
+    _receivedIoValues = None # dict mapping IO name to IO value of IO set by clients, or read pointers set by controller
+    _sentIoValues = None # dict mapping IO name to IO value of IO set by controller
+    _arrayIoValues = None # dict mapping IO name to list of IO values, for order queues and order result queues
+    _ioChanged = None # asyncio.Event set and replaced each time IO changes
+    _publishHandle = None # asyncio.Handle of scheduled subscription publish
+    _websockets = None # set of web.WebSocketResponse with running subscriptions
+
+    _runner = None # web.AppRunner serving the endpoint
+    _tasks = None # list of asyncio.Task simulating the controller
+
+    numRequests = 0 # number of GraphQL requests handled
+    numPublishedMessages = 0 # number of subscription messages sent, counted once per subscriber
+    numProcessedOrders = 0 # number of order entries whose result entries were written
+
+    def __init__(self, host='127.0.0.1', port=0, username='mujin', password='mujin', numQueues=1, queueLength=100, requestDelay=0, pickupDelay=0, processingDelay=0, startProductionCycleDelay=0, publishInterval=0, keepAliveInterval=5.0, locationIndices=None):
+        """
+        Args:
+            host (str): Host to listen on.
+            port (int): Port to listen on, 0 to pick a free port.
+            username (str): Username clients have to log in with.
+            password (str): Password clients have to log in with.
+            numQueues (int): Number of production queues, with signals productionQueue{i}Order, location{i}OrderReadPointer and so on for i from 1.
+            queueLength (int): Length of each order queue and order result queue.
+            requestDelay (float): Seconds each GraphQL request takes to be handled.
+            pickupDelay (float): Seconds between order entry being written and order read pointer advancing past it.
+            processingDelay (float): Seconds between order being picked up and its result entry being written.
+            startProductionCycleDelay (float): Seconds between startProductionCycle and isRunningProductionCycle.
+            publishInterval (float): Seconds between subscription messages, 0 to publish on next event loop iteration after a change.
+            keepAliveInterval (float): Seconds between keep-alive messages on subscriptions.
+            locationIndices (dict): Mapping of location name to location index. Orders with pick or place location in here go through the
+                moveInLocation{index}Container/location{index}HasContainer handshakes before processing and moveOutLocation{index}Container after.
+        """
+        self._host = host
+        self._port = port
+        usernamePassword = '%s:%s' % (username, password)
+        self._authorization = 'Basic %s' % base64.b64encode(usernamePassword.encode('utf-8')).decode('ascii')
+        self._numQueues = numQueues
+        self._queueLength = queueLength
+        self._requestDelay = requestDelay
+        self._pickupDelay = pickupDelay
+        self._processingDelay = processingDelay
+        self._startProductionCycleDelay = startProductionCycleDelay
+        self._publishInterval = publishInterval
+        self._keepAliveInterval = keepAliveInterval
+        self._locationIndices = dict(locationIndices or {})
+
+        self._receivedIoValues = {
+            'startProductionCycle': False,
+            'stopProductionCycle': False,
+        }
+        self._sentIoValues = {
+            'startProductionCycle': False,
+            'isRunningProductionCycle': False,
+        }
+        self._arrayIoValues = {}
+        for queueIndex in range(1, numQueues + 1):
+            self._arrayIoValues['productionQueue%dOrder' % queueIndex] = [None] * queueLength
+            self._arrayIoValues['productionQueue%dResult' % queueIndex] = [None] * queueLength
+            for pointerIOName in ('location%dOrderReadPointer', 'location%dOrderWritePointer', 'location%dOrderResultReadPointer', 'location%dOrderResultWritePointer'):
+                self._receivedIoValues[pointerIOName % queueIndex] = 1
+        for locationIndex in self._locationIndices.values():
+            self._receivedIoValues['location%dContainerId' % locationIndex] = ''
+            self._receivedIoValues['location%dHasContainer' % locationIndex] = False
+            self._sentIoValues['moveInLocation%dContainer' % locationIndex] = False
+            self._sentIoValues['moveOutLocation%dContainer' % locationIndex] = False
+        self._websockets = set()
+        self._tasks = []
+
+    @property
+    def url(self):
+        """ URL to pass to MujinGraphClient, available once started.
+        """
+        return 'http://%s:%d' % (self._host, self._port)
+
+    @property
+    def receivedIoValues(self):
+        return self._receivedIoValues
+
+    @property
+    def sentIoValues(self):
+        return self._sentIoValues
+
+    async def Start(self):
+        """ Starts serving the GraphQL endpoint and simulating the production cycle.
+        """
+        self._ioChanged = asyncio.Event()
+        app = web.Application()
+        app.router.add_route('*', '/api/v2/graphql', self._HandleRequest)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        self._port = self._runner.addresses[0][1]
+        self._tasks.append(asyncio.ensure_future(self._RunProductionCycle()))
+        for queueIndex in range(1, self._numQueues + 1):
+            self._tasks.append(asyncio.ensure_future(self._RunProductionQueue(queueIndex)))
+        log.debug('mock controller listening on %s', self.url)
+
+    async def Stop(self):
+        """ Stops serving and simulating, closing all subscriptions.
+        """
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._publishHandle is not None:
+            self._publishHandle.cancel()
+            self._publishHandle = None
+        for websocket in list(self._websockets):
+            await websocket.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.Start()
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        await self.Stop()
+
+    def GetIOValue(self, ioName):
+        """ Returns IO value as a GetControllerIOVariable query would.
+
+        Args:
+            ioName (str): Name of IO variable, array elements as "name[index]" with 0-based index.
+
+        Returns:
+            Value of IO variable.
+
+        Raises:
+            KeyError: If there is no such IO variable.
+        """
+        match = re.match(r'^(.*)\[(\d+)\]$', ioName)
+        if match is not None:
+            return self._arrayIoValues[match.group(1)][int(match.group(2))]
+        if ioName in self._arrayIoValues:
+            return list(self._arrayIoValues[ioName])
+        if ioName in self._sentIoValues:
+            return self._sentIoValues[ioName]
+        return self._receivedIoValues[ioName]
+
+    def SetIOValues(self, ioNameValues, sent=False):
+        """ Sets IO values, as a SetControllerIOVariables query would when sent is False, or as the controller itself would when sent is True.
+
+        Args:
+            ioNameValues (list(tuple(ioName, ioValue))): List of tuple(ioName, ioValue) for IO variables to set, array elements as "name[index]" with 0-based index.
+            sent (bool): Whether to set sent IO values instead of received IO values.
+        """
+        for ioName, ioValue in ioNameValues:
+            match = re.match(r'^(.*)\[(\d+)\]$', ioName)
+            if match is not None:
+                self._arrayIoValues[match.group(1)][int(match.group(2))] = ioValue
+            elif sent:
+                self._sentIoValues[ioName] = ioValue
+            else:
+                self._receivedIoValues[ioName] = ioValue
+                if ioName in self._sentIoValues:
+                    # echo IO that the controller also sends back
+                    self._sentIoValues[ioName] = ioValue
+        self._NotifyIOChanged()
+
+    def _NotifyIOChanged(self):
+        """ Wakes up simulation waiting on IO and schedules publishing of new IO state to subscribers.
+        """
+        ioChanged, self._ioChanged = self._ioChanged, asyncio.Event()
+        ioChanged.set()
+        if self._publishHandle is None and len(self._websockets) > 0:
+            loop = asyncio.get_running_loop()
+            if self._publishInterval > 0:
+                self._publishHandle = loop.call_later(self._publishInterval, self._Publish)
+            else:
+                self._publishHandle = loop.call_soon(self._Publish)
+
+    async def _WaitForIO(self, predicate):
+        """ Waits until predicate returns True, reevaluating it each time IO changes.
+        """
+        while not predicate():
+            await self._ioChanged.wait()
+
+    def _GetRobotBridgesStateMessage(self):
+        return json.dumps({
+            'type': 'data',
+            'id': '1',
+            'payload': {
+                'data': {
+                    'SubscribeRobotBridgesState': {
+                        'receivediovalues': list(self._receivedIoValues.items()),
+                        'sentiovalues': list(self._sentIoValues.items()),
+                    },
+                },
+            },
+        })
+
+    def _Publish(self):
+        """ Sends current IO state to all subscribers.
+        """
+        self._publishHandle = None
+        message = self._GetRobotBridgesStateMessage()
+        for websocket in list(self._websockets):
+            if websocket.closed:
+                self._websockets.discard(websocket)
+                continue
+            asyncio.ensure_future(websocket.send_str(message))
+            self.numPublishedMessages += 1
+
+    async def _HandleRequest(self, request):
+        if request.headers.get('Authorization') != self._authorization:
+            raise web.HTTPUnauthorized()
+        if request.headers.get('Upgrade', '').lower() == 'websocket':
+            return await self._HandleSubscription(request)
+        if request.method != 'POST':
+            raise web.HTTPMethodNotAllowed(request.method, ['POST'])
+
+        self.numRequests += 1
+        if self._requestDelay > 0:
+            await asyncio.sleep(self._requestDelay)
+        body = json.loads(await request.read())
+        match = re.search(r'CommandRobotBridges\(command:\s*"(\w+)"', body.get('query') or '')
+        command = match.group(1) if match is not None else None
+        parameters = (body.get('variables') or {}).get('parameters') or {}
+        try:
+            if command == 'SetControllerIOVariables':
+                self.SetIOValues(parameters['ioNameValues'])
+                result = {}
+            elif command == 'GetControllerIOVariable':
+                result = {'parametervalue': self.GetIOValue(parameters['parametername'])}
+            elif command == 'GetControllerIOVariables':
+                result = {'parametervalue': [self.GetIOValue(ioName) for ioName in parameters['parameternames']]}
+            else:
+                return web.json_response({'errors': [{'message': 'unsupported query %r' % body.get('query')}]})
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            return web.json_response({'errors': [{'message': 'failed to execute %s: %r' % (command, e)}]})
+        result.update({'commandid': self.numRequests, 'elapsedtime': 0, 'elapsedTimeInPause': 0, 'finishedTimeStamp': 0})
+        return web.json_response({'data': {'CommandRobotBridges': result}})
+
+    async def _HandleSubscription(self, request):
+        websocket = web.WebSocketResponse(protocols=('graphql-ws',), heartbeat=None)
+        await websocket.prepare(request)
+        keepAliveTask = None
+        try:
+            async for message in websocket:
+                data = json.loads(message.data)
+                if data.get('type') == 'connection_init':
+                    await websocket.send_str(json.dumps({'type': 'connection_ack'}))
+                elif data.get('type') == 'start':
+                    await websocket.send_str(json.dumps({'type': 'ka'}))
+                    self._websockets.add(websocket)
+                    await websocket.send_str(self._GetRobotBridgesStateMessage())
+                    self.numPublishedMessages += 1
+                    if keepAliveTask is None:
+                        keepAliveTask = asyncio.ensure_future(self._SendKeepAlive(websocket))
+                elif data.get('type') in ('stop', 'connection_terminate'):
+                    self._websockets.discard(websocket)
+        finally:
+            self._websockets.discard(websocket)
+            if keepAliveTask is not None:
+                keepAliveTask.cancel()
+        return websocket
+
+    async def _SendKeepAlive(self, websocket):
+        while not websocket.closed:
+            await asyncio.sleep(self._keepAliveInterval)
+            await websocket.send_str(json.dumps({'type': 'ka'}))
+
+    def _IncrementPointer(self, pointerValue):
+        pointerValue += 1
+        if pointerValue > self._queueLength:
+            pointerValue = 1
+        return pointerValue
+
+    async def _RunProductionCycle(self):
+        """ Starts and stops production cycle on startProductionCycle and stopProductionCycle.
+        """
+        while True:
+            await self._WaitForIO(lambda: self._receivedIoValues['startProductionCycle'] or self._receivedIoValues['stopProductionCycle'])
+            if self._receivedIoValues['stopProductionCycle']:
+                self.SetIOValues([('isRunningProductionCycle', False)], sent=True)
+            elif not self._sentIoValues['isRunningProductionCycle']:
+                if self._startProductionCycleDelay > 0:
+                    await asyncio.sleep(self._startProductionCycleDelay)
+                self.SetIOValues([('isRunningProductionCycle', True)], sent=True)
+
+            # wait for trigger to be reset before accepting it again
+            await self._WaitForIO(lambda: not self._receivedIoValues['startProductionCycle'] and not self._receivedIoValues['stopProductionCycle'])
+
+    async def _RunProductionQueue(self, queueIndex):
+        """ Processes order entries of one production queue in order, writing a result entry for each.
+        """
+        orderQueue = self._arrayIoValues['productionQueue%dOrder' % queueIndex]
+        resultQueue = self._arrayIoValues['productionQueue%dResult' % queueIndex]
+        orderReadPointerIOName = 'location%dOrderReadPointer' % queueIndex
+        orderWritePointerIOName = 'location%dOrderWritePointer' % queueIndex
+        resultReadPointerIOName = 'location%dOrderResultReadPointer' % queueIndex
+        resultWritePointerIOName = 'location%dOrderResultWritePointer' % queueIndex
+        while True:
+            # wait for an order entry to process
+            await self._WaitForIO(lambda: self._sentIoValues['isRunningProductionCycle'] and self._receivedIoValues[orderReadPointerIOName] != self._receivedIoValues[orderWritePointerIOName])
+            orderReadPointer = self._receivedIoValues[orderReadPointerIOName]
+            orderEntry = orderQueue[orderReadPointer - 1] or {}
+            if self._pickupDelay > 0:
+                await asyncio.sleep(self._pickupDelay)
+            self.SetIOValues([(orderReadPointerIOName, self._IncrementPointer(orderReadPointer))])
+
+            # move in containers
+            locationIndices = [self._locationIndices[locationName] for locationName in (orderEntry.get('orderPickLocationName'), orderEntry.get('orderPlaceLocationName')) if locationName in self._locationIndices]
+            for locationIndex in locationIndices:
+                await self._MoveContainer(locationIndex, isMoveIn=True)
+
+            if self._processingDelay > 0:
+                await asyncio.sleep(self._processingDelay)
+
+            # write result entry once there is room in order result queue
+            await self._WaitForIO(lambda: self._IncrementPointer(self._receivedIoValues[resultWritePointerIOName]) != self._receivedIoValues[resultReadPointerIOName])
+            resultWritePointer = self._receivedIoValues[resultWritePointerIOName]
+            resultQueue[resultWritePointer - 1] = {
+                'orderUniqueId': orderEntry.get('orderUniqueId'),
+                'orderNumber': orderEntry.get('orderNumber'),
+                'orderCycleFinishCode': 0,
+            }
+            self.numProcessedOrders += 1
+            self.SetIOValues([(resultWritePointerIOName, self._IncrementPointer(resultWritePointer))])
+
+            # move out containers
+            for locationIndex in locationIndices:
+                await self._MoveContainer(locationIndex, isMoveIn=False)
+
+    async def _MoveContainer(self, locationIndex, isMoveIn):
+        """ Requests container move in or move out of a location and waits for client to update location{index}HasContainer.
+        """
+        hasContainerIOName = 'location%dHasContainer' % locationIndex
+        if bool(self._receivedIoValues.get(hasContainerIOName)) == isMoveIn:
+            return
+        moveIOName = ('moveInLocation%dContainer' if isMoveIn else 'moveOutLocation%dContainer') % locationIndex
+        self.SetIOValues([(moveIOName, True)], sent=True)
+        await self._WaitForIO(lambda: bool(self._receivedIoValues.get(hasContainerIOName)) == isMoveIn)
+        self.SetIOValues([(moveIOName, False)], sent=True)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+
+from .ordermanager import ProductionCycleOrderManager
+from .orderpipeline import OrderPipeline
+from .ordertracker import OrderTracker
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class OrderRoutingPolicy(object):
+    """ Policies choosing the order queue of an order entry that can go to any order queue.
+    """
+    LeastOccupied = 'leastOccupied' # order queue with the most free order queue entries
+    ByLocation = 'byLocation' # order queue mapped to orderPickLocationName of the order entry, least occupied order queue if not mapped
+
+
+class MultiQueueOrderManager(object):
+    """ Drives several production cycle order queues over one MujinGraphClient. Order entries written to different order queues at the same time
+    share one request, and result entries of all order result queues are dequeued with one read and one read pointer update.
+    """
+
+    _graphClient = None # instance of graphqlclient.GraphClient
+    _orderManagers = None # dict mapping queue index to ProductionCycleOrderManager of that order queue
+    _orderTracker = None # OrderTracker of in-flight orders of all order queues
+
+    _routingPolicy = None # OrderRoutingPolicy value used for order entries without an explicit queue index
+    _locationQueueIndices = None # dict mapping pick location name to queue index, used by OrderRoutingPolicy.ByLocation
+
+    _orderPipeline = None # OrderPipeline writing order entries to all order queues and dequeuing result entries of all order result queues
+
+    _orderJournal = None # OrderJournal of in-flight orders of all order queues, None to not journal orders
+
+    def __init__(self, graphClient, queueIndices=(1,), maxPendingOrders=100, orderTracker=None, routingPolicy=OrderRoutingPolicy.LeastOccupied, locationQueueIndices=None, orderJournal=None):
+        """
+        Args:
+            graphClient (MujinGraphClient): Client shared by all order queues.
+            queueIndices (list(int)): Indices of production queues to drive.
+            maxPendingOrders (int): Maximum number of submitted order entries waiting locally for room in order queues.
+            orderTracker (OrderTracker): Tracker of in-flight orders shared by all order queues. Defaults to a new OrderTracker.
+            routingPolicy (str): OrderRoutingPolicy value used for order entries without an explicit queue index.
+            locationQueueIndices (dict): Mapping of pick location name to queue index, used by OrderRoutingPolicy.ByLocation.
+            orderJournal (OrderJournal): Journal of in-flight orders shared by all order queues, recovered by InitializeOrderPointers after a restart. None to not journal orders.
+        """
+        if routingPolicy not in (OrderRoutingPolicy.LeastOccupied, OrderRoutingPolicy.ByLocation):
+            raise Exception('Unknown order routing policy "%s"' % routingPolicy)
+        self._graphClient = graphClient
+        self._orderTracker = orderTracker or OrderTracker()
+        self._orderJournal = orderJournal
+        self._orderManagers = dict((queueIndex, ProductionCycleOrderManager(graphClient, queueIndex=queueIndex, orderTracker=self._orderTracker, orderJournal=orderJournal, recoverJournaledOrders=False)) for queueIndex in queueIndices)
+        self._routingPolicy = routingPolicy
+        self._locationQueueIndices = dict(locationQueueIndices or {})
+        for locationName, queueIndex in self._locationQueueIndices.items():
+            if queueIndex not in self._orderManagers:
+                raise Exception('Location "%s" is mapped to queue index %d which is not managed' % (locationName, queueIndex))
+        self._orderPipeline = OrderPipeline(graphClient, self._orderManagers, self._RouteOrders, self._orderTracker, orderJournal=orderJournal, maxPendingOrders=maxPendingOrders)
+
+    @property
+    def orderTracker(self):
+        """ OrderTracker of in-flight orders of all order queues.
+        """
+        return self._orderTracker
+
+    @property
+    def orderJournal(self):
+        """ OrderJournal of in-flight orders of all order queues, None if orders are not journaled.
+        """
+        return self._orderJournal
+
+    @property
+    def queueIndices(self):
+        """ Indices of managed production queues.
+        """
+        return list(self._orderManagers)
+
+    @property
+    def numPendingOrders(self):
+        """ Number of submitted order entries waiting locally for room in order queues.
+        """
+        return self._orderPipeline.numPendingOrders
+
+    def GetOrderManager(self, queueIndex):
+        """ Returns ProductionCycleOrderManager of one order queue.
+        """
+        return self._orderManagers[queueIndex]
+
+    def Close(self):
+        """ Unregisters gauges and IO change callbacks of the order managers of all order queues from the client. Call when the order manager is no longer used.
+        """
+        for orderManager in self._orderManagers.values():
+            orderManager.Close()
+
+    async def InitializeOrderPointers(self, timeout=5):
+        """ Reads lengths of all order queues with a single request and initializes order queue pointers of all order queues.
+        When orders are journaled, recovers in-flight orders of all order queues once, reading back unacknowledged order queue entries of all order queues
+        with one request, and submits orders never written again, routing those submitted without queue index again.
+
+        Args:
+            timeout (float): Seconds to wait for valid order queue pointers.
+        """
+        orderQueueIONames = [orderManager.orderQueueIOName for orderManager in self._orderManagers.values()]
+        queueLengths = await self._graphClient.GetControllerIOVariableLengthsAsync(orderQueueIONames)
+        await asyncio.gather(*[
+            orderManager.InitializeOrderPointers(timeout=timeout, queueLength=queueLengths[orderManager.orderQueueIOName])
+            for orderManager in self._orderManagers.values()
+        ])
+
+        await self._orderPipeline.RecoverJournaledOrdersAsync(sorted(self._orderManagers) + [None])
+
+    async def WaitForOrderResult(self, timeout=None):
+        """ Waits until any order result queue has a result entry to be read.
+
+        Args:
+            timeout (float): Seconds to wait before raising asyncio.TimeoutError. None to wait forever.
+        """
+        resultWritePointerIONames = [orderManager.resultWritePointerIOName for orderManager in self._orderManagers.values()]
+        starttime = time.time()
+        while not any(orderManager.numUnreadOrderResults > 0 for orderManager in self._orderManagers.values()):
+            remainingTime = None
+            if timeout is not None:
+                remainingTime = timeout - (time.time() - starttime)
+                if remainingTime <= 0:
+                    raise asyncio.TimeoutError()
+            await self._graphClient.WaitForAnyChange(resultWritePointerIONames, timeout=remainingTime)
+
+    def _RouteOrders(self, orderEntries):
+        """ Chooses an order queue with room for each order entry, in order. Order entries in orderEntries are tuple(orderEntry, queueIndex),
+        queueIndex None to choose by routing policy.
+
+        Args:
+            orderEntries (list(tuple(dict, int))): Order entries with their queue index.
+
+        Returns:
+            dict: Mapping of queue index to list of indices into orderEntries of order entries routed to that order queue, in order. Order entries not routed do not fit.
+        """
+        numFreeOrderSlots = dict((queueIndex, orderManager.numFreeOrderSlots) for queueIndex, orderManager in self._orderManagers.items())
+        routedIndices = dict((queueIndex, []) for queueIndex in self._orderManagers)
+        for index, (orderEntry, queueIndex) in enumerate(orderEntries):
+            if queueIndex is None and self._routingPolicy == OrderRoutingPolicy.ByLocation:
+                queueIndex = self._locationQueueIndices.get(orderEntry.get('orderPickLocationName'))
+            if queueIndex is None:
+                # least occupied order queue, lowest queue index first on ties
+                queueIndex = max(numFreeOrderSlots, key=lambda freeQueueIndex: (numFreeOrderSlots[freeQueueIndex], -freeQueueIndex))
+            if numFreeOrderSlots[queueIndex] <= 0:
+                continue
+            numFreeOrderSlots[queueIndex] -= 1
+            routedIndices[queueIndex].append(index)
+        return routedIndices
+
+    def QueueOrders(self, orderEntries, queueIndex=None):
+        """ Queues as many order entries as fit in the order queues with a single request.
+
+        Args:
+            orderEntries (list(dict)): Order information to queue to the system, in queuing order.
+            queueIndex (int): Index of order queue to queue all order entries to. None to choose by routing policy.
+
+        Returns:
+            list(dict): Order entries not accepted because their order queue is full, in queuing order.
+        """
+        return self._orderPipeline.QueueOrders([(orderEntry, queueIndex) for orderEntry in orderEntries])
+
+    async def QueueOrdersAsync(self, orderEntries, queueIndex=None):
+        """ Queues as many order entries as fit in the order queues with a single request without blocking the event loop.
+
+        Args:
+            orderEntries (list(dict)): Order information to queue to the system, in queuing order.
+            queueIndex (int): Index of order queue to queue all order entries to. None to choose by routing policy.
+
+        Returns:
+            list(dict): Order entries not accepted because their order queue is full, in queuing order. Result futures of accepted order entries are available from orderTracker.
+        """
+        return await self._orderPipeline.QueueOrdersAsync([(orderEntry, queueIndex) for orderEntry in orderEntries])
+
+    def DequeueOrderResults(self, maxCount=None):
+        """ Dequeues readable result entries of all order result queues with a single read and a single update of all read pointers.
+
+        Args:
+            maxCount (int): Maximum number of result entries to dequeue from each order result queue. None to dequeue all readable result entries.
+
+        Returns:
+            list(dict): Order result information, in dequeuing order of each order result queue, order result queues in order of queue index.
+        """
+        return self._orderPipeline.DequeueOrderResults(maxCount)
+
+    async def DequeueOrderResultsAsync(self, maxCount=None):
+        """ Dequeues readable result entries of all order result queues with a single read and a single update of all read pointers without blocking the event loop.
+
+        Args:
+            maxCount (int): Maximum number of result entries to dequeue from each order result queue. None to dequeue all readable result entries.
+
+        Returns:
+            list(dict): Order result information, in dequeuing order of each order result queue, order result queues in order of queue index.
+        """
+        return await self._orderPipeline.DequeueOrderResultsAsync(maxCount)
+
+    async def SubmitOrder(self, orderEntry, queueIndex=None):
+        """ Submits an order entry to be written to an order queue as soon as there is room. Order entries without queue index are routed
+        by routing policy when written, so they go to whichever order queue is least occupied at that time. Order entries pending at the same time
+        are written to all order queues in one request. Waits for room in local pending queue first when maxPendingOrders order entries are already pending.
+
+        Args:
+            orderEntry (dict): Order information to queue to the system.
+            queueIndex (int): Index of order queue to queue order entry to. None to choose by routing policy.
+
+        Returns:
+            asyncio.Future: Resolves with the result entry matching orderUniqueId of the order entry once it is dequeued. None if order entry has no orderUniqueId.
+        """
+        return await self._orderPipeline.SubmitOrder(orderEntry, queueIndex)
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import collections
+import os
+import struct
+import threading
+import time
+import zlib
+
+from .jsoncodec import GetDefaultJsonCodec
+
+import logging
+log = logging.getLogger(__name__)
+
+_fileMagic = b'MJNJRN\x00\x01' # first bytes of a journal file, the last byte is the format version
+_recordHeader = struct.Struct('<II') # payload length and CRC32 of payload, little endian
+_removedEvent = 'Removed' # event of records removing orders that are no longer in flight
+
+
+class JournaledOrderState(object):
+    """ States of an in-flight order in an order journal.
+    """
+    Pending = 'Pending'   # submitted, waiting locally for room in order queue
+    Reserved = 'Reserved' # order queue entry reserved and being written, whether Mujin controller applied the write is unknown
+    Written = 'Written'   # Mujin controller acknowledged writing the order queue entry, waiting for its result entry
+
+
+class JournaledOrder(object):
+    """ In-flight order recovered from an order journal.
+    """
+    __slots__ = (
+        'orderUniqueId',
+        'orderEntry',
+        'queueIndex',
+        'slot',
+        'state',
+    )
+
+    def __init__(self, orderUniqueId, orderEntry, queueIndex, slot=None, state=JournaledOrderState.Pending):
+        self.orderUniqueId = orderUniqueId # unique id of the order
+        self.orderEntry = orderEntry       # order information queued to the system
+        self.queueIndex = queueIndex       # index of order queue, None if a MultiQueueOrderManager routes it when written
+        self.slot = slot                   # order queue pointer value of reserved order queue entry, None while pending
+        self.state = state                 # JournaledOrderState value
+
+    def __repr__(self):
+        return '<JournaledOrder orderUniqueId=%r state=%s>' % (self.orderUniqueId, self.state)
+
+
+class OrderJournal(object):
+    """ Append-only file of in-flight order events, so that a restarted order manager recovers orders that were pending, being written, or waiting for
+    their result entry. Records are buffered and made durable with one fsync shared by all callers waiting at the time, and the journal is compacted to
+    the in-flight orders once it holds compactionThreshold records. Orders without orderUniqueId are not journaled. Thread-safe.
+
+    The file starts with an 8 byte magic, followed by records of an 8 byte header (payload length, CRC32 of payload, little endian) and a JSON payload.
+    A record torn by a crash ends the journal and is truncated when the journal is opened.
+    """
+
+    _path = None # path of journal file
+    _syncInterval = None # seconds appended records may stay buffered before being synced when nothing waits for them
+    _compactionThreshold = None # number of records in journal file above which it is compacted
+    _codec = None # JsonCodec encoding records
+
+    _lock = None # threading.Lock protecting buffer and orders
+    _fileLock = None # threading.Lock serializing writes, fsyncs and compaction of journal file
+    _file = None # file object of journal file opened for appending
+    _buffer = None # bytearray of encoded records not written yet
+    _numBufferedRecords = 0 # number of records in buffer
+    _numFileRecords = 0 # number of records written to journal file since it was created or compacted
+    _numAppendedRecords = 0 # sequence number of last appended record
+    _numSyncedRecords = 0 # sequence number of last record known to be durable
+    _orders = None # OrderedDict mapping orderUniqueId to JournaledOrder, oldest first
+    _syncTask = None # asyncio.Task running shared fsync in executor
+    _syncTimer = None # asyncio.TimerHandle syncing buffered records after syncInterval
+
+    recoveryDuration = None # seconds it took to read journal file and rebuild in-flight orders when opened
+    numSyncs = 0 # number of fsyncs of journal file
+    numCompactions = 0 # number of compactions of journal file
+
+    def __init__(self, path, syncInterval=0.05, compactionThreshold=10000, codec=None):
+        """
+        Args:
+            path (str): Path of journal file, created if it does not exist.
+            syncInterval (float): Seconds appended records may stay buffered before being synced when nothing waits for them.
+            compactionThreshold (int): Number of records in journal file above which it is compacted.
+            codec (JsonCodec): JSON codec of records. Defaults to the fastest installed JSON library.
+        """
+        self._path = path
+        self._syncInterval = syncInterval
+        self._compactionThreshold = compactionThreshold
+        self._codec = codec or GetDefaultJsonCodec()
+        self._lock = threading.Lock()
+        self._fileLock = threading.Lock()
+        self._buffer = bytearray()
+        self._orders = collections.OrderedDict()
+
+        starttime = time.monotonic()
+        self._Load()
+        self.recoveryDuration = time.monotonic() - starttime
+        log.info('recovered %d in-flight orders from order journal %s in %.3fms', len(self._orders), path, self.recoveryDuration * 1000)
+
+    @property
+    def path(self):
+        """ Path of journal file.
+        """
+        return self._path
+
+    @property
+    def numOrders(self):
+        """ Number of in-flight orders in journal.
+        """
+        return len(self._orders)
+
+    def _Load(self):
+        """ Replays journal file into in-flight orders, truncating a torn record at its end, and opens it for appending.
+        """
+        if not os.path.exists(self._path):
+            self._WriteFile(self._path, b'')
+            self._file = open(self._path, 'ab')
+            return
+
+        with open(self._path, 'rb') as journalFile:
+            data = journalFile.read()
+        if data[:len(_fileMagic)] != _fileMagic:
+            raise Exception('File "%s" is not an order journal' % self._path)
+        offset = len(_fileMagic)
+        while offset + _recordHeader.size <= len(data):
+            payloadLength, checksum = _recordHeader.unpack_from(data, offset)
+            payload = data[offset + _recordHeader.size:offset + _recordHeader.size + payloadLength]
+            if len(payload) < payloadLength or zlib.crc32(payload) != checksum:
+                break
+            self._ApplyRecord(self._codec.Loads(payload))
+            self._numFileRecords += 1
+            offset += _recordHeader.size + payloadLength
+        if offset < len(data):
+            log.warning('order journal %s ends with a torn record, truncating %d bytes', self._path, len(data) - offset)
+            with open(self._path, 'r+b') as journalFile:
+                journalFile.truncate(offset)
+                journalFile.flush()
+                os.fsync(journalFile.fileno())
+        self._file = open(self._path, 'ab')
+
+    def _ApplyRecord(self, record):
+        """ Applies one journal record to in-flight orders. Applying a record again has no further effect.
+        """
+        event = record['event']
+        if event == JournaledOrderState.Pending:
+            self._orders.pop(record['orderUniqueId'], None)
+            self._orders[record['orderUniqueId']] = JournaledOrder(record['orderUniqueId'], record['orderEntry'], record['queueIndex'])
+        elif event == JournaledOrderState.Reserved:
+            order = self._orders.get(record['orderUniqueId'])
+            if order is None:
+                if record.get('orderEntry') is None:
+                    return
+                order = self._orders[record['orderUniqueId']] = JournaledOrder(record['orderUniqueId'], record['orderEntry'], record['queueIndex'])
+            order.queueIndex = record['queueIndex']
+            order.slot = record['slot']
+            order.state = JournaledOrderState.Reserved
+        elif event == JournaledOrderState.Written:
+            for orderUniqueId in record['orderUniqueIds']:
+                order = self._orders.get(orderUniqueId)
+                if order is not None:
+                    order.state = JournaledOrderState.Written
+        elif event == _removedEvent:
+            for orderUniqueId in record['orderUniqueIds']:
+                self._orders.pop(orderUniqueId, None)
+
+    def _EncodeRecord(self, record):
+        payload = self._codec.Dumps(record)
+        return _recordHeader.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def _AppendRecord(self, record):
+        """ Applies a record to in-flight orders and buffers it, scheduling a sync after syncInterval when called from within a running event loop.
+        """
+        encodedRecord = self._EncodeRecord(record)
+        with self._lock:
+            if self._file is None:
+                return
+            self._ApplyRecord(record)
+            self._buffer += encodedRecord
+            self._numBufferedRecords += 1
+            self._numAppendedRecords += 1
+        if self._syncTimer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return # not in event loop, records are written by next Sync
+            self._syncTimer = loop.call_later(self._syncInterval, self._OnSyncTimer)
+
+    def _OnSyncTimer(self):
+        self._syncTimer = None
+        asyncio.ensure_future(self._SyncInBackgroundAsync())
+
+    async def _SyncInBackgroundAsync(self):
+        try:
+            await self.SyncAsync()
+        except Exception as e:
+            log.exception('failed to sync order journal %s: %s', self._path, e)
+
+    def RecordPending(self, orderEntry, queueIndex):
+        """ Records an order entry submitted to wait locally for room in order queue.
+
+        Args:
+            orderEntry (dict): Order information to queue to the system.
+            queueIndex (int): Index of order queue, None if a MultiQueueOrderManager routes it when written.
+        """
+        if orderEntry.get('orderUniqueId') is not None:
+            self._AppendRecord({'event': JournaledOrderState.Pending, 'orderUniqueId': orderEntry['orderUniqueId'], 'orderEntry': orderEntry, 'queueIndex': queueIndex})
+
+    def RecordReserved(self, orderEntry, queueIndex, slot):
+        """ Records an order queue entry reserved for an order entry, before writing it to Mujin controller.
+
+        Args:
+            orderEntry (dict): Order information to queue to the system.
+            queueIndex (int): Index of order queue.
+            slot (int): Order queue pointer value of reserved order queue entry.
+        """
+        orderUniqueId = orderEntry.get('orderUniqueId')
+        if orderUniqueId is None:
+            return
+        record = {'event': JournaledOrderState.Reserved, 'orderUniqueId': orderUniqueId, 'queueIndex': queueIndex, 'slot': slot}
+        if orderUniqueId not in self._orders:
+            record['orderEntry'] = orderEntry
+        self._AppendRecord(record)
+
+    def RecordWritten(self, orderUniqueIds):
+        """ Records that Mujin controller acknowledged writing order entries to order queue.
+
+        Args:
+            orderUniqueIds (list(str)): Unique ids of written orders.
+        """
+        if len(orderUniqueIds) > 0:
+            self._AppendRecord({'event': JournaledOrderState.Written, 'orderUniqueIds': list(orderUniqueIds)})
+
+    def RecordRemoved(self, orderUniqueIds):
+        """ Records orders that are no longer in flight, because their result entry was dequeued, their write failed, or their submission was dropped.
+
+        Args:
+            orderUniqueIds (list(str)): Unique ids of removed orders.
+        """
+        if len(orderUniqueIds) > 0:
+            self._AppendRecord({'event': _removedEvent, 'orderUniqueIds': list(orderUniqueIds)})
+
+    def GetOrders(self, queueIndex):
+        """ Returns in-flight orders of an order queue, oldest first.
+
+        Args:
+            queueIndex (int): Index of order queue, None for pending orders routed when written.
+
+        Returns:
+            list(JournaledOrder): In-flight orders.
+        """
+        return self.GetOrdersOfQueues([queueIndex])
+
+    def GetOrdersOfQueues(self, queueIndices):
+        """ Returns in-flight orders of several order queues, oldest first across all of them.
+
+        Args:
+            queueIndices (list(int)): Indices of order queues, None among them for pending orders routed when written.
+
+        Returns:
+            list(JournaledOrder): In-flight orders.
+        """
+        queueIndices = set(queueIndices)
+        with self._lock:
+            return [order for order in self._orders.values() if order.queueIndex in queueIndices]
+
+    def Sync(self):
+        """ Writes buffered records and fsyncs the journal file, compacting it when it holds compactionThreshold records.
+        """
+        with self._fileLock:
+            with self._lock:
+                buffer, self._buffer = self._buffer, bytearray()
+                numBufferedRecords, self._numBufferedRecords = self._numBufferedRecords, 0
+                numAppendedRecords = self._numAppendedRecords
+                if self._file is None:
+                    return
+            if len(buffer) > 0:
+                self._file.write(buffer)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._numFileRecords += numBufferedRecords
+                self.numSyncs += 1
+            self._numSyncedRecords = max(self._numSyncedRecords, numAppendedRecords)
+            if self._numFileRecords >= self._compactionThreshold:
+                self._Compact()
+
+    async def SyncAsync(self):
+        """ Waits until all records appended so far are durable without blocking the event loop. Concurrent callers share one fsync.
+        """
+        numAppendedRecords = self._numAppendedRecords
+        while self._numSyncedRecords < numAppendedRecords:
+            if self._syncTask is None:
+                self._syncTask = asyncio.ensure_future(self._RunSyncAsync())
+            await asyncio.shield(self._syncTask)
+
+    async def _RunSyncAsync(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.Sync)
+        finally:
+            self._syncTask = None
+
+    def _Compact(self):
+        """ Replaces journal file with records of in-flight orders only. Called with file lock held, after buffered records were written.
+        Records appended meanwhile are still buffered and applying them again after the compacted records has no further effect.
+        """
+        with self._lock:
+            records = []
+            writtenOrderUniqueIds = []
+            for order in self._orders.values():
+                if order.state == JournaledOrderState.Pending:
+                    records.append({'event': JournaledOrderState.Pending, 'orderUniqueId': order.orderUniqueId, 'orderEntry': order.orderEntry, 'queueIndex': order.queueIndex})
+                else:
+                    records.append({'event': JournaledOrderState.Reserved, 'orderUniqueId': order.orderUniqueId, 'orderEntry': order.orderEntry, 'queueIndex': order.queueIndex, 'slot': order.slot})
+                    if order.state == JournaledOrderState.Written:
+                        writtenOrderUniqueIds.append(order.orderUniqueId)
+            if len(writtenOrderUniqueIds) > 0:
+                records.append({'event': JournaledOrderState.Written, 'orderUniqueIds': writtenOrderUniqueIds})
+        numRecords = self._numFileRecords
+        self._file.close()
+        self._WriteFile(self._path, b''.join(self._EncodeRecord(record) for record in records))
+        self._file = open(self._path, 'ab')
+        self._numFileRecords = len(records)
+        self.numCompactions += 1
+        log.debug('compacted order journal %s from %d to %d records', self._path, numRecords, len(records))
+
+    def _WriteFile(self, path, data):
+        """ Atomically replaces journal file with magic followed by data.
+        """
+        temporaryPath = path + '.tmp'
+        with open(temporaryPath, 'wb') as journalFile:
+            journalFile.write(_fileMagic)
+            journalFile.write(data)
+            journalFile.flush()
+            os.fsync(journalFile.fileno())
+        os.replace(temporaryPath, path)
+        if hasattr(os, 'O_DIRECTORY'):
+            # make rename durable
+            directoryFd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directoryFd)
+            finally:
+                os.close(directoryFd)
+
+    def Close(self):
+        """ Syncs buffered records and closes the journal file. Later records are dropped.
+        """
+        if self._syncTimer is not None:
+            self._syncTimer.cancel()
+            self._syncTimer = None
+        self.Sync()
+        with self._fileLock:
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
@@ -3,6 +3,9 @@
 import asyncio
 import time
 
+from .orderpipeline import OrderPipeline
+from .ordertracker import OrderTracker
+
 import logging
 log = logging.getLogger(__name__)
 
@@ -17,19 +20,164 @@ class ProductionCycleOrderManager(object):
     _resultWritePointerIOName = None # io name of order result write pointer
 
     _orderWritePointer = 0 # value of current order request write pointer
+    _isOrderWritePointerStale = False # whether order write pointer has to be read back from Mujin controller after a failed write before reserving more order queue entries
+    _orderWritePointerEpoch = 0 # incremented each time order write pointer turns stale, order queue entries reserved in an earlier epoch are not written
+    _orderWritePointerResyncTask = None # asyncio.Task reading back stale order write pointer, shared by concurrent writers
     _resultReadPointer = 0 # value of current order result write pointer
     _queueLength = 0       # length of order request queue
 
     _graphClient = None # instance of graphqlclient.GraphClient
+    _queueIndex = None # index of production queue
+
+    _orderPipeline = None # OrderPipeline writing order entries to order queue and dequeuing result entries
+
+    _orderTracker = None # OrderTracker of in-flight orders
+    _slotOrderUniqueIds = None # dict mapping order queue pointer value to orderUniqueId of order entry written there and not yet picked up
+    _lastOrderReadPointer = 0 # value of order read pointer when last checked for picked up orders
+
+    _orderJournal = None # OrderJournal of in-flight orders recovered on restart, None to not journal orders
+    _recoverJournaledOrders = True # whether InitializeOrderPointers recovers in-flight orders of order journal, False if a MultiQueueOrderManager owning this order manager recovers them
+
+    _gaugeLabels = None # labels of gauges registered in client metrics
+    _gaugeNames = None # list of names of gauges registered in client metrics, unregistered by Close
 
-    def __init__(self, graphClient, queueIndex=1):
+    def __init__(self, graphClient, queueIndex=1, maxPendingOrders=100, orderTracker=None, orderJournal=None, recoverJournaledOrders=True):
         self._graphClient = graphClient
+        self._queueIndex = queueIndex
+        self._orderTracker = orderTracker or OrderTracker()
+        self._slotOrderUniqueIds = {}
+        self._orderJournal = orderJournal
+        self._recoverJournaledOrders = recoverJournaledOrders
         self._orderQueueIOName = 'productionQueue%dOrder' % queueIndex
         self._resultQueueIOName = 'productionQueue%dResult' % queueIndex
         self._orderReadPointerIOName = 'location%dOrderReadPointer' % queueIndex
         self._orderWritePointerIOName = 'location%dOrderWritePointer' % queueIndex
         self._resultReadPointerIOName = 'location%dOrderResultReadPointer' % queueIndex
         self._resultWritePointerIOName = 'location%dOrderResultWritePointer' % queueIndex
+        self._orderPipeline = OrderPipeline(graphClient, {queueIndex: self}, self._RouteOrders, self._orderTracker, orderJournal=orderJournal, maxPendingOrders=maxPendingOrders)
+
+        # resync order queue pointers whenever subscription reconnects
+        self._graphClient.AddResyncIONames([
+            self._orderReadPointerIOName,
+            self._orderWritePointerIOName,
+            self._resultReadPointerIOName,
+            self._resultWritePointerIOName,
+        ])
+
+        # detect orders picked up by mujin
+        self._graphClient.RegisterIOChangeCallback([self._orderReadPointerIOName], self._OnOrderReadPointerChanged)
+
+        # expose queue occupancy through client metrics
+        self._gaugeLabels = {'url': self._graphClient.url, 'queueIndex': queueIndex}
+        self._gaugeNames = []
+        self._RegisterGauge('order_queue_queued_orders', lambda: self.numQueuedOrders, 'Number of order entries written to order queue and not yet read by Mujin controller.')
+        self._RegisterGauge('order_queue_free_slots', lambda: self.numFreeOrderSlots, 'Number of order entries that can still be written to order queue.')
+        self._RegisterGauge('order_result_queue_unread_results', lambda: self.numUnreadOrderResults, 'Number of result entries written to order result queue and not yet dequeued.')
+        self._RegisterGauge('order_queue_pending_orders', lambda: self.numPendingOrders, 'Number of submitted order entries waiting locally for room in order queue.')
+        self._RegisterGauge('order_queue_tracked_orders', lambda: self._orderTracker.numTrackedOrders, 'Number of in-flight orders waiting for their result entry.')
+
+    def _RegisterGauge(self, name, valueFunction, helpText):
+        """ Registers a gauge of the order queue in client metrics, to be unregistered by Close.
+        """
+        self._graphClient.metrics.RegisterGauge(name, valueFunction, labels=self._gaugeLabels, helpText=helpText)
+        self._gaugeNames.append(name)
+
+    def Close(self):
+        """ Unregisters gauges and IO change callbacks of the order manager from the client, so that a discarded order manager stops reporting and can be
+        garbage collected. Call when the order manager is no longer used.
+        """
+        for name in self._gaugeNames:
+            self._graphClient.metrics.UnregisterGauge(name, labels=self._gaugeLabels)
+        self._gaugeNames = []
+        self._graphClient.UnregisterIOChangeCallback(self._OnOrderReadPointerChanged)
+
+    @property
+    def orderTracker(self):
+        """ OrderTracker of in-flight orders, matching result entries to queued order entries and keeping latency statistics.
+        """
+        return self._orderTracker
+
+    @property
+    def orderJournal(self):
+        """ OrderJournal of in-flight orders, None if orders are not journaled.
+        """
+        return self._orderJournal
+
+    @property
+    def queueIndex(self):
+        """ Index of production queue.
+        """
+        return self._queueIndex
+
+    @property
+    def queueLength(self):
+        """ Length of order queue, 0 until order queue pointers are initialized.
+        """
+        return self._queueLength
+
+    @property
+    def orderQueueIOName(self):
+        """ IO name of order request queue.
+        """
+        return self._orderQueueIOName
+
+    @property
+    def orderReadPointerIOName(self):
+        """ IO name of order request read pointer.
+        """
+        return self._orderReadPointerIOName
+
+    @property
+    def orderWritePointerIOName(self):
+        """ IO name of order request write pointer, also the write group of order queue writes sent through the write batcher.
+        """
+        return self._orderWritePointerIOName
+
+    @property
+    def resultWritePointerIOName(self):
+        """ IO name of order result write pointer.
+        """
+        return self._resultWritePointerIOName
+
+    @property
+    def orderWritePointerEpoch(self):
+        """ Incremented each time the order write pointer turns stale after a failed write. Order queue entries reserved in an earlier epoch are not written.
+        """
+        return self._orderWritePointerEpoch
+
+    @property
+    def numPendingOrders(self):
+        """ Number of submitted order entries waiting locally for room in order queue.
+        """
+        return self._orderPipeline.numPendingOrders
+
+    @property
+    def numQueuedOrders(self):
+        """ Number of order entries written to order queue and not yet read by Mujin controller.
+        """
+        if self._queueLength == 0:
+            return 0
+        orderReadPointer = self._graphClient.receivedIoMap.get(self._orderReadPointerIOName) or 0
+        if orderReadPointer < 1 or orderReadPointer > self._queueLength:
+            return 0
+        return (self._orderWritePointer - orderReadPointer) % self._queueLength
+
+    @property
+    def numUnreadOrderResults(self):
+        """ Number of result entries written to order result queue by Mujin controller and not yet dequeued.
+        """
+        if self._queueLength == 0:
+            return 0
+        resultWritePointer = self._graphClient.receivedIoMap.get(self._resultWritePointerIOName) or 0
+        if resultWritePointer < 1 or resultWritePointer > self._queueLength:
+            return 0
+        return (resultWritePointer - self._resultReadPointer) % self._queueLength
+
+    @property
+    def numFreeOrderSlots(self):
+        """ Number of order entries that can still be written to order queue.
+        """
+        return max(0, self._queueLength - 1 - self.numQueuedOrders)
 
     def _IncrementPointer(self, pointerValue):
         """ Increments value for an order queue pointer. Wraps around length of order queue.
@@ -45,36 +193,160 @@ class ProductionCycleOrderManager(object):
             pointerValue = 1
         return pointerValue
 
-    async def InitializeOrderPointers(self, timeout=5):
+    async def InitializeOrderPointers(self, timeout=5, queueLength=None):
         """ Sends GraphQL query to get order queue pointers and order queue length
+
+        Args:
+            timeout (float): Seconds to wait for valid order queue pointers.
+            queueLength (int): Length of order queue if already known. None to read it from order queue.
         """
         starttime = time.time()
 
-        # initialize order queue length from order queue
-        orderQueue = self._graphClient.GetControllerIOVariable(self._orderQueueIOName)
-        self._queueLength = len(orderQueue)
+        # initialize order queue length from order queue, memoized by graph client
+        if queueLength is None:
+            queueLength = (await self._graphClient.GetControllerIOVariableLengthsAsync([self._orderQueueIOName]))[self._orderQueueIOName]
+        self._queueLength = queueLength
 
-        # initalize order pointers
-        initializedOrderPointers = False
-        while not initializedOrderPointers:
-            self._orderWritePointer = self._graphClient.receivedIoMap.get(self._orderWritePointerIOName) or 0
-            self._resultReadPointer = self._graphClient.receivedIoMap.get(self._resultReadPointerIOName) or 0
-            orderReadPointer = self._graphClient.receivedIoMap.get(self._orderReadPointerIOName) or 0
-            resultWritePointer = self._graphClient.receivedIoMap.get(self._resultWritePointerIOName) or 0
+        # initalize order pointers, waiting for subscription to deliver valid values
+        pointerIONames = [
+            self._orderWritePointerIOName,
+            self._resultReadPointerIOName,
+            self._orderReadPointerIOName,
+            self._resultWritePointerIOName,
+        ]
+        while True:
+            receivedIoMap = self._graphClient.receivedIoMap
+            self._orderWritePointer = receivedIoMap.get(self._orderWritePointerIOName) or 0
+            self._resultReadPointer = receivedIoMap.get(self._resultReadPointerIOName) or 0
+            self._lastOrderReadPointer = receivedIoMap.get(self._orderReadPointerIOName) or 0
 
             # verify order queue pointer values are valid
-            initializedOrderPointers = True
-            for pointerValue, orderPointerIOName in [
-                (self._orderWritePointer, self._orderWritePointerIOName),
-                (self._resultReadPointer, self._resultReadPointerIOName),
-                (orderReadPointer, self._orderReadPointerIOName),
-                (resultWritePointer, self._resultWritePointerIOName),
-            ]:
+            invalidPointerValue, invalidPointerIOName = None, None
+            for orderPointerIOName in pointerIONames:
+                pointerValue = receivedIoMap.get(orderPointerIOName) or 0
                 if pointerValue < 1 or pointerValue > self._queueLength:
-                    initializedOrderPointers = False
-                    if time.time() - starttime > timeout:
-                        raise Exception('Production cycle order queue pointers are invalid, "%s" signal has value %r' % (orderPointerIOName, pointerValue))
-                await asyncio.sleep(0) # non-blocking sleep, allow next scheduled coroutine to run
+                    invalidPointerValue, invalidPointerIOName = pointerValue, orderPointerIOName
+                    break
+            if invalidPointerIOName is None:
+                break
+
+            # wait for any pointer to change
+            remainingTime = timeout - (time.time() - starttime)
+            try:
+                if remainingTime <= 0:
+                    raise asyncio.TimeoutError()
+                await self._graphClient.WaitForAnyChange(pointerIONames, timeout=remainingTime)
+            except asyncio.TimeoutError:
+                raise Exception('Production cycle order queue pointers are invalid, "%s" signal has value %r' % (invalidPointerIOName, invalidPointerValue))
+
+        if self._recoverJournaledOrders:
+            await self._orderPipeline.RecoverJournaledOrdersAsync([self._queueIndex])
+
+    def MarkOrderWritePointerStale(self, orderWritePointerEpoch):
+        """ Marks order write pointer stale after order queue entries reserved in an epoch failed to be written. Order queue entries reserved after them
+        in the same epoch are not written either, since Mujin controller would read the unwritten order queue entries before them.
+
+        Args:
+            orderWritePointerEpoch (int): Value of orderWritePointerEpoch when the order queue entries were reserved.
+        """
+        if orderWritePointerEpoch == self._orderWritePointerEpoch:
+            self._isOrderWritePointerStale = True
+            self._orderWritePointerEpoch += 1
+
+    def CheckOrderWritePointerEpoch(self, orderWritePointerEpoch):
+        """ Raises if order queue entries reserved in an epoch must not be written because an earlier write failed since.
+        """
+        if orderWritePointerEpoch != self._orderWritePointerEpoch:
+            raise Exception('Order queue entries of production queue %d are not written because an earlier write to the order queue failed' % self._queueIndex)
+
+    def ResyncOrderWritePointer(self):
+        """ Reads back order write pointer from Mujin controller if it is stale.
+        """
+        if self._isOrderWritePointerStale:
+            self._SetResyncedOrderWritePointer(self._graphClient.GetControllerIOVariables([self._orderWritePointerIOName], useCache=False).get(self._orderWritePointerIOName))
+
+    async def ResyncOrderWritePointerAsync(self):
+        """ Reads back order write pointer from Mujin controller if it is stale, sharing one read with concurrent writers.
+        """
+        while self._isOrderWritePointerStale:
+            if self._orderWritePointerResyncTask is None:
+                self._orderWritePointerResyncTask = asyncio.ensure_future(self._ReadOrderWritePointerAsync())
+            await asyncio.shield(self._orderWritePointerResyncTask)
+
+    async def _ReadOrderWritePointerAsync(self):
+        try:
+            self._SetResyncedOrderWritePointer((await self._graphClient.GetControllerIOVariablesAsync([self._orderWritePointerIOName], useCache=False)).get(self._orderWritePointerIOName))
+        finally:
+            self._orderWritePointerResyncTask = None
+
+    def _SetResyncedOrderWritePointer(self, orderWritePointer):
+        """ Replaces stale order write pointer with the value read back from Mujin controller, forgets order queue entries reserved past it, and lets writes
+        to the order queue through the write batcher again.
+        """
+        if (orderWritePointer or 0) < 1 or orderWritePointer > self._queueLength:
+            raise Exception('Production cycle order queue pointers are invalid, "%s" signal has value %r' % (self._orderWritePointerIOName, orderWritePointer))
+        log.warning('order write pointer of production queue %d resynced from %d to %d after a failed write', self._queueIndex, self._orderWritePointer, orderWritePointer)
+        self._orderWritePointer = orderWritePointer
+        self._slotOrderUniqueIds = dict((slot, orderUniqueId) for slot, orderUniqueId in self._slotOrderUniqueIds.items() if self._IsOrderSlotQueued(slot))
+        self._isOrderWritePointerStale = False
+        self._graphClient.ResumeBatchedWriteGroup(self._orderWritePointerIOName)
+
+    def _IsOrderSlotQueued(self, slot):
+        """ Returns whether an order queue entry is between the order read pointer and the order write pointer, i.e. not yet read by Mujin controller.
+        """
+        return (slot - self._lastOrderReadPointer) % self._queueLength < (self._orderWritePointer - self._lastOrderReadPointer) % self._queueLength
+
+    def RestoreWrittenOrder(self, orderUniqueId, slot):
+        """ Remembers the order queue entry of an order written before a restart, to detect when Mujin controller picks it up.
+
+        Args:
+            orderUniqueId (str): Unique id of the order.
+            slot (int): Order queue pointer value of its order queue entry.
+
+        Returns:
+            bool: Whether the order queue entry is not yet read by Mujin controller.
+        """
+        if not self._IsOrderSlotQueued(slot):
+            return False
+        self._slotOrderUniqueIds[slot] = orderUniqueId
+        return True
+
+    async def WaitForOrderResult(self, timeout=None):
+        """ Waits until order result queue has a result entry to be read, that is until DequeueOrderResults would dequeue one. Keeps waiting while the
+        order result write pointer is invalid.
+
+        Args:
+            timeout (float): Seconds to wait before raising asyncio.TimeoutError. None to wait forever.
+        """
+        starttime = time.time()
+        while self.numUnreadOrderResults == 0:
+            remainingTime = None
+            if timeout is not None:
+                remainingTime = timeout - (time.time() - starttime)
+                if remainingTime <= 0:
+                    raise asyncio.TimeoutError()
+            await self._graphClient.WaitForAnyChange([self._resultWritePointerIOName], timeout=remainingTime)
+
+    def _OnOrderReadPointerChanged(self, changedIoNameValues):
+        """ Marks orders picked up whose order queue entries the order read pointer passed.
+        """
+        orderReadPointer = changedIoNameValues.get(self._orderReadPointerIOName) or 0
+        pointerValue = self._lastOrderReadPointer
+        self._lastOrderReadPointer = orderReadPointer
+        for checkedPointerValue in (pointerValue, orderReadPointer):
+            if checkedPointerValue < 1 or checkedPointerValue > self._queueLength:
+                return
+        timestamp = self._graphClient.ioState.timestamp
+        while pointerValue != orderReadPointer:
+            orderUniqueId = self._slotOrderUniqueIds.pop(pointerValue, None)
+            if orderUniqueId is not None:
+                self._orderTracker.MarkPickedUp(orderUniqueId, timestamp)
+            pointerValue = self._IncrementPointer(pointerValue)
+
+    def _RouteOrders(self, orderEntries):
+        """ Reserves all order entries given to the order pipeline in this order queue, as many as fit.
+        """
+        return {self._queueIndex: list(range(len(orderEntries)))}
 
     def QueueOrder(self, orderEntry):
         """ Queues an order entry to the order queue.
@@ -82,20 +354,84 @@ class ProductionCycleOrderManager(object):
         Args:
             orderEntry (dict): Order information to queue to the system.
         """
-        # queue order to next entry in order queue and increment the order write pointer
-        orderReadPointer = self._graphClient.receivedIoMap.get(self._orderReadPointerIOName) or 0
+        if len(self._orderPipeline.QueueOrders([(orderEntry, self._queueIndex)])) > 0:
+            raise Exception('Failed to queue new order entry because order queue is full (length=%d).' % self._queueLength)
+
+    async def QueueOrderAsync(self, orderEntry):
+        """ Queues an order entry to the order queue without blocking the event loop.
+
+        Args:
+            orderEntry (dict): Order information to queue to the system.
 
-        # check if order queue is full
-        if self._IncrementPointer(self._orderWritePointer) == orderReadPointer:
+        Returns:
+            asyncio.Future: Resolves with the result entry matching orderUniqueId of the order entry once it is dequeued. None if order entry has no orderUniqueId.
+        """
+        trackedOrder = self._orderTracker.AddOrder(orderEntry, createResultFuture=True)
+        if len(await self._orderPipeline.QueueOrdersAsync([(orderEntry, self._queueIndex)], trackOrders=False)) > 0:
+            if trackedOrder is not None:
+                self._orderTracker.RemoveOrders([trackedOrder.orderUniqueId])
             raise Exception('Failed to queue new order entry because order queue is full (length=%d).' % self._queueLength)
+        return trackedOrder.resultFuture if trackedOrder is not None else None
 
-        # queue order entry and increment order write pointer
-        orderQueueEntryIOName = '%s[%d]' % (self._orderQueueIOName, self._orderWritePointer-1)
-        self._orderWritePointer = self._IncrementPointer(self._orderWritePointer)
-        self._graphClient.SetControllerIOVariables([
-            (orderQueueEntryIOName, orderEntry),
-            (self._orderWritePointerIOName, self._orderWritePointer)
-        ])
+    def QueueOrders(self, orderEntries):
+        """ Queues as many order entries as fit in the order queue with a single request.
+
+        Args:
+            orderEntries (list(dict)): Order information to queue to the system, in queuing order.
+
+        Returns:
+            list(dict): Order entries not accepted because order queue is full, in queuing order.
+        """
+        return self._orderPipeline.QueueOrders([(orderEntry, self._queueIndex) for orderEntry in orderEntries])
+
+    async def QueueOrdersAsync(self, orderEntries):
+        """ Queues as many order entries as fit in the order queue with a single request without blocking the event loop.
+
+        Args:
+            orderEntries (list(dict)): Order information to queue to the system, in queuing order.
+
+        Returns:
+            list(dict): Order entries not accepted because order queue is full, in queuing order. Result futures of accepted order entries are available from orderTracker.
+        """
+        return await self._orderPipeline.QueueOrdersAsync([(orderEntry, self._queueIndex) for orderEntry in orderEntries])
+
+    def ReserveOrderEntries(self, orderEntries, trackOrders=True, createResultFutures=False):
+        """ Reserves entries in order queue for as many order entries as fit and increments the order write pointer past them.
+
+        Args:
+            orderEntries (list(dict)): Order information to queue to the system.
+            trackOrders (bool): Whether to start tracking accepted order entries. False if they are already tracked.
+            createResultFutures (bool): Whether to create result futures when starting to track orders. Has to be called from within a running event loop if True.
+
+        Returns:
+            tuple(list(tuple(ioName, ioValue)), list(dict)): IO variables to set to queue the accepted order entries, with the order write pointer last, and the order entries that did not fit.
+        """
+        orderReadPointer = self._graphClient.receivedIoMap.get(self._orderReadPointerIOName) or 0
+
+        ioNameValues = []
+        orderWritePointer = self._orderWritePointer
+        for index, orderEntry in enumerate(orderEntries):
+            # check if order queue is full
+            if self._IncrementPointer(orderWritePointer) == orderReadPointer:
+                break
+
+            # queue order to next entry in order queue and increment the order write pointer
+            ioNameValues.append(('%s[%d]' % (self._orderQueueIOName, orderWritePointer-1), orderEntry))
+            if trackOrders:
+                self._orderTracker.AddOrder(orderEntry, createResultFuture=createResultFutures)
+            if orderEntry.get('orderUniqueId') is not None:
+                self._slotOrderUniqueIds[orderWritePointer] = orderEntry['orderUniqueId']
+            if self._orderJournal is not None:
+                self._orderJournal.RecordReserved(orderEntry, self._queueIndex, orderWritePointer)
+            orderWritePointer = self._IncrementPointer(orderWritePointer)
+        else:
+            index = len(orderEntries)
+
+        if len(ioNameValues) > 0:
+            # update order write pointer only once after all order entries are written
+            self._orderWritePointer = orderWritePointer
+            ioNameValues.append((self._orderWritePointerIOName, self._orderWritePointer))
+        return ioNameValues, list(orderEntries[index:])
 
     def DequeueOrderResult(self):
         """ Dequeues next result entry in order result queue.
@@ -103,14 +439,82 @@ class ProductionCycleOrderManager(object):
         returns:
             dict: Order result information. None if there is no result entry to be read.
         """
-        # reads next order result from order result queue and increment the order result read pointer
-        resultEntry = None
+        resultEntries = self._orderPipeline.DequeueOrderResults(maxCount=1)
+        return resultEntries[0] if len(resultEntries) > 0 else None
+
+    async def DequeueOrderResultAsync(self):
+        """ Dequeues next result entry in order result queue without blocking the event loop.
+
+        returns:
+            dict: Order result information. None if there is no result entry to be read.
+        """
+        resultEntries = await self._orderPipeline.DequeueOrderResultsAsync(maxCount=1)
+        return resultEntries[0] if len(resultEntries) > 0 else None
+
+    def DequeueOrderResults(self, maxCount=None):
+        """ Dequeues all readable result entries in order result queue with a single read and a single read pointer update.
+
+        Args:
+            maxCount (int): Maximum number of result entries to dequeue. None to dequeue all readable result entries.
+
+        Returns:
+            list(dict): Order result information, in dequeuing order. Empty if there is no result entry to be read.
+        """
+        return self._orderPipeline.DequeueOrderResults(maxCount)
+
+    async def DequeueOrderResultsAsync(self, maxCount=None):
+        """ Dequeues all readable result entries in order result queue with a single read and a single read pointer update without blocking the event loop.
+
+        Args:
+            maxCount (int): Maximum number of result entries to dequeue. None to dequeue all readable result entries.
+
+        Returns:
+            list(dict): Order result information, in dequeuing order. Empty if there is no result entry to be read.
+        """
+        return await self._orderPipeline.DequeueOrderResultsAsync(maxCount)
+
+    def PrepareDequeueOrderResults(self, maxCount=None):
+        """ Computes readable range of order result queue between the order result read pointer and the order result write pointer, wrapping around length of order queue.
+
+        Args:
+            maxCount (int): Maximum number of result entries in range. None for no limit.
+
+        Returns:
+            tuple(list(str), int): IO names of readable result entries, and value of order result read pointer after reading them.
+        """
+        resultEntryIONames = []
+        resultReadPointer = self._resultReadPointer
         resultWritePointer = self._graphClient.receivedIoMap.get(self._resultWritePointerIOName) or 0
-        if self._resultReadPointer != resultWritePointer:
-            orderResultQueueEntryIOName = '%s[%d]' % (self._resultQueueIOName, self._resultReadPointer - 1)
-            resultEntry = self._graphClient.GetControllerIOVariable(orderResultQueueEntryIOName)
-            self._resultReadPointer = self._IncrementPointer(self._resultReadPointer)
-            self._graphClient.SetControllerIOVariables([
-                (self._resultReadPointerIOName, self._resultReadPointer)
-            ])
-        return resultEntry
+        if resultWritePointer < 1 or resultWritePointer > self._queueLength:
+            return resultEntryIONames, resultReadPointer
+        while resultReadPointer != resultWritePointer:
+            if maxCount is not None and len(resultEntryIONames) >= maxCount:
+                break
+            resultEntryIONames.append('%s[%d]' % (self._resultQueueIOName, resultReadPointer - 1))
+            resultReadPointer = self._IncrementPointer(resultReadPointer)
+        return resultEntryIONames, resultReadPointer
+
+    def AdvanceResultReadPointer(self, resultReadPointer):
+        """ Advances order result read pointer past dequeued result entries.
+
+        Args:
+            resultReadPointer (int): Value of order result read pointer after the dequeued result entries, as returned by PrepareDequeueOrderResults.
+
+        Returns:
+            tuple(ioName, ioValue): IO variable to set to advance the order result read pointer on Mujin controller.
+        """
+        self._resultReadPointer = resultReadPointer
+        return (self._resultReadPointerIOName, resultReadPointer)
+
+    async def SubmitOrder(self, orderEntry):
+        """ Submits an order entry to be written to the order queue as soon as there is room. Instead of failing when the order queue is full,
+        waits for Mujin controller to advance the order read pointer. Order entries pending at the same time are written in one request.
+        Waits for room in local pending queue first when maxPendingOrders order entries are already pending.
+
+        Args:
+            orderEntry (dict): Order information to queue to the system.
+
+        Returns:
+            asyncio.Future: Resolves with the result entry matching orderUniqueId of the order entry once it is dequeued. None if order entry has no orderUniqueId.
+        """
+        return await self._orderPipeline.SubmitOrder(orderEntry, self._queueIndex)
@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from .errors import CircuitOpenError, ControllerConnectionError, ControllerResponseError
+from .orderjournal import JournaledOrderState
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class OrderPipeline(object):
+    """ Writes order entries to the order queues of one or more ProductionCycleOrderManager sharing one MujinGraphClient, and dequeues their result entries.
+    Order entries written to different order queues at the same time share one request, and result entries of all order result queues are dequeued with one read
+    and one read pointer update. Used by ProductionCycleOrderManager for its own order queue, and by MultiQueueOrderManager for the order queues it drives.
+    """
+
+    _graphClient = None # instance of graphqlclient.GraphClient
+    _orderManagers = None # dict mapping queue index to ProductionCycleOrderManager of that order queue
+    _routeOrders = None # function mapping list(tuple(orderEntry, queueIndex)) to dict mapping queue index to list of indices of order entries to reserve in that order queue, in order
+    _orderTracker = None # OrderTracker of in-flight orders of all order queues
+    _orderJournal = None # OrderJournal of in-flight orders of all order queues, None to not journal orders
+    _isJournalRecovered = False # whether in-flight orders of order journal were recovered
+
+    _maxPendingOrders = None # maximum number of submitted order entries waiting locally for room in order queues
+    _pendingSubmissions = None # list of tuple(orderEntry, queueIndex, asyncio.Future) submitted but not yet written, queueIndex None to route when written
+    _pendingSubmissionSlots = None # asyncio.Semaphore bounding pendingSubmissions, created on first use
+    _submissionTask = None # asyncio.Task writing pending submissions to order queues as room becomes available
+    _submissionPollInterval = 1.0 # seconds to wait for an order read pointer to change before checking for submissions whose callers stopped waiting
+    _minSubmissionRetryDelay = 0.1 # seconds to wait before retrying after a failure to resync order write pointers, doubled on each consecutive failure
+    _maxSubmissionRetryDelay = 5.0 # maximum seconds to wait before retrying after a failure to resync order write pointers
+
+    _dequeueLock = None # asyncio.Lock serializing async dequeues, so that concurrent dequeues do not read the same result entries, created on first use
+
+    def __init__(self, graphClient, orderManagers, routeOrders, orderTracker, orderJournal=None, maxPendingOrders=100):
+        """
+        Args:
+            graphClient (MujinGraphClient): Client shared by all order queues.
+            orderManagers (dict): Mapping of queue index to ProductionCycleOrderManager of that order queue.
+            routeOrders (callable): Called with list(tuple(orderEntry, queueIndex)), queueIndex None if not chosen by the caller, returns dict mapping queue index
+                to list of indices of the order entries to reserve in that order queue, in order. Order entries not in any list are not queued.
+            orderTracker (OrderTracker): Tracker of in-flight orders of all order queues.
+            orderJournal (OrderJournal): Journal of in-flight orders of all order queues. None to not journal orders.
+            maxPendingOrders (int): Maximum number of submitted order entries waiting locally for room in order queues.
+        """
+        self._graphClient = graphClient
+        self._orderManagers = orderManagers
+        self._routeOrders = routeOrders
+        self._orderTracker = orderTracker
+        self._orderJournal = orderJournal
+        self._maxPendingOrders = maxPendingOrders
+        self._pendingSubmissions = []
+
+    @property
+    def numPendingOrders(self):
+        """ Number of submitted order entries waiting locally for room in order queues.
+        """
+        return len(self._pendingSubmissions)
+
+    def _GetOrderUniqueIds(self, orderEntries):
+        """ Returns orderUniqueId of each order entry having one.
+        """
+        return [orderEntry['orderUniqueId'] for orderEntry in orderEntries if orderEntry.get('orderUniqueId') is not None]
+
+    def _GetResultOrderUniqueIds(self, resultEntries):
+        """ Returns orderUniqueId of each result entry having one.
+        """
+        return [resultEntry['orderUniqueId'] for resultEntry in resultEntries if isinstance(resultEntry, dict) and resultEntry.get('orderUniqueId') is not None]
+
+    def _CheckQueueIndices(self, orderEntries):
+        """ Raises if any order entry is to be queued to an order queue that is not managed.
+        """
+        for orderEntry, queueIndex in orderEntries:
+            if queueIndex is not None and queueIndex not in self._orderManagers:
+                raise Exception('Queue index %d is not managed' % queueIndex)
+
+    def _PrepareQueueOrders(self, orderEntries, trackOrders=True, createResultFutures=False):
+        """ Routes order entries to order queues and reserves entries in them for as many order entries as fit.
+
+        Args:
+            orderEntries (list(tuple(dict, int))): Order entries with their queue index, None to choose by routeOrders.
+            trackOrders (bool): Whether to start tracking accepted order entries. False if they are already tracked.
+            createResultFutures (bool): Whether to create result futures when starting to track orders. Has to be called from within a running event loop if True.
+
+        Returns:
+            tuple(list(tuple(ioName, ioValue)), list(int), dict): IO variables to set to queue the accepted order entries of all order queues, each order queue's order write pointer after its order entries,
+            indices into orderEntries of accepted order entries, and mapping of queue index of each order queue written to its order write pointer epoch.
+        """
+        ioNameValues = []
+        acceptedIndices = []
+        orderWritePointerEpochs = {}
+        for queueIndex, routedIndices in self._routeOrders(orderEntries).items():
+            if len(routedIndices) == 0:
+                continue
+            orderManager = self._orderManagers[queueIndex]
+            queueIoNameValues, rejectedOrderEntries = orderManager.ReserveOrderEntries([orderEntries[index][0] for index in routedIndices], trackOrders=trackOrders, createResultFutures=createResultFutures)
+            if len(queueIoNameValues) > 0:
+                orderWritePointerEpochs[queueIndex] = orderManager.orderWritePointerEpoch
+            ioNameValues += queueIoNameValues
+            acceptedIndices += routedIndices[:len(routedIndices) - len(rejectedOrderEntries)]
+        acceptedIndices.sort()
+        return ioNameValues, acceptedIndices, orderWritePointerEpochs
+
+    def _ResyncOrderWritePointers(self):
+        """ Reads back order write pointers left stale by failed writes from Mujin controller.
+        """
+        for orderManager in self._orderManagers.values():
+            orderManager.ResyncOrderWritePointer()
+
+    async def _ResyncOrderWritePointersAsync(self):
+        """ Reads back order write pointers left stale by failed writes from Mujin controller without blocking the event loop.
+        """
+        await asyncio.gather(*[orderManager.ResyncOrderWritePointerAsync() for orderManager in self._orderManagers.values()])
+
+    def _CheckOrderWritePointerEpochs(self, orderWritePointerEpochs):
+        """ Raises if order queue entries reserved in any order queue must not be written because an earlier write to that order queue failed since.
+        """
+        for queueIndex, orderWritePointerEpoch in orderWritePointerEpochs.items():
+            self._orderManagers[queueIndex].CheckOrderWritePointerEpoch(orderWritePointerEpoch)
+
+    def _MarkOrderWritePointersStale(self, orderWritePointerEpochs):
+        """ Marks order write pointers of order queues written by a failed write stale.
+        """
+        for queueIndex, orderWritePointerEpoch in orderWritePointerEpochs.items():
+            self._orderManagers[queueIndex].MarkOrderWritePointerStale(orderWritePointerEpoch)
+
+    def _WriteQueuedOrders(self, ioNameValues, orderUniqueIds, orderWritePointerEpochs):
+        """ Writes reserved order queue entries and records acknowledgement of their orders. Reserved order queue entries are made durable in the
+        order journal first, so that a restart can tell whether Mujin controller applied the write. On failure, the order write pointers are read back
+        before reserving more order queue entries.
+        """
+        isRequestSent = False
+        try:
+            if self._orderJournal is not None:
+                self._orderJournal.Sync()
+            self._CheckOrderWritePointerEpochs(orderWritePointerEpochs)
+            isRequestSent = True
+            self._graphClient.SetControllerIOVariables(ioNameValues)
+        except Exception as e:
+            self._OnWriteQueuedOrdersFailed(orderUniqueIds, orderWritePointerEpochs, e, isRequestSent)
+            raise
+        self._orderTracker.MarkWriteAcknowledged(orderUniqueIds)
+        if self._orderJournal is not None:
+            self._orderJournal.RecordWritten(orderUniqueIds)
+
+    async def _WriteQueuedOrdersAsync(self, ioNameValues, orderUniqueIds, orderWritePointerEpochs):
+        """ Writes reserved order queue entries through the write batcher and records acknowledgement of their orders. Reserved order queue entries are
+        made durable in the order journal first, sharing one fsync with concurrent writes. Once a write fails, writes of order queue entries reserved after it
+        in the same order queues fail too, and the order write pointers are read back before reserving more order queue entries.
+        """
+        isRequestSent = False
+        try:
+            if self._orderJournal is not None:
+                await self._orderJournal.SyncAsync()
+            self._CheckOrderWritePointerEpochs(orderWritePointerEpochs)
+            writeGroups = [self._orderManagers[queueIndex].orderWritePointerIOName for queueIndex in orderWritePointerEpochs]
+            isRequestSent = True
+            await self._graphClient.SetControllerIOVariablesBatched(ioNameValues, writeGroups=writeGroups)
+        except Exception as e:
+            self._OnWriteQueuedOrdersFailed(orderUniqueIds, orderWritePointerEpochs, e, isRequestSent)
+            raise
+        self._orderTracker.MarkWriteAcknowledged(orderUniqueIds)
+        if self._orderJournal is not None:
+            self._orderJournal.RecordWritten(orderUniqueIds)
+
+    def _OnWriteQueuedOrdersFailed(self, orderUniqueIds, orderWritePointerEpochs, exception, isRequestSent):
+        """ Fails orders whose order queue entries failed to be written. Their orders are removed from the order journal only when Mujin controller certainly
+        did not apply the write. Otherwise they stay reserved, so that a restart reads their order queue entries back to learn whether it did.
+        """
+        self._MarkOrderWritePointersStale(orderWritePointerEpochs)
+        self._orderTracker.MarkWriteFailed(orderUniqueIds, exception)
+        if self._orderJournal is not None and (not isRequestSent or self._IsWriteRejected(exception)):
+            self._orderJournal.RecordRemoved(orderUniqueIds)
+
+    def _IsWriteRejected(self, exception):
+        """ Returns whether a failed write was certainly not applied by Mujin controller, because it was never sent or Mujin controller rejected it.
+        Timeouts, connection failures after sending and server errors leave the outcome unknown.
+        """
+        if isinstance(exception, CircuitOpenError):
+            return True
+        if isinstance(exception, ControllerConnectionError):
+            return not exception.isRequestSent
+        if isinstance(exception, ControllerResponseError):
+            return (exception.response is not None and 'errors' in exception.response) or 400 <= exception.statusCode < 500
+        return False
+
+    def QueueOrders(self, orderEntries, trackOrders=True):
+        """ Queues as many order entries as fit in the order queues with a single request.
+
+        Args:
+            orderEntries (list(tuple(dict, int))): Order entries with their queue index, None to choose by routeOrders, in queuing order.
+            trackOrders (bool): Whether to start tracking accepted order entries. False if they are already tracked.
+
+        Returns:
+            list(dict): Order entries not accepted because their order queue is full, in queuing order.
+        """
+        self._CheckQueueIndices(orderEntries)
+        self._ResyncOrderWritePointers()
+        ioNameValues, acceptedIndices, orderWritePointerEpochs = self._PrepareQueueOrders(orderEntries, trackOrders=trackOrders)
+        if len(ioNameValues) > 0:
+            self._WriteQueuedOrders(ioNameValues, self._GetOrderUniqueIds([orderEntries[index][0] for index in acceptedIndices]), orderWritePointerEpochs)
+        acceptedIndices = set(acceptedIndices)
+        return [orderEntry for index, (orderEntry, queueIndex) in enumerate(orderEntries) if index not in acceptedIndices]
+
+    async def QueueOrdersAsync(self, orderEntries, trackOrders=True):
+        """ Queues as many order entries as fit in the order queues with a single request without blocking the event loop.
+
+        Args:
+            orderEntries (list(tuple(dict, int))): Order entries with their queue index, None to choose by routeOrders, in queuing order.
+            trackOrders (bool): Whether to start tracking accepted order entries with result futures. False if they are already tracked.
+
+        Returns:
+            list(dict): Order entries not accepted because their order queue is full, in queuing order.
+        """
+        self._CheckQueueIndices(orderEntries)
+        await self._ResyncOrderWritePointersAsync()
+        ioNameValues, acceptedIndices, orderWritePointerEpochs = self._PrepareQueueOrders(orderEntries, trackOrders=trackOrders, createResultFutures=True)
+        if len(ioNameValues) > 0:
+            await self._WriteQueuedOrdersAsync(ioNameValues, self._GetOrderUniqueIds([orderEntries[index][0] for index in acceptedIndices]), orderWritePointerEpochs)
+        acceptedIndices = set(acceptedIndices)
+        return [orderEntry for index, (orderEntry, queueIndex) in enumerate(orderEntries) if index not in acceptedIndices]
+
+    def DequeueOrderResults(self, maxCount=None):
+        """ Dequeues readable result entries of all order result queues with a single read and a single update of all read pointers.
+
+        Args:
+            maxCount (int): Maximum number of result entries to dequeue from each order result queue. None to dequeue all readable result entries.
+
+        Returns:
+            list(dict): Order result information, in dequeuing order of each order result queue, order result queues in order of queue index.
+        """
+        resultEntryIONames, resultReadPointers = self._PrepareDequeueOrderResults(maxCount)
+        if len(resultEntryIONames) == 0:
+            return []
+        resultEntries = self._graphClient.GetControllerIOVariables(resultEntryIONames)
+        if self._orderJournal is not None:
+            # orders of dequeued result entries are completed durably before the read pointer update lets Mujin controller reuse their result entries
+            self._orderJournal.RecordRemoved(self._GetResultOrderUniqueIds(resultEntries.values()))
+            self._orderJournal.Sync()
+        self._graphClient.SetControllerIOVariables(self._AdvanceResultReadPointers(resultReadPointers))
+        return self._ReceiveOrderResults([resultEntries[resultEntryIOName] for resultEntryIOName in resultEntryIONames])
+
+    async def DequeueOrderResultsAsync(self, maxCount=None):
+        """ Dequeues readable result entries of all order result queues with a single read and a single update of all read pointers without blocking the event loop.
+        Concurrent calls dequeue one after another, so that each result entry is dequeued once.
+
+        Args:
+            maxCount (int): Maximum number of result entries to dequeue from each order result queue. None to dequeue all readable result entries.
+
+        Returns:
+            list(dict): Order result information, in dequeuing order of each order result queue, order result queues in order of queue index.
+        """
+        if self._dequeueLock is None:
+            self._dequeueLock = asyncio.Lock()
+        async with self._dequeueLock:
+            resultEntryIONames, resultReadPointers = self._PrepareDequeueOrderResults(maxCount)
+            if len(resultEntryIONames) == 0:
+                return []
+            resultEntries = await self._graphClient.GetControllerIOVariablesAsync(resultEntryIONames)
+            if self._orderJournal is not None:
+                self._orderJournal.RecordRemoved(self._GetResultOrderUniqueIds(resultEntries.values()))
+                await self._orderJournal.SyncAsync()
+            await self._graphClient.SetControllerIOVariablesBatched(self._AdvanceResultReadPointers(resultReadPointers))
+        return self._ReceiveOrderResults([resultEntries[resultEntryIOName] for resultEntryIOName in resultEntryIONames])
+
+    def _PrepareDequeueOrderResults(self, maxCount=None):
+        """ Computes readable ranges of all order result queues.
+
+        Returns:
+            tuple(list(str), dict): IO names of readable result entries of all order result queues, and mapping of queue index to value of its order result read pointer after reading them.
+        """
+        resultEntryIONames = []
+        resultReadPointers = {}
+        for queueIndex, orderManager in sorted(self._orderManagers.items()):
+            queueResultEntryIONames, resultReadPointer = orderManager.PrepareDequeueOrderResults(maxCount)
+            if len(queueResultEntryIONames) > 0:
+                resultEntryIONames += queueResultEntryIONames
+                resultReadPointers[queueIndex] = resultReadPointer
+        return resultEntryIONames, resultReadPointers
+
+    def _AdvanceResultReadPointers(self, resultReadPointers):
+        """ Advances order result read pointers of order managers.
+
+        Args:
+            resultReadPointers (dict): Mapping of queue index to new value of its order result read pointer.
+
+        Returns:
+            list(tuple(ioName, ioValue)): IO variables to set to advance the order result read pointers.
+        """
+        return [self._orderManagers[queueIndex].AdvanceResultReadPointer(resultReadPointer) for queueIndex, resultReadPointer in resultReadPointers.items()]
+
+    def _ReceiveOrderResults(self, resultEntries):
+        """ Matches dequeued result entries to their tracked orders.
+
+        Args:
+            resultEntries (list(dict)): Order result information, in dequeuing order.
+
+        Returns:
+            list(dict): Same resultEntries.
+        """
+        for resultEntry in resultEntries:
+            self._orderTracker.MarkResultReceived(resultEntry)
+        return resultEntries
+
+    async def RecoverJournaledOrdersAsync(self, queueIndices):
+        """ Reconciles in-flight orders recovered from the order journal with order queue pointers of Mujin controller, once per order journal.
+        Only order queue entries whose write was not acknowledged before the restart are read back, with one request for all order queues, to learn whether Mujin
+        controller applied the write. Written orders are tracked again, and orders never written are submitted again in their original order. Result entries
+        dequeued right before the restart may be dequeued again.
+
+        Args:
+            queueIndices (list(int)): Indices of order queues whose orders to recover, None among them for pending orders routed when written.
+        """
+        if self._orderJournal is None or self._isJournalRecovered:
+            return
+        self._isJournalRecovered = True
+        journaledOrders = self._orderJournal.GetOrdersOfQueues(queueIndices)
+        if len(journaledOrders) == 0:
+            return
+
+        reservedOrders = [journaledOrder for journaledOrder in journaledOrders if journaledOrder.state == JournaledOrderState.Reserved]
+        appliedOrderUniqueIds = set()
+        if len(reservedOrders) > 0:
+            orderEntryIONames = ['%s[%d]' % (self._orderManagers[journaledOrder.queueIndex].orderQueueIOName, journaledOrder.slot - 1) for journaledOrder in reservedOrders]
+            orderEntries = await self._graphClient.GetControllerIOVariablesAsync(orderEntryIONames, useCache=False)
+            for journaledOrder, orderEntryIOName in zip(reservedOrders, orderEntryIONames):
+                orderEntry = orderEntries.get(orderEntryIOName)
+                if isinstance(orderEntry, dict) and orderEntry.get('orderUniqueId') == journaledOrder.orderUniqueId:
+                    appliedOrderUniqueIds.add(journaledOrder.orderUniqueId)
+            self._orderJournal.RecordWritten(list(appliedOrderUniqueIds))
+
+        writtenOrders = []
+        unwrittenOrders = []
+        for journaledOrder in journaledOrders:
+            if journaledOrder.state == JournaledOrderState.Written or journaledOrder.orderUniqueId in appliedOrderUniqueIds:
+                writtenOrders.append(journaledOrder)
+            else:
+                unwrittenOrders.append(journaledOrder)
+
+        # track written orders again, remembering order queue entries not yet read by Mujin controller to detect when they are picked up
+        for journaledOrder in writtenOrders:
+            self._orderTracker.AddOrder(journaledOrder.orderEntry, createResultFuture=True)
+            self._orderTracker.MarkWriteAcknowledged([journaledOrder.orderUniqueId])
+            if not self._orderManagers[journaledOrder.queueIndex].RestoreWrittenOrder(journaledOrder.orderUniqueId, journaledOrder.slot):
+                self._orderTracker.MarkPickedUp(journaledOrder.orderUniqueId)
+
+        # submit orders that never reached order queue again, in their original order
+        for journaledOrder in unwrittenOrders:
+            asyncio.ensure_future(self.SubmitOrder(journaledOrder.orderEntry, journaledOrder.queueIndex)).add_done_callback(self._OnRecoveredOrderSubmitted)
+        log.info('recovered %d in-flight orders of production queues %r from order journal, %d written and %d submitted again', len(journaledOrders), queueIndices, len(writtenOrders), len(unwrittenOrders))
+
+    def _OnRecoveredOrderSubmitted(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            log.error('failed to submit recovered order again: %s', future.exception())
+
+    async def SubmitOrder(self, orderEntry, queueIndex=None):
+        """ Submits an order entry to be written to an order queue as soon as there is room. Instead of failing when order queues are full,
+        waits for Mujin controller to advance an order read pointer, and keeps waiting while order write pointers cannot be read back. Fails only when its write fails. Order entries pending at the same time are written in one request.
+        Waits for room in local pending queue first when maxPendingOrders order entries are already pending.
+
+        Args:
+            orderEntry (dict): Order information to queue to the system.
+            queueIndex (int): Index of order queue to queue order entry to. None to choose by routeOrders when written.
+
+        Returns:
+            asyncio.Future: Resolves with the result entry matching orderUniqueId of the order entry once it is dequeued. None if order entry has no orderUniqueId.
+        """
+        self._CheckQueueIndices([(orderEntry, queueIndex)])
+        if self._pendingSubmissionSlots is None:
+            self._pendingSubmissionSlots = asyncio.Semaphore(self._maxPendingOrders)
+        await self._pendingSubmissionSlots.acquire()
+        trackedOrder = self._orderTracker.AddOrder(orderEntry, createResultFuture=True)
+        if self._orderJournal is not None:
+            self._orderJournal.RecordPending(orderEntry, queueIndex)
+        future = asyncio.get_running_loop().create_future()
+        self._pendingSubmissions.append((orderEntry, queueIndex, future))
+        if self._submissionTask is None:
+            self._submissionTask = asyncio.ensure_future(self._RunSubmission())
+        await future
+        return trackedOrder.resultFuture if trackedOrder is not None else None
+
+    async def _RunSubmission(self):
+        """ Writes pending submissions to order queues, as many as fit at a time, waiting for any order read pointer to change while nothing fits.
+        Failures to resync order write pointers are retried with backoff, only submissions whose write failed are failed.
+        """
+        orderReadPointerIONames = [orderManager.orderReadPointerIOName for orderManager in self._orderManagers.values()]
+        retryDelay = self._minSubmissionRetryDelay
+        try:
+            while True:
+                # drop submissions whose callers stopped waiting
+                for orderEntry, queueIndex, future in self._pendingSubmissions:
+                    if future.done():
+                        self._pendingSubmissionSlots.release()
+                        self._orderTracker.RemoveOrders(self._GetOrderUniqueIds([orderEntry]))
+                        if self._orderJournal is not None:
+                            self._orderJournal.RecordRemoved(self._GetOrderUniqueIds([orderEntry]))
+                self._pendingSubmissions = [(orderEntry, queueIndex, future) for orderEntry, queueIndex, future in self._pendingSubmissions if not future.done()]
+                if len(self._pendingSubmissions) == 0:
+                    break
+
+                try:
+                    await self._ResyncOrderWritePointersAsync()
+                except Exception as e:
+                    # submissions keep waiting, as they would for room in order queues
+                    log.warning('failed to resync order write pointers, retrying pending orders in %.3fs: %s', retryDelay, e)
+                    await asyncio.sleep(retryDelay)
+                    retryDelay = min(retryDelay * 2, self._maxSubmissionRetryDelay)
+                    continue
+                retryDelay = self._minSubmissionRetryDelay
+
+                ioNameValues, acceptedIndices, orderWritePointerEpochs = self._PrepareQueueOrders([(orderEntry, queueIndex) for orderEntry, queueIndex, future in self._pendingSubmissions], trackOrders=False)
+                if len(ioNameValues) == 0:
+                    # order queues are full, wait for mujin to read order entries, checking for submissions whose callers stopped waiting meanwhile
+                    try:
+                        await self._graphClient.WaitForAnyChange(orderReadPointerIONames, timeout=self._submissionPollInterval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                acceptedIndices = set(acceptedIndices)
+                acceptedSubmissions = [submission for index, submission in enumerate(self._pendingSubmissions) if index in acceptedIndices]
+                self._pendingSubmissions = [submission for index, submission in enumerate(self._pendingSubmissions) if index not in acceptedIndices]
+                for orderEntry, queueIndex, future in acceptedSubmissions:
+                    self._pendingSubmissionSlots.release()
+                try:
+                    await self._WriteQueuedOrdersAsync(ioNameValues, self._GetOrderUniqueIds([orderEntry for orderEntry, queueIndex, future in acceptedSubmissions]), orderWritePointerEpochs)
+                except Exception as e:
+                    for orderEntry, queueIndex, future in acceptedSubmissions:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for orderEntry, queueIndex, future in acceptedSubmissions:
+                        if not future.done():
+                            future.set_result(None)
+        finally:
+            self._submissionTask = None
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import collections
+import math
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class TrackedOrder(object):
+    """ Lifecycle of one queued order entry. Timestamps are in seconds since epoch, None until the stage is reached.
+    """
+    __slots__ = (
+        'orderUniqueId',
+        'orderEntry',
+        'resultFuture',
+        'resultEntry',
+        'queuedTimestamp',
+        'writeAcknowledgedTimestamp',
+        'pickedUpTimestamp',
+        'resultTimestamp',
+    )
+
+    def __init__(self, orderUniqueId, orderEntry, resultFuture=None, queuedTimestamp=None):
+        self.orderUniqueId = orderUniqueId  # unique id of the order
+        self.orderEntry = orderEntry        # order information queued to the system
+        self.resultFuture = resultFuture    # asyncio.Future resolved with result entry, None when queued without event loop
+        self.resultEntry = None             # order result information once received
+        self.queuedTimestamp = queuedTimestamp      # when order entry was queued locally
+        self.writeAcknowledgedTimestamp = None      # when Mujin controller acknowledged writing order entry to order queue
+        self.pickedUpTimestamp = None               # when order read pointer passed the order queue entry
+        self.resultTimestamp = None                 # when result entry was dequeued
+
+    def __repr__(self):
+        return '<TrackedOrder orderUniqueId=%r>' % self.orderUniqueId
+
+
+class OrderTracker(object):
+    """ Registry of in-flight orders keyed by orderUniqueId, matching result entries to queued order entries and keeping latency statistics of completed orders.
+    """
+
+    # latency stages reported by GetLatencyStatistics, as tuple(stageName, startAttribute, endAttribute)
+    _latencyStages = (
+        ('queuedToWriteAcknowledged', 'queuedTimestamp', 'writeAcknowledgedTimestamp'),
+        ('writeAcknowledgedToPickedUp', 'writeAcknowledgedTimestamp', 'pickedUpTimestamp'),
+        ('pickedUpToResult', 'pickedUpTimestamp', 'resultTimestamp'),
+        ('queuedToResult', 'queuedTimestamp', 'resultTimestamp'),
+    )
+
+    _trackedOrders = None # OrderedDict mapping orderUniqueId to TrackedOrder, oldest first
+    _maxTrackedOrders = None # number of in-flight orders above which oldest orders stop being tracked
+    _latencySamples = None # dict mapping latency stage name to deque of latencies of recently completed orders in seconds
+
+    def __init__(self, maxTrackedOrders=10000, maxLatencySamples=10000):
+        """
+        Args:
+            maxTrackedOrders (int): Number of in-flight orders above which oldest orders stop being tracked.
+            maxLatencySamples (int): Number of recently completed orders to keep latencies of.
+        """
+        self._trackedOrders = collections.OrderedDict()
+        self._maxTrackedOrders = maxTrackedOrders
+        self._latencySamples = dict((stageName, collections.deque(maxlen=maxLatencySamples)) for stageName, startAttribute, endAttribute in self._latencyStages)
+
+    @property
+    def numTrackedOrders(self):
+        """ Number of in-flight orders waiting for their result entry.
+        """
+        return len(self._trackedOrders)
+
+    def AddOrder(self, orderEntry, createResultFuture=False):
+        """ Starts tracking an order entry being queued.
+
+        Args:
+            orderEntry (dict): Order information queued to the system.
+            createResultFuture (bool): Whether to create a future resolved with the result entry. Has to be called from within a running event loop if True.
+
+        Returns:
+            TrackedOrder: Tracked order, None if order entry has no orderUniqueId.
+        """
+        orderUniqueId = orderEntry.get('orderUniqueId')
+        if orderUniqueId is None:
+            return None
+        resultFuture = None
+        if createResultFuture:
+            resultFuture = asyncio.get_running_loop().create_future()
+        trackedOrder = TrackedOrder(orderUniqueId, orderEntry, resultFuture=resultFuture, queuedTimestamp=time.time())
+        self._trackedOrders.pop(orderUniqueId, None)
+        self._trackedOrders[orderUniqueId] = trackedOrder
+
+        # stop tracking oldest orders, their result entries were probably never dequeued
+        while len(self._trackedOrders) > self._maxTrackedOrders:
+            evictedOrderUniqueId, evictedOrder = self._trackedOrders.popitem(last=False)
+            log.warning('stopped tracking order "%s" without receiving its result', evictedOrderUniqueId)
+            if evictedOrder.resultFuture is not None and not evictedOrder.resultFuture.done():
+                evictedOrder.resultFuture.cancel()
+        return trackedOrder
+
+    def GetTrackedOrder(self, orderUniqueId):
+        """ Returns TrackedOrder of an in-flight order, None if not tracked.
+        """
+        return self._trackedOrders.get(orderUniqueId)
+
+    def GetResultFuture(self, orderUniqueId):
+        """ Returns future resolved with result entry of an in-flight order, None if not tracked or queued without event loop.
+        """
+        trackedOrder = self._trackedOrders.get(orderUniqueId)
+        if trackedOrder is None:
+            return None
+        return trackedOrder.resultFuture
+
+    def MarkWriteAcknowledged(self, orderUniqueIds, timestamp=None):
+        """ Records that Mujin controller acknowledged writing order entries to order queue.
+
+        Args:
+            orderUniqueIds (list(str)): Unique ids of written orders.
+            timestamp (float): Time of acknowledgement. Defaults to now.
+        """
+        timestamp = timestamp or time.time()
+        for orderUniqueId in orderUniqueIds:
+            trackedOrder = self._trackedOrders.get(orderUniqueId)
+            if trackedOrder is not None and trackedOrder.writeAcknowledgedTimestamp is None:
+                trackedOrder.writeAcknowledgedTimestamp = timestamp
+
+    def MarkWriteFailed(self, orderUniqueIds, exception):
+        """ Stops tracking order entries that failed to be written to order queue.
+
+        Args:
+            orderUniqueIds (list(str)): Unique ids of orders that failed to be written.
+            exception (Exception): Error set on result futures.
+        """
+        for orderUniqueId in orderUniqueIds:
+            trackedOrder = self._trackedOrders.pop(orderUniqueId, None)
+            if trackedOrder is not None and trackedOrder.resultFuture is not None and not trackedOrder.resultFuture.done():
+                trackedOrder.resultFuture.set_exception(exception)
+
+    def RemoveOrders(self, orderUniqueIds):
+        """ Stops tracking orders that will not be queued, cancelling their result futures.
+
+        Args:
+            orderUniqueIds (list(str)): Unique ids of orders to stop tracking.
+        """
+        for orderUniqueId in orderUniqueIds:
+            trackedOrder = self._trackedOrders.pop(orderUniqueId, None)
+            if trackedOrder is not None and trackedOrder.resultFuture is not None:
+                trackedOrder.resultFuture.cancel()
+
+    def MarkPickedUp(self, orderUniqueId, timestamp=None):
+        """ Records that order read pointer passed order queue entry of an order.
+
+        Args:
+            orderUniqueId (str): Unique id of picked up order.
+            timestamp (float): Time order read pointer changed. Defaults to now.
+        """
+        trackedOrder = self._trackedOrders.get(orderUniqueId)
+        if trackedOrder is not None and trackedOrder.pickedUpTimestamp is None:
+            trackedOrder.pickedUpTimestamp = timestamp or time.time()
+
+    def MarkResultReceived(self, resultEntry, timestamp=None):
+        """ Matches a dequeued result entry to its tracked order by orderUniqueId, resolves its result future and records its latencies.
+
+        Args:
+            resultEntry (dict): Order result information.
+            timestamp (float): Time result entry was dequeued. Defaults to now.
+
+        Returns:
+            TrackedOrder: Completed tracked order, None if result entry does not match any tracked order.
+        """
+        if not isinstance(resultEntry, dict):
+            return None
+        trackedOrder = self._trackedOrders.pop(resultEntry.get('orderUniqueId'), None)
+        if trackedOrder is None:
+            log.debug('received result entry not matching any tracked order: %r', resultEntry)
+            return None
+        trackedOrder.resultEntry = resultEntry
+        trackedOrder.resultTimestamp = timestamp or time.time()
+        for stageName, startAttribute, endAttribute in self._latencyStages:
+            startTimestamp = getattr(trackedOrder, startAttribute)
+            endTimestamp = getattr(trackedOrder, endAttribute)
+            if startTimestamp is not None and endTimestamp is not None:
+                self._latencySamples[stageName].append(endTimestamp - startTimestamp)
+        if trackedOrder.resultFuture is not None and not trackedOrder.resultFuture.done():
+            trackedOrder.resultFuture.set_result(resultEntry)
+        return trackedOrder
+
+    def GetLatencyStatistics(self, percentiles=(50, 90, 99)):
+        """ Computes latency percentiles of recently completed orders for each lifecycle stage.
+
+        Args:
+            percentiles (list(float)): Percentiles to compute, between 0 and 100.
+
+        Returns:
+            dict: Mapping of stage name (queuedToWriteAcknowledged, writeAcknowledgedToPickedUp, pickedUpToResult, queuedToResult) to dict with count, and mapping of percentile to latency in seconds. Percentiles are None if there are no samples.
+        """
+        latencyStatistics = {}
+        for stageName, samples in self._latencySamples.items():
+            sortedSamples = sorted(samples)
+            latencyStatistics[stageName] = {
+                'count': len(sortedSamples),
+                'percentiles': dict((percentile, _GetPercentile(sortedSamples, percentile)) for percentile in percentiles),
+            }
+        return latencyStatistics
+
+
+def _GetPercentile(sortedSamples, percentile):
+    """ Returns nearest-rank percentile of sorted samples, None if there are no samples.
+    """
+    if len(sortedSamples) == 0:
+        return None
+    index = max(0, min(len(sortedSamples) - 1, int(math.ceil(percentile / 100.0 * len(sortedSamples))) - 1))
+    return sortedSamples[index]
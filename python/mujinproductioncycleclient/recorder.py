@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import glob
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import logging
+log = logging.getLogger(__name__)
+
+_fileMagic = b'MJNREC\x00\x01' # first bytes of each recording file, the last byte is the format version
+_recordHeader = struct.Struct('<BdI') # record type with compressed flag, timestamp in seconds since epoch, payload length
+_compressedFlag = 0x80 # set in record type byte when payload is zlib compressed
+
+
+class RecordType(object):
+    """ Types of records in a recording.
+    """
+    SubscriptionMessage = 1 # raw graphql-ws message received on the IO subscription
+    GraphQLRequest = 2      # JSON body of a GraphQL query sent to Mujin controller
+    GraphQLResponse = 3     # JSON body of a response to a GraphQL query, concurrent queries may complete out of order
+
+
+class StreamRecorder(object):
+    """ Appends timestamped subscription messages and GraphQL requests and responses to length-prefixed binary recording files, rotating to a new file when
+    the current one exceeds maxFileSize. Record only appends to an in-memory buffer, which is handed to a writer thread once it holds bufferSize bytes, so
+    compression, file writes and rotation stay off the event loop. Records are dropped when more than maxQueuedSize bytes wait for the writer thread,
+    so memory use is bounded. Thread-safe.
+
+    Each file starts with an 8 byte magic, followed by records of a 13 byte header (record type, timestamp, payload length, little endian) and the payload.
+    Files are named basePath.000000, basePath.000001 and so on, continuing after existing files.
+    """
+
+    _basePath = None # path of recording files without the numeric suffix
+    _maxFileSize = None # bytes after which a new recording file is started
+    _maxFiles = None # number of recording files to keep, oldest deleted first, None to keep all
+    _bufferSize = None # bytes of records buffered in memory before handing them to the writer thread
+    _maxQueuedSize = None # bytes of records waiting for the writer thread above which records are dropped
+    _compressionLevel = None # zlib compression level of payloads, None to not compress
+    _compressionMinSize = None # bytes below which payloads are stored uncompressed
+
+    _lock = None # threading.Lock protecting buffered records
+    _records = None # list of tuple(recordType, timestamp, payload) not yet handed to the writer thread
+    _recordsSize = 0 # bytes of payloads in records
+    _queuedSize = 0 # bytes of payloads handed to the writer thread and not written yet
+    _isClosed = False # whether Close was called
+    _writeQueue = None # queue.Queue of tuple(records, recordsSize) to write, threading.Event to set once written and flushed, or None to stop
+    _writerThread = None # threading.Thread compressing and writing records
+
+    _file = None # file object of current recording file, used by writer thread
+    _fileSize = None # bytes written to current recording file
+    _fileIndex = None # numeric suffix of current recording file
+    numRecords = 0 # number of records recorded
+    numBytes = 0 # number of bytes written, after compression
+    numDroppedRecords = 0 # number of records dropped because the writer thread fell behind
+
+    def __init__(self, basePath, maxFileSize=64 * 1024 * 1024, maxFiles=None, bufferSize=64 * 1024, compressionLevel=None, compressionMinSize=256, maxQueuedSize=16 * 1024 * 1024):
+        """
+        Args:
+            basePath (str): Path of recording files without the numeric suffix.
+            maxFileSize (int): Bytes after which a new recording file is started.
+            maxFiles (int): Number of recording files to keep including the current one, at least 1, oldest deleted first. None to keep all.
+            bufferSize (int): Bytes of records buffered in memory before handing them to the writer thread.
+            compressionLevel (int): zlib compression level of payloads from 1 to 9. None to not compress.
+            compressionMinSize (int): Bytes below which payloads are stored uncompressed.
+            maxQueuedSize (int): Bytes of records waiting for the writer thread above which records are dropped.
+        """
+        if maxFiles is not None and maxFiles < 1:
+            raise Exception('Number of recording files to keep has to be at least 1, got %r' % maxFiles)
+        self._basePath = basePath
+        self._maxFileSize = maxFileSize
+        self._maxFiles = maxFiles
+        self._bufferSize = bufferSize
+        self._maxQueuedSize = maxQueuedSize
+        self._compressionLevel = compressionLevel
+        self._compressionMinSize = compressionMinSize
+        self._lock = threading.Lock()
+        self._records = []
+        self._writeQueue = queue.Queue()
+        recordingFiles = GetRecordingFiles(basePath)
+        self._fileIndex = int(recordingFiles[-1].rsplit('.', 1)[1]) + 1 if recordingFiles else 0
+        self._OpenFile()
+        self._writerThread = threading.Thread(target=self._RunWriter, name='StreamRecorder')
+        self._writerThread.daemon = True
+        self._writerThread.start()
+
+    def _OpenFile(self):
+        """ Opens next recording file and deletes oldest files above maxFiles.
+        """
+        path = '%s.%06d' % (self._basePath, self._fileIndex)
+        self._file = open(path, 'wb')
+        self._file.write(_fileMagic)
+        self._fileSize = len(_fileMagic)
+        log.debug('recording to %s', path)
+        if self._maxFiles is not None:
+            for recordingFile in GetRecordingFiles(self._basePath)[:-self._maxFiles]:
+                os.remove(recordingFile)
+
+    def Record(self, recordType, payload, timestamp=None):
+        """ Appends a record to the buffer.
+
+        Args:
+            recordType (int): One of RecordType values.
+            payload (bytes or str): Message or query body, str is encoded as UTF-8.
+            timestamp (float): Time in seconds since epoch. Defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        with self._lock:
+            if self._isClosed:
+                return
+            if self._queuedSize + self._recordsSize + len(payload) > self._maxQueuedSize:
+                if self.numDroppedRecords == 0:
+                    log.warning('recording to %s falls behind, dropping records', self._basePath)
+                self.numDroppedRecords += 1
+                return
+            self._records.append((recordType, timestamp, payload))
+            self._recordsSize += len(payload)
+            self.numRecords += 1
+            if self._recordsSize >= self._bufferSize:
+                self._HandOffRecords()
+
+    def _HandOffRecords(self):
+        """ Hands buffered records to the writer thread. Called with lock held.
+        """
+        if len(self._records) > 0:
+            self._writeQueue.put((self._records, self._recordsSize))
+            self._queuedSize += self._recordsSize
+            self._records = []
+            self._recordsSize = 0
+
+    def _RunWriter(self):
+        """ Compresses and writes records handed off by Record until Close.
+        """
+        while True:
+            item = self._writeQueue.get()
+            if item is None:
+                break
+            if isinstance(item, threading.Event):
+                try:
+                    self._file.flush()
+                except Exception as e:
+                    log.exception('failed to flush recording to %s: %s', self._basePath, e)
+                item.set()
+                continue
+            records, recordsSize = item
+            try:
+                self._WriteRecords(records)
+            except Exception as e:
+                log.exception('failed to write recording to %s: %s', self._basePath, e)
+            with self._lock:
+                self._queuedSize -= recordsSize
+        self._file.close()
+
+    def _WriteRecords(self, records):
+        """ Compresses and writes records to recording files, rotating when the current one exceeds maxFileSize. Called on writer thread.
+        """
+        data = bytearray()
+        for recordType, timestamp, payload in records:
+            if self._compressionLevel is not None and len(payload) >= self._compressionMinSize:
+                compressedPayload = zlib.compress(payload, self._compressionLevel)
+                if len(compressedPayload) < len(payload):
+                    payload = compressedPayload
+                    recordType |= _compressedFlag
+            data += _recordHeader.pack(recordType, timestamp, len(payload))
+            data += payload
+            recordSize = _recordHeader.size + len(payload)
+            self._fileSize += recordSize
+            self.numBytes += recordSize
+            if self._fileSize >= self._maxFileSize:
+                self._file.write(data)
+                data = bytearray()
+                self._file.close()
+                self._fileIndex += 1
+                self._OpenFile()
+        self._file.write(data)
+
+    def Flush(self):
+        """ Writes buffered records and flushes the current recording file, blocking until done. Use an executor from within an event loop.
+        """
+        event = threading.Event()
+        with self._lock:
+            if self._isClosed:
+                return
+            self._HandOffRecords()
+            self._writeQueue.put(event)
+        event.wait()
+
+    def Close(self):
+        """ Writes buffered records and closes the current recording file, blocking until done. Later records are dropped.
+        """
+        with self._lock:
+            if self._isClosed:
+                return
+            self._isClosed = True
+            self._HandOffRecords()
+            self._writeQueue.put(None)
+        self._writerThread.join()
+
+
+def GetRecordingFiles(basePath):
+    """ Returns paths of recording files of a base path, oldest first.
+    """
+    paths = [path for path in glob.glob(glob.escape(basePath) + '.*') if path.rsplit('.', 1)[1].isdigit()]
+    return sorted(paths, key=lambda path: int(path.rsplit('.', 1)[1]))
+
+
+def ReadRecordingFile(path):
+    """ Reads records of one recording file. A record truncated by a crash while recording ends the file.
+
+    Args:
+        path (str): Path of recording file.
+
+    Yields:
+        tuple(int, float, bytes): Record type, timestamp in seconds since epoch, and decompressed payload.
+    """
+    with open(path, 'rb') as recordingFile:
+        if recordingFile.read(len(_fileMagic)) != _fileMagic:
+            raise Exception('File "%s" is not a recording' % path)
+        while True:
+            header = recordingFile.read(_recordHeader.size)
+            if len(header) < _recordHeader.size:
+                if len(header) > 0:
+                    log.warning('recording file %s ends with a truncated record', path)
+                return
+            recordType, timestamp, payloadLength = _recordHeader.unpack(header)
+            payload = recordingFile.read(payloadLength)
+            if len(payload) < payloadLength:
+                log.warning('recording file %s ends with a truncated record', path)
+                return
+            if recordType & _compressedFlag:
+                recordType &= ~_compressedFlag
+                payload = zlib.decompress(payload)
+            yield recordType, timestamp, payload
+
+
+def ReadRecording(basePath):
+    """ Reads records of all recording files of a base path in recording order.
+
+    Args:
+        basePath (str): Path of recording files without the numeric suffix.
+
+    Yields:
+        tuple(int, float, bytes): Record type, timestamp in seconds since epoch, and decompressed payload.
+    """
+    for path in GetRecordingFiles(basePath):
+        for record in ReadRecordingFile(path):
+            yield record
+
+
+class StreamReplayer(object):
+    """ Feeds recorded subscription messages back into a MujinGraphClient in place of its subscription, at recorded pace scaled by speed or as fast as possible.
+    GraphQL queries made by the client meanwhile go to the Mujin controller it points to, e.g. a MockMujinController.
+    """
+
+    _basePath = None # path of recording files without the numeric suffix
+    _speed = None # factor by which replay is faster than recorded pace, None to replay as fast as possible
+    numReplayedMessages = 0 # number of subscription messages replayed
+    maxLag = 0 # maximum seconds a message was fed later than its scaled recorded time
+
+    def __init__(self, basePath, speed=1.0):
+        """
+        Args:
+            basePath (str): Path of recording files without the numeric suffix.
+            speed (float): Factor by which replay is faster than recorded pace, e.g. 1.0 for real time, 10.0 for ten times faster. None to replay as fast as possible.
+        """
+        self._basePath = basePath
+        self._speed = speed
+
+    async def Replay(self, graphClient):
+        """ Feeds all recorded subscription messages to a client. Yields to the event loop after each message, so that waiters of changed IO run in between.
+
+        Args:
+            graphClient (MujinGraphClient): Client to feed, should not be subscribed itself.
+
+        Returns:
+            int: Number of subscription messages replayed.
+        """
+        loop = asyncio.get_running_loop()
+        startTime = None
+        firstTimestamp = None
+        for recordType, timestamp, payload in ReadRecording(self._basePath):
+            if recordType != RecordType.SubscriptionMessage:
+                continue
+            delay = 0
+            if self._speed is not None:
+                if startTime is None:
+                    startTime = loop.time()
+                    firstTimestamp = timestamp
+                delay = startTime + (timestamp - firstTimestamp) / self._speed - loop.time()
+                self.maxLag = max(self.maxLag, -delay)
+            await asyncio.sleep(max(0, delay))
+            graphClient.HandleSubscriptionMessage(payload)
+            self.numReplayedMessages += 1
+        return self.numReplayedMessages
@@ -15,6 +15,7 @@ import argparse
 import asyncio
 
 from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.locationmanager import LocationManager
 from mujinproductioncycleclient.ordermanager import ProductionCycleOrderManager
 
 import logging
@@ -25,10 +26,13 @@ async def _RunMain(url, username, password):
     # GraphQLClient to set and get controller io variables
     graphClient = MujinGraphClient(url, username, password)
 
-    await asyncio.gather(
-        graphClient.SubscribeRobotBridgesState(),
-        _ManageProductionCycle(graphClient),
-    )
+    try:
+        await asyncio.gather(
+            graphClient.SubscribeRobotBridgesState(reconnect=True),
+            _ManageProductionCycle(graphClient),
+        )
+    finally:
+        await graphClient.CloseAsync()
 
 async def _ManageProductionCycle(graphClient):
     """ Starts production cycle and queues a single order. Manages the location states for the order to be processed and dequeue the order result.
@@ -66,32 +70,27 @@ async def _ManageProductionCycle(graphClient):
         'orderPlaceLocationName': placeLocationName,
         # NOTE: additional parameters may be required depending on the configurations on mujin controller
     }
-    orderManager.QueueOrder(orderEntry)
+    resultFuture = await orderManager.SubmitOrder(orderEntry) # waits for room in order queue if it is full
     log.info('Queued order: %r', orderEntry)
 
+    # LocationManager to handle location move in and out for source and destination locations
+    locationManager = LocationManager(
+        graphClient,
+        locations=[
+            # location1 and location2 here are examples, depend on mujin controller configuration
+            {'locationName': pickLocationName, 'locationIndex': 1, 'containerId': pickContainerId}, # use containerId matching the queued order request
+            {'locationName': placeLocationName, 'locationIndex': 2, 'containerId': placeContainerId}, # use containerId matching the queued order request
+        ],
+        # NOTE: pass containerIdProvider to look up container ids when they are moved in, e.g. from barcode reader or agv system
+    )
+
     await asyncio.gather(
-        # handle location move in and out for source location
-        HandleLocationMove(
-            graphClient=graphClient,
-            locationName=pickLocationName,
-            containerId=pickContainerId, # use containerId matching the queued order request
-            containerIdIOName='location1ContainerId', # location1 here is example, depend on mujin controller configuration
-            hasContainerIOName='location1HasContainer', # location1 here is example, depend on mujin controller configuration
-            moveInIOName='moveInLocation1Container', # location1 here is example, depend on mujin controller configuration
-            moveOutIOName='moveOutLocation1Container', # location1 here is example, depend on mujin controller configuration
-        ),
-        # handle location move in and out for destination location
-        HandleLocationMove(
-            graphClient,
-            locationName=placeLocationName,
-            containerId=placeContainerId, # use containerId matching the queued order request
-            containerIdIOName='location2ContainerId', # location2 here is example, depend on mujin controller configuration
-            hasContainerIOName='location2HasContainer', # location2 here is example, depend on mujin controller configuration
-            moveInIOName='moveInLocation2Container', # location2 here is example, depend on mujin controller configuration
-            moveOutIOName='moveOutLocation2Container', # location2 here is example, depend on mujin controller configuration
-        ),
+        # handle location move in and out for all locations
+        locationManager.Run(),
         # dequeue order results
         DequeueOrderResults(orderManager),
+        # wait for result of the queued order
+        WaitForQueuedOrderResult(orderManager, resultFuture),
     )
 
 async def StartProductionCycle(graphClient):
@@ -102,16 +101,15 @@ async def StartProductionCycle(graphClient):
     """
     # start production cycle
     if not graphClient.sentIoMap.get('isRunningProductionCycle'):
-        graphClient.SetControllerIOVariables([
+        await graphClient.SetControllerIOVariablesBatched([
             ('startProductionCycle', True)
         ])
 
     # wait for production cycle to start running
-    while not graphClient.sentIoMap.get('isRunningProductionCycle'):
-        await asyncio.sleep(0) # non-blocking sleep, allow next scheduled coroutine to run
+    await graphClient.WaitForIO('isRunningProductionCycle')
 
     # set trigger off
-    graphClient.SetControllerIOVariables([
+    await graphClient.SetControllerIOVariablesBatched([
         ('startProductionCycle', False)
     ])
 
@@ -123,53 +121,23 @@ async def DequeueOrderResults(orderManager):
     """
     while True:
         # read the order result
-        resultEntry = orderManager.DequeueOrderResult()
-        if resultEntry is not None:
-            log.info('Read order result: %r', resultEntry)
+        # wait until there is an order result to read
+        await orderManager.WaitForOrderResult()
 
-        await asyncio.sleep(0) # non-blocking sleep, allow next scheduled coroutine to run
+        # read all available order results at once
+        for resultEntry in await orderManager.DequeueOrderResultsAsync():
+            log.info('Read order result: %r', resultEntry)
 
-async def HandleLocationMove(graphClient, locationName, containerId, containerIdIOName, hasContainerIOName, moveInIOName, moveOutIOName):
-    """ Handles state management of a location upon move-in and move-out request sent from Mujin.
+async def WaitForQueuedOrderResult(orderManager, resultFuture):
+    """ Waits for the result of a queued order and reports how long the order took.
 
     Args:
-        graphClient (MujinGraphClient): For checking Mujin IO state and setting location state IO.
-        locationName (str): Name of this location for printing.
-        containerId (str): ID of the container to move in to this location. Should be consistent with the queued order information.
-        containerIdIOName (str): IO name used to set this location's container ID value.
-        hasContainerIOName (str): IO name used to set this location's hasContainer .
-        moveInIOName (str): IO name used to get and check for move-in request for this location.
-        moveOutIOName (str): IO name used to get and check for move-out request for this location.
+        orderManager (ProductionCycleOrderManager): For reading order latency statistics.
+        resultFuture (asyncio.Future): Resolves with the result entry of the queued order.
     """
-    hasContainer = graphClient.sentIoMap.get(hasContainerIOName)
-    while True:
-        ioNameValues = []
-        isMoveIn = graphClient.sentIoMap.get(moveInIOName)
-        isMoveOut = graphClient.sentIoMap.get(moveOutIOName)
-
-        # handle move in
-        if isMoveIn and not hasContainer:
-            ioNameValues += [
-                (containerIdIOName, containerId), # set container ID
-                (hasContainerIOName, True),       # hasContainer set True
-            ]
-            hasContainer = True
-            log.info('Moved in container "%s" to location "%s"', containerId, locationName)
-
-        # handle move out
-        elif isMoveOut and hasContainer:
-            ioNameValues += [
-                (containerIdIOName, ''),     # reset container ID
-                (hasContainerIOName, False), # hasContainer set False
-            ]
-            hasContainer = False
-            log.info('Moved out container "%s" of location "%s"', containerId, locationName)
-
-        # set ioNameValues
-        if len(ioNameValues) > 0:
-            graphClient.SetControllerIOVariables(ioNameValues)
-
-        await asyncio.sleep(0) # non-blocking sleep, allow next scheduled coroutine to run
+    resultEntry = await resultFuture
+    log.info('Finished order: %r', resultEntry)
+    log.info('Order latency statistics: %r', orderManager.orderTracker.GetLatencyStatistics())
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Example code to run one order on production cycle')
@@ -14,7 +14,13 @@ setup(
     package_dir={'mujinproductioncycleclient': 'python/mujinproductioncycleclient'},
     long_description=open('README.md').read(),
     install_requires=[
+        'aiohttp',
         'websockets',
         'requests',
     ],
+    extras_require={
+        # faster JSON encoding and decoding, used when installed
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+    },
 )
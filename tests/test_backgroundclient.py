@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mujinproductioncycleclient.backgroundclient import MujinBackgroundClient
+from mujinproductioncycleclient.mockcontroller import MockMujinController
+
+
+@pytest.fixture
+def mockController():
+    """ Runs a MockMujinController on its own event loop thread, like a controller separate from the synchronous host.
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    mockController = MockMujinController()
+    asyncio.run_coroutine_threadsafe(mockController.Start(), loop).result(5)
+    try:
+        yield mockController
+    finally:
+        asyncio.run_coroutine_threadsafe(mockController.Stop(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_RunCoroutineRunsOnBackgroundThread():
+    async def _GetThread():
+        await asyncio.sleep(0)
+        return threading.current_thread()
+
+    async def _Raise():
+        raise KeyError('injected')
+
+    with MujinBackgroundClient() as backgroundClient:
+        thread = backgroundClient.RunCoroutine(_GetThread())
+        assert thread is not threading.current_thread()
+        assert thread.name == 'MujinBackgroundClient'
+        with pytest.raises(KeyError, match='injected'):
+            backgroundClient.RunCoroutine(_Raise())
+        # still usable after a coroutine failed
+        assert backgroundClient.RunCoroutine(_GetThread()) is thread
+    assert not thread.is_alive()
+
+
+def test_RunCoroutineFromBackgroundThreadRaises():
+    async def _RunNested(backgroundClient):
+        coroutine = asyncio.sleep(0)
+        with pytest.raises(Exception, match='Cannot block background thread'):
+            backgroundClient.RunCoroutine(coroutine)
+        return coroutine.cr_frame is None
+
+    with MujinBackgroundClient() as backgroundClient:
+        # instead of deadlocking, coroutine is closed without being awaited
+        assert backgroundClient.RunCoroutine(_RunNested(backgroundClient)) is True
+
+
+def test_RunCoroutineWhenNotRunningRaises():
+    backgroundClient = MujinBackgroundClient()
+    coroutine = asyncio.sleep(0)
+    with pytest.raises(Exception, match='not running'):
+        backgroundClient.RunCoroutine(coroutine)
+    assert coroutine.cr_frame is None
+    backgroundClient.Start()
+    backgroundClient.Stop()
+    with pytest.raises(Exception, match='not running'):
+        backgroundClient.RunCoroutine(asyncio.sleep(0))
+
+
+def test_ConcurrentCallsFromManyThreads(mockController):
+    with MujinBackgroundClient(mockController.url) as backgroundClient:
+        backgroundClient.WaitForConnection(timeout=5)
+
+        def _SetAndGet(index):
+            backgroundClient.SetControllerIOVariables([('location1ContainerId', 'container%d' % index)])
+            return backgroundClient.GetControllerIOVariable('isRunningProductionCycle', useCache=False)
+
+        with ThreadPoolExecutor(8) as executor:
+            assert list(executor.map(_SetAndGet, range(16))) == [False] * 16
+        assert mockController.GetIOValue('location1ContainerId').startswith('container')
+        assert backgroundClient.WaitForIO('location1ContainerId', lambda value: value is not None, timeout=5).startswith('container')
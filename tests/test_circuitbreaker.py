@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from mujinproductioncycleclient import circuitbreaker
+from mujinproductioncycleclient.circuitbreaker import CircuitBreaker, CircuitState
+from mujinproductioncycleclient.errors import CircuitOpenError
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.mockcontroller import MockMujinController
+
+
+class _Clock(object):
+    """ Replaces time.monotonic of circuitbreaker with a clock advanced by hand.
+    """
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(circuitbreaker.time, 'monotonic', lambda: self.now)
+
+
+def _OpenCircuitBreaker(failureThreshold=3, resetTimeout=1.0):
+    circuitBreaker = CircuitBreaker('http://controller', failureThreshold=failureThreshold, resetTimeout=resetTimeout)
+    for index in range(failureThreshold):
+        assert circuitBreaker.BeforeRequest() is False
+        circuitBreaker.RecordFailure()
+    return circuitBreaker
+
+
+def test_OpensAfterConsecutiveFailures():
+    circuitBreaker = CircuitBreaker('http://controller', failureThreshold=3)
+    circuitBreaker.RecordFailure()
+    circuitBreaker.RecordFailure()
+    circuitBreaker.RecordSuccess()
+    circuitBreaker.RecordFailure()
+    circuitBreaker.RecordFailure()
+    # success in between resets the count of consecutive failures
+    assert circuitBreaker.state == CircuitState.Closed
+
+    circuitBreaker.RecordFailure()
+    assert circuitBreaker.state == CircuitState.Open
+    with pytest.raises(CircuitOpenError):
+        circuitBreaker.BeforeRequest()
+
+
+def test_LetsOneTrialRequestThroughAfterResetTimeout(monkeypatch):
+    clock = _Clock(monkeypatch)
+    circuitBreaker = _OpenCircuitBreaker()
+    clock.now += 1.0
+    assert circuitBreaker.BeforeRequest() is True
+    assert circuitBreaker.state == CircuitState.HalfOpen
+    with pytest.raises(CircuitOpenError):
+        circuitBreaker.BeforeRequest()
+
+    circuitBreaker.RecordSuccess()
+    assert circuitBreaker.state == CircuitState.Closed
+    assert circuitBreaker.BeforeRequest() is False
+
+
+def test_FailedTrialRequestOpensCircuitAgain(monkeypatch):
+    clock = _Clock(monkeypatch)
+    circuitBreaker = _OpenCircuitBreaker()
+    clock.now += 1.0
+    assert circuitBreaker.BeforeRequest() is True
+    circuitBreaker.RecordFailure()
+    assert circuitBreaker.state == CircuitState.Open
+    clock.now += 0.5
+    with pytest.raises(CircuitOpenError):
+        circuitBreaker.BeforeRequest()
+    clock.now += 0.5
+    assert circuitBreaker.BeforeRequest() is True
+
+
+def test_ReleasedTrialLetsNextRequestBecomeTrial(monkeypatch):
+    clock = _Clock(monkeypatch)
+    circuitBreaker = _OpenCircuitBreaker()
+    clock.now += 1.0
+    assert circuitBreaker.BeforeRequest() is True
+    circuitBreaker.ReleaseTrial()
+    assert circuitBreaker.BeforeRequest() is True
+    assert circuitBreaker.state == CircuitState.HalfOpen
+
+
+def test_StuckTrialIsReplacedAfterResetTimeout(monkeypatch):
+    clock = _Clock(monkeypatch)
+    circuitBreaker = _OpenCircuitBreaker()
+    clock.now += 1.0
+    assert circuitBreaker.BeforeRequest() is True
+    clock.now += 1.0
+    assert circuitBreaker.BeforeRequest() is True
+
+
+def test_CancelledTrialRequestOfClientIsReleased():
+    async def _Run():
+        async with MockMujinController(requestDelay=0.1) as mockController:
+            graphClient = MujinGraphClient(mockController.url, circuitBreakerThreshold=1, circuitBreakerResetTimeout=0.5)
+            try:
+                graphClient.circuitBreaker.RecordFailure()
+                await asyncio.sleep(0.5)
+                with pytest.raises(asyncio.TimeoutError):
+                    await asyncio.wait_for(graphClient.GetControllerIOVariableAsync('isRunningProductionCycle', useCache=False), 0.05)
+                # sent as the next trial request right away instead of failing until the cancelled one would have timed out
+                assert await graphClient.GetControllerIOVariableAsync('isRunningProductionCycle', useCache=False) is False
+                return graphClient.circuitBreaker.state
+            finally:
+                await graphClient.CloseAsync()
+
+    assert asyncio.run(_Run()) == CircuitState.Closed
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from mujinproductioncycleclient.fleetclient import MujinFleetClient
+from mujinproductioncycleclient.mockcontroller import MockMujinController
+
+
+def test_SlowControllerTimesOutWithoutAffectingOthers():
+    async def _Run():
+        async with MockMujinController() as fastController, MockMujinController(requestDelay=1.0) as slowController:
+            controllers = [
+                {'controllerName': 'fast', 'url': fastController.url},
+                {'controllerName': 'slow', 'url': slowController.url},
+            ]
+            async with MujinFleetClient(controllers, defaultTimeout=0.2) as fleetClient:
+                startTime = asyncio.get_running_loop().time()
+                results = await fleetClient.RunOnControllers(lambda client: client.GetControllerIOVariablesAsync(['isRunningProductionCycle'], useCache=False))
+                elapsedTime = asyncio.get_running_loop().time() - startTime
+                return results, elapsedTime
+
+    results, elapsedTime = asyncio.run(_Run())
+    assert results['fast'] == {'isRunningProductionCycle': False}
+    assert isinstance(results['slow'], asyncio.TimeoutError)
+    # slow controller is given up on at its deadline instead of delaying results of the others
+    assert elapsedTime < 0.8
+
+
+def test_TimeoutAndControllerNamesOverrideDefaults():
+    async def _Run():
+        async with MockMujinController(requestDelay=0.3) as controller1, MockMujinController(requestDelay=0.3) as controller2:
+            controllers = [
+                {'controllerName': 'controller1', 'url': controller1.url},
+                {'controllerName': 'controller2', 'url': controller2.url},
+            ]
+            async with MujinFleetClient(controllers, defaultTimeout=0.05) as fleetClient:
+                results = await fleetClient.RunOnControllers(lambda client: client.GetControllerIOVariableAsync('isRunningProductionCycle', useCache=False), timeout=2.0, controllerNames=['controller2'])
+                defaultTimeoutResults = await fleetClient.RunOnControllers(lambda client: client.GetControllerIOVariableAsync('isRunningProductionCycle', useCache=False))
+                return results, defaultTimeoutResults
+
+    results, defaultTimeoutResults = asyncio.run(_Run())
+    assert results == {'controller2': False}
+    assert sorted(defaultTimeoutResults) == ['controller1', 'controller2']
+    assert all(isinstance(result, asyncio.TimeoutError) for result in defaultTimeoutResults.values())
+
+
+def test_FailingControllerReturnsItsException():
+    async def _Run():
+        async with MockMujinController() as controller1, MockMujinController() as controller2:
+            controllers = [
+                {'controllerName': 'controller1', 'url': controller1.url},
+                {'controllerName': 'controller2', 'url': controller2.url},
+            ]
+            async with MujinFleetClient(controllers) as fleetClient:
+                async def _GetIOValue(client):
+                    if client is fleetClient.GetClient('controller1'):
+                        raise Exception('injected failure')
+                    return await client.GetControllerIOVariableAsync('isRunningProductionCycle', useCache=False)
+
+                return await fleetClient.RunOnControllers(_GetIOValue)
+
+    results = asyncio.run(_Run())
+    assert str(results['controller1']) == 'injected failure'
+    assert results['controller2'] is False
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from mujinproductioncycleclient.iobatcher import IOWriteBatcher
+
+
+class _RecordingController(object):
+    """ Records batches sent by IOWriteBatcher, taking sendDelay seconds for each.
+    """
+
+    def __init__(self, sendDelay=0):
+        self.batches = []
+        self.sendDelay = sendDelay
+
+    async def SetControllerIOVariablesAsync(self, ioNameValues):
+        self.batches.append(list(ioNameValues))
+        if self.sendDelay > 0:
+            await asyncio.sleep(self.sendDelay)
+
+
+def test_CoalescesConcurrentWritesIntoOneBatch():
+    async def _Run():
+        controller = _RecordingController()
+        batcher = IOWriteBatcher(controller.SetControllerIOVariablesAsync)
+        await asyncio.gather(*[batcher.SetControllerIOVariables([('value%d' % index, index)]) for index in range(5)])
+        return controller.batches
+
+    assert asyncio.run(_Run()) == [[('value0', 0), ('value1', 1), ('value2', 2), ('value3', 3), ('value4', 4)]]
+
+
+def test_RewrittenIONameIsSentOnceAfterEarlierWrites():
+    async def _Run():
+        controller = _RecordingController()
+        batcher = IOWriteBatcher(controller.SetControllerIOVariablesAsync)
+        await asyncio.gather(
+            batcher.SetControllerIOVariables([('queue[0]', 'a'), ('writePointer', 2)]),
+            batcher.SetControllerIOVariables([('queue[1]', 'b'), ('writePointer', 3)]),
+        )
+        return controller.batches
+
+    # the order write pointer is still written after both order queue entries
+    assert asyncio.run(_Run()) == [[('queue[0]', 'a'), ('queue[1]', 'b'), ('writePointer', 3)]]
+
+
+def test_WritesMadeWhileBatchIsInFlightShareNextBatch():
+    async def _Run():
+        controller = _RecordingController(sendDelay=0.05)
+        batcher = IOWriteBatcher(controller.SetControllerIOVariablesAsync)
+        firstFuture = batcher.SetControllerIOVariables([('value0', 0)])
+        await asyncio.sleep(0.01)
+        await asyncio.gather(firstFuture, *[batcher.SetControllerIOVariables([('value%d' % index, index)]) for index in range(1, 4)])
+        return controller.batches
+
+    assert asyncio.run(_Run()) == [[('value0', 0)], [('value1', 1), ('value2', 2), ('value3', 3)]]
+
+
+def test_MaxBatchSizeSendsWithoutWaitingForBatchWindow():
+    async def _Run():
+        controller = _RecordingController()
+        batcher = IOWriteBatcher(controller.SetControllerIOVariablesAsync, batchWindow=10, maxBatchSize=2)
+        await asyncio.wait_for(asyncio.gather(batcher.SetControllerIOVariables([('value0', 0)]), batcher.SetControllerIOVariables([('value1', 1)])), 1)
+        return controller.batches
+
+    assert asyncio.run(_Run()) == [[('value0', 0), ('value1', 1)]]
+
+
+class _FailingController(_RecordingController):
+    """ Records batches like _RecordingController, failing the first numFailures of them.
+    """
+
+    def __init__(self, sendDelay=0, numFailures=1):
+        super(_FailingController, self).__init__(sendDelay=sendDelay)
+        self.numFailures = numFailures
+
+    async def SetControllerIOVariablesAsync(self, ioNameValues):
+        await super(_FailingController, self).SetControllerIOVariablesAsync(ioNameValues)
+        if len(self.batches) <= self.numFailures:
+            raise Exception('injected failure')
+
+
+async def _GetOutcome(future):
+    try:
+        await future
+    except Exception:
+        return 'failed'
+    return 'sent'
+
+
+def test_FailedBatchHoldsWritesOfSameWriteGroupUntilResumed():
+    async def _Run():
+        controller = _FailingController(sendDelay=0.05)
+        batcher = IOWriteBatcher(controller.SetControllerIOVariablesAsync)
+        firstFuture = batcher.SetControllerIOVariables([('queue[0]', 'a'), ('writePointer', 2)], writeGroups=['writePointer'])
+        await asyncio.sleep(0.01)
+        # written while the failing batch is in flight
+        outcomes = await asyncio.gather(
+            _GetOutcome(firstFuture),
+            _GetOutcome(batcher.SetControllerIOVariables([('queue[1]', 'b'), ('writePointer', 3)], writeGroups=['writePointer'])),
+            _GetOutcome(batcher.SetControllerIOVariables([('value', 1)])),
+        )
+        outcomes.append(await _GetOutcome(batcher.SetControllerIOVariables([('queue[1]', 'c'), ('writePointer', 3)], writeGroups=['writePointer'])))
+        batcher.ResumeWriteGroup('writePointer')
+        outcomes.append(await _GetOutcome(batcher.SetControllerIOVariables([('queue[0]', 'd'), ('writePointer', 2)], writeGroups=['writePointer'])))
+        return outcomes, controller.batches
+
+    outcomes, batches = asyncio.run(_Run())
+    # writes of the failed write group are never sent until it is resumed, writes without write group are not affected
+    assert outcomes == ['failed', 'failed', 'sent', 'failed', 'sent']
+    assert batches == [[('queue[0]', 'a'), ('writePointer', 2)], [('value', 1)], [('queue[0]', 'd'), ('writePointer', 2)]]
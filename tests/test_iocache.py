@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from mujinproductioncycleclient import iocache
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.iocache import IOReadCache
+
+
+class _Clock(object):
+    """ Replaces time.monotonic of iocache with a clock advanced by hand.
+    """
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(iocache.time, 'monotonic', lambda: self.now)
+
+
+def test_CachedValueExpiresAfterTtl(monkeypatch):
+    clock = _Clock(monkeypatch)
+    ioReadCache = IOReadCache(ttls={'location*ContainerId': 1.0, 'isRunningProductionCycle': None})
+    ioReadCache.Set('location1ContainerId', 'container1')
+    ioReadCache.Set('isRunningProductionCycle', True)
+    ioReadCache.Set('startProductionCycle', True)
+    assert ioReadCache.Get('location1ContainerId') == (True, 'container1')
+    assert ioReadCache.Get('startProductionCycle') == (False, None) # default ttl of 0 does not cache
+
+    clock.now += 1.0
+    assert ioReadCache.Get('location1ContainerId') == (False, None)
+    assert ioReadCache.Get('isRunningProductionCycle') == (True, True)
+    assert ioReadCache.size == 1
+
+
+def test_LeastRecentlyUsedValueIsEvicted():
+    ioReadCache = IOReadCache(maxSize=2, defaultTtl=None)
+    ioReadCache.Set('value0', 0)
+    ioReadCache.Set('value1', 1)
+    ioReadCache.Get('value0')
+    ioReadCache.Set('value2', 2)
+    assert ioReadCache.Get('value1') == (False, None)
+    assert ioReadCache.Get('value0') == (True, 0)
+    assert ioReadCache.Get('value2') == (True, 2)
+
+
+def test_DiscardRemovesCachedValues():
+    ioReadCache = IOReadCache(defaultTtl=None)
+    ioReadCache.Set('value0', 0)
+    ioReadCache.Set('value1', 1)
+    ioReadCache.Discard(['value0', 'unknown'])
+    assert ioReadCache.Get('value0') == (False, None)
+    assert ioReadCache.Get('value1') == (True, 1)
+
+
+def test_WrittenValueIsServedUntilNextIOState():
+    graphClient = MujinGraphClient()
+    graphClient._UpdateIOState({}, {'stopProductionCycle': False}, isStale=False)
+    graphClient._CacheWrittenIOValues([('stopProductionCycle', True)])
+    assert graphClient._LookupIOValues(['stopProductionCycle']) == ({'stopProductionCycle': True}, [])
+
+    # Mujin controller reset the value before the subscription reported the write
+    graphClient._UpdateIOState({}, {'stopProductionCycle': False}, isStale=False)
+    assert graphClient._LookupIOValues(['stopProductionCycle']) == ({'stopProductionCycle': False}, [])
+
+
+def test_WrittenValueEchoedBeforeAcknowledgementIsNotPinned():
+    graphClient = MujinGraphClient()
+    graphClient._UpdateIOState({}, {'stopProductionCycle': False}, isStale=False)
+    # subscription reports the write before it is acknowledged
+    graphClient._UpdateIOState({}, {'stopProductionCycle': True}, isStale=False)
+    graphClient._CacheWrittenIOValues([('stopProductionCycle', True)])
+    assert graphClient._LookupIOValues(['stopProductionCycle']) == ({'stopProductionCycle': True}, [])
+
+    # next IO state is served even though it does not change the echoed value
+    graphClient._UpdateIOState({}, {'stopProductionCycle': True}, isStale=False)
+    assert graphClient._ioReadCache.Get('stopProductionCycle') == (False, None)
+    graphClient._UpdateIOState({}, {'stopProductionCycle': False}, isStale=False)
+    assert graphClient._LookupIOValues(['stopProductionCycle']) == ({'stopProductionCycle': False}, [])
+
+
+def test_WrittenValueNotMirroredBySubscriptionKeepsTtl():
+    graphClient = MujinGraphClient(readCacheTtls={'location*ContainerId': None})
+    graphClient._UpdateIOState({}, {'stopProductionCycle': False}, isStale=False)
+    graphClient._CacheWrittenIOValues([('location1ContainerId', 'container1')])
+    graphClient._UpdateIOState({}, {'stopProductionCycle': True}, isStale=False)
+    assert graphClient._LookupIOValues(['location1ContainerId']) == ({'location1ContainerId': 'container1'}, [])
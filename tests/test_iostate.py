@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.iostate import IOStateSnapshot
+
+
+def test_SnapshotIsReadOnly():
+    receivedIoMap = {'location1OrderReadPointer': 1}
+    ioState = IOStateSnapshot(version=1, receivedIoMap=receivedIoMap, isStale=False)
+    with pytest.raises(TypeError):
+        ioState.receivedIoMap['location1OrderReadPointer'] = 2
+    # wrapping a snapshot map again does not copy it
+    assert IOStateSnapshot(version=2, receivedIoMap=ioState.receivedIoMap).receivedIoMap is ioState.receivedIoMap
+
+
+def test_SentIOValueTakesPrecedence():
+    ioState = IOStateSnapshot(sentIoMap={'startProductionCycle': True}, receivedIoMap={'startProductionCycle': False, 'stopProductionCycle': False})
+    assert ioState.GetIOValue('startProductionCycle') is True
+    assert ioState.GetIOValue('stopProductionCycle') is False
+    assert ioState.GetIOValue('unknown', defaultValue=0) == 0
+
+
+def test_ChangedIoNameValuesCoverChangedAddedAndRemovedIONames():
+    previousIoState = IOStateSnapshot(version=1, sentIoMap={'isRunningProductionCycle': False}, receivedIoMap={'pointer1': 1, 'pointer2': 1, 'removed': 'value'})
+    ioState = IOStateSnapshot(version=2, sentIoMap={'isRunningProductionCycle': True}, receivedIoMap={'pointer1': 2, 'pointer2': 1, 'added': 'value'})
+    assert ioState.GetChangedIoNameValues(previousIoState) == {
+        'isRunningProductionCycle': True,
+        'pointer1': 2,
+        'added': 'value',
+        'removed': None,
+    }
+    assert ioState.GetChangedIoNameValues(ioState) == {}
+
+
+def test_ChangedReceivedIOValueShadowedBySentIOValueIsNotReported():
+    previousIoState = IOStateSnapshot(sentIoMap={'startProductionCycle': True}, receivedIoMap={'startProductionCycle': False})
+    ioState = IOStateSnapshot(sentIoMap={'startProductionCycle': True}, receivedIoMap={'startProductionCycle': True})
+    assert ioState.GetChangedIoNameValues(previousIoState) == {}
+
+
+def test_ClientKeepsPreviousSnapshotsUnchanged():
+    graphClient = MujinGraphClient()
+    graphClient._UpdateIOState({}, {'location1OrderReadPointer': 1}, isStale=False)
+    previousIoState = graphClient.ioState
+    graphClient._UpdateIOState({}, {'location1OrderReadPointer': 2}, isStale=False)
+    assert previousIoState.receivedIoMap['location1OrderReadPointer'] == 1
+    assert graphClient.ioState.receivedIoMap['location1OrderReadPointer'] == 2
+    assert graphClient.ioState.version > previousIoState.version
+    assert graphClient.receivedIoMap is graphClient.ioState.receivedIoMap
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.iowatcher import IOWatcherRegistry
+
+
+def test_WatchersReceiveOnlyMatchingChangesInRegistrationOrder():
+    registry = IOWatcherRegistry()
+    notifications = []
+    registry.AddWatcher(['location*OrderReadPointer', 'isRunningProductionCycle'], lambda changes: notifications.append(('pattern', changes)))
+    registry.AddWatcher(['location1OrderReadPointer'], lambda changes: notifications.append(('exact', changes)))
+    registry.AddWatcher(['location[2]OrderResultWritePointer'], lambda changes: notifications.append(('unchanged', changes)))
+    registry.Dispatch({'location1OrderReadPointer': 2, 'location2OrderReadPointer': 3, 'location1OrderWritePointer': 4}, timestamp=1000.0)
+    assert notifications == [
+        ('pattern', {'location1OrderReadPointer': 2, 'location2OrderReadPointer': 3}),
+        ('exact', {'location1OrderReadPointer': 2}),
+    ]
+    assert registry.GetLastChangeTimestamp('location1OrderWritePointer') == 1000.0
+    assert registry.GetLastChangeTimestamp('isRunningProductionCycle') is None
+
+
+def test_RemovedWatchersAreNotNotified():
+    registry = IOWatcherRegistry()
+    notifications = []
+    patternWatcher = registry.AddWatcher(['location*OrderReadPointer'], lambda changes: notifications.append('pattern'))
+    exactWatcher = registry.AddWatcher(['location1OrderReadPointer'], lambda changes: notifications.append('exact'))
+    registry.Dispatch({'location1OrderReadPointer': 2}, timestamp=1000.0)
+    registry.RemoveWatcher(patternWatcher)
+    registry.RemoveWatcher(patternWatcher)
+    registry.Dispatch({'location1OrderReadPointer': 3}, timestamp=1001.0)
+    registry.RemoveWatcher(exactWatcher)
+    registry.Dispatch({'location1OrderReadPointer': 4}, timestamp=1002.0)
+    assert notifications == ['pattern', 'exact', 'exact']
+
+
+def test_WatcherRemovedByEarlierWatcherIsSkipped():
+    registry = IOWatcherRegistry()
+    notifications = []
+
+    def _RemoveOtherWatcher(changes):
+        notifications.append('first')
+        registry.RemoveWatcher(secondWatcher)
+    registry.AddWatcher(['startProductionCycle'], _RemoveOtherWatcher)
+    secondWatcher = registry.AddWatcher(['startProductionCycle'], lambda changes: notifications.append('second'))
+    registry.Dispatch({'startProductionCycle': True}, timestamp=1000.0)
+    assert notifications == ['first']
+
+
+def test_FailingWatcherDoesNotStopOthers():
+    registry = IOWatcherRegistry()
+    notifications = []
+    registry.AddWatcher(['startProductionCycle'], lambda changes: 1 / 0)
+    registry.AddWatcher(['start*'], notifications.append)
+    registry.Dispatch({'startProductionCycle': True}, timestamp=1000.0)
+    assert notifications == [{'startProductionCycle': True}]
+
+
+def test_ClientDispatchesChangedIOStateToCallbacks():
+    graphClient = MujinGraphClient()
+    notifications = []
+    graphClient.RegisterIOChangeCallback(['location*OrderReadPointer'], notifications.append)
+    graphClient._UpdateIOState({}, {'location1OrderReadPointer': 1, 'location1OrderWritePointer': 1}, isStale=False)
+    graphClient._UpdateIOState({}, {'location1OrderReadPointer': 1, 'location1OrderWritePointer': 2}, isStale=False)
+    graphClient._UpdateIOState({}, {'location1OrderReadPointer': 2, 'location1OrderWritePointer': 2}, isStale=False)
+    graphClient.UnregisterIOChangeCallback(notifications.append)
+    graphClient._UpdateIOState({}, {'location1OrderReadPointer': 3, 'location1OrderWritePointer': 2}, isStale=False)
+    assert notifications == [{'location1OrderReadPointer': 1}, {'location1OrderReadPointer': 2}]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from mujinproductioncycleclient.jsoncodec import GraphQLRequestTemplate, JsonCodec, MinifyGraphQLQuery
+
+
+def _CreateJsonCodec(name):
+    if name != 'json':
+        pytest.importorskip(name)
+    return JsonCodec(name)
+
+
+@pytest.mark.parametrize('name', ['orjson', 'ujson', 'json'])
+def test_RoundTripIsCompactUtf8(name):
+    jsonCodec = _CreateJsonCodec(name)
+    value = {'orderUniqueId': 'ä/1', 'orderNumber': 3, 'partSize': [0.25, 1.5, None], 'isFinished': True}
+    data = jsonCodec.Dumps(value)
+    assert data == b'{"orderUniqueId":"\xc3\xa4/1","orderNumber":3,"partSize":[0.25,1.5,null],"isFinished":true}'
+    assert jsonCodec.Loads(data) == value
+    assert jsonCodec.Loads(data.decode('utf-8')) == value
+
+
+def test_UnknownJsonLibraryIsRejected():
+    with pytest.raises(Exception, match='Unknown JSON library'):
+        JsonCodec('simplejson')
+
+
+def test_MinifyKeepsWhitespaceInStringLiterals():
+    query = '''
+        query GetControllerIOVariables($parameters: Any!) {
+            GetControllerIOVariables(parameters: $parameters, comment: "two  spaces \\" and {braces}")
+        }
+    '''
+    assert MinifyGraphQLQuery(query) == 'query GetControllerIOVariables($parameters:Any!){GetControllerIOVariables(parameters:$parameters,comment:"two  spaces \\" and {braces}")}'
+
+
+@pytest.mark.parametrize('name', ['orjson', 'ujson', 'json'])
+def test_RequestTemplateEncodesQueryAndVariables(name):
+    query = '''
+        mutation SetControllerIOVariables($parameters: Any!) {
+            CallSystemState(functionName: "SetControllerIOVariables", parameters: $parameters)
+        }
+    '''
+    requestTemplate = GraphQLRequestTemplate('SetControllerIOVariables', query, _CreateJsonCodec(name))
+    variables = {'parameters': {'ioNameValues': [['startProductionCycle', True]]}}
+    data = requestTemplate.Encode(variables)
+    assert data == (
+        b'{"query":"mutation SetControllerIOVariables($parameters:Any!){CallSystemState(functionName:\\"SetControllerIOVariables\\",parameters:$parameters)}",'
+        b'"variables":{"parameters":{"ioNameValues":[["startProductionCycle",true]]}}}'
+    )
+    assert json.loads(data) == {'query': MinifyGraphQLQuery(query), 'variables': variables}
+    assert requestTemplate.operationName == 'SetControllerIOVariables'
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.locationmanager import LocationManager
+from mujinproductioncycleclient.mockcontroller import MockMujinController
+
+
+async def _WaitUntil(predicate, timeout=5.0):
+    """ Polls predicate, since location manager updates its container state only after the controller responds to its write.
+    """
+    for index in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise asyncio.TimeoutError()
+
+
+async def _RunLocationManager(mockController, testFunction, containerIdProvider=None):
+    graphClient = MujinGraphClient(mockController.url)
+    subscriptionTask = asyncio.ensure_future(graphClient.SubscribeRobotBridgesState())
+    locationManager = LocationManager(graphClient, [
+        {'locationName': 'source', 'locationIndex': 1, 'containerId': 'sourceContainer'},
+        {'locationName': 'destination', 'locationIndex': 2},
+    ], containerIdProvider=containerIdProvider, retryInterval=0.05)
+    locationManagerTask = None
+    try:
+        await graphClient.WaitForIO('moveInLocation1Container', lambda value: value is not None, timeout=5)
+        locationManagerTask = asyncio.ensure_future(locationManager.Run())
+        return await testFunction(locationManager)
+    finally:
+        for task in (locationManagerTask, subscriptionTask):
+            if task is not None:
+                task.cancel()
+        await graphClient.CloseAsync()
+
+
+def test_ContainersAreMovedInAndOut():
+    async def _Run():
+        async with MockMujinController(locationIndices={'source': 1, 'destination': 2}) as mockController:
+            async def _MoveContainers(locationManager):
+                # mock controller waits for location1HasContainer to follow each request
+                await asyncio.wait_for(mockController._MoveContainer(1, isMoveIn=True), 5)
+                await _WaitUntil(lambda: locationManager.HasContainer('source'))
+                assert locationManager.GetContainerId('source') == 'sourceContainer'
+                assert mockController.GetIOValue('location1ContainerId') == 'sourceContainer'
+                assert not locationManager.HasContainer('destination')
+
+                await asyncio.wait_for(mockController._MoveContainer(1, isMoveIn=False), 5)
+                await _WaitUntil(lambda: not locationManager.HasContainer('source'))
+                assert locationManager.GetContainerId('source') == ''
+                return mockController.GetIOValue('location1ContainerId'), mockController.GetIOValue('location1HasContainer')
+
+            return await _RunLocationManager(mockController, _MoveContainers)
+
+    assert asyncio.run(_Run()) == ('', False)
+
+
+def test_FailedContainerIdLookupIsRetried():
+    async def _Run():
+        async with MockMujinController(locationIndices={'source': 1, 'destination': 2}) as mockController:
+            lookedUpLocationNames = []
+
+            async def _GetContainerId(locationName):
+                lookedUpLocationNames.append(locationName)
+                if len(lookedUpLocationNames) == 1:
+                    raise Exception('barcode not read')
+                return '%sContainer%d' % (locationName, len(lookedUpLocationNames))
+
+            async def _MoveContainers(locationManager):
+                await asyncio.wait_for(mockController._MoveContainer(2, isMoveIn=True), 5)
+                await _WaitUntil(lambda: locationManager.HasContainer('destination'))
+                return lookedUpLocationNames, locationManager.GetContainerId('destination'), mockController.GetIOValue('location2ContainerId')
+
+            return await _RunLocationManager(mockController, _MoveContainers, containerIdProvider=_GetContainerId)
+
+    assert asyncio.run(_Run()) == (['destination', 'destination'], 'destinationContainer2', 'destinationContainer2')
+
+
+def test_ContainerAlreadyRequestedBeforeRunningIsMovedIn():
+    async def _Run():
+        async with MockMujinController(locationIndices={'source': 1, 'destination': 2}) as mockController:
+            mockController.SetIOValues([('moveInLocation1Container', True), ('moveInLocation2Container', True)], sent=True)
+
+            async def _WaitForContainers(locationManager):
+                await _WaitUntil(lambda: locationManager.HasContainer('source') and locationManager.HasContainer('destination'))
+                assert mockController.GetIOValue('location1HasContainer') and mockController.GetIOValue('location2HasContainer')
+                return [(locationName, locationManager.GetContainerId(locationName)) for locationName in locationManager.locationNames]
+
+            return await _RunLocationManager(mockController, _WaitForContainers)
+
+    assert asyncio.run(_Run()) == [('source', 'sourceContainer'), ('destination', '')]
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.metrics import ClientMetrics, Histogram, MetricType
+from mujinproductioncycleclient.multiqueueordermanager import MultiQueueOrderManager
+from mujinproductioncycleclient.ordermanager import ProductionCycleOrderManager
+
+
+def test_FormatPrometheusText():
+    metrics = ClientMetrics(latencyBuckets=(0.1, 1.0))
+    metrics.IncrementCounter('graphql_requests_total', labels={'url': 'http://controller', 'operation': 'SetControllerIOVariables'}, helpText='Number of GraphQL requests.')
+    metrics.IncrementCounter('graphql_requests_total', 2, labels={'operation': 'SetControllerIOVariables', 'url': 'http://controller'})
+    for value in (0.05, 0.5, 2.0):
+        metrics.ObserveHistogram('graphql_request_duration_seconds', value, helpText='Latency of GraphQL requests.\nIn seconds.')
+    metrics.RegisterGauge('subscription_connected', lambda: True, labels={'url': 'http://"controller"'})
+    metrics.RegisterGauge('failing', lambda: 1 / 0)
+    assert metrics.FormatPrometheusText(prefix='test_') == '\n'.join([
+        '# TYPE test_failing gauge',
+        '# HELP test_graphql_request_duration_seconds Latency of GraphQL requests.\\nIn seconds.',
+        '# TYPE test_graphql_request_duration_seconds histogram',
+        'test_graphql_request_duration_seconds_bucket{le="0.1"} 1',
+        'test_graphql_request_duration_seconds_bucket{le="1.0"} 2',
+        'test_graphql_request_duration_seconds_bucket{le="+Inf"} 3',
+        'test_graphql_request_duration_seconds_sum 2.55',
+        'test_graphql_request_duration_seconds_count 3',
+        '# HELP test_graphql_requests_total Number of GraphQL requests.',
+        '# TYPE test_graphql_requests_total counter',
+        'test_graphql_requests_total{operation="SetControllerIOVariables",url="http://controller"} 3',
+        '# TYPE test_subscription_connected gauge',
+        'test_subscription_connected{url="http://\\"controller\\""} 1',
+    ]) + '\n'
+
+
+def test_SinksReceiveCountersAndHistograms():
+    metrics = ClientMetrics()
+    events = []
+
+    def sinkFunction(metricType, name, value, labels):
+        events.append((metricType, name, value, labels))
+    metrics.AddSink(sinkFunction)
+    metrics.IncrementCounter('io_reads_total', 3, labels={'source': 'cache'})
+    metrics.ObserveHistogram('graphql_request_duration_seconds', 0.01)
+    metrics.RemoveSink(sinkFunction)
+    metrics.IncrementCounter('io_reads_total')
+    assert events == [
+        (MetricType.Counter, 'io_reads_total', 3, {'source': 'cache'}),
+        (MetricType.Histogram, 'graphql_request_duration_seconds', 0.01, {}),
+    ]
+    assert metrics.GetCounter('io_reads_total', labels={'source': 'cache'}) == 3
+
+
+def test_HistogramPercentileIsBucketUpperBound():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    assert histogram.GetPercentile(50) is None
+    for value in (0.05, 0.5, 0.5, 2.0):
+        histogram.Observe(value)
+    assert histogram.GetPercentile(25) == 0.1
+    assert histogram.GetPercentile(50) == 1.0
+    assert histogram.GetPercentile(100) == float('inf')
+
+
+def test_ClosedOrderManagerUnregistersGauges():
+    graphClient = MujinGraphClient('http://controller')
+    orderManager = ProductionCycleOrderManager(graphClient, queueIndex=1)
+    multiQueueOrderManager = MultiQueueOrderManager(graphClient, queueIndices=[2, 3])
+    labels = {'url': 'http://controller', 'queueIndex': 1}
+    assert graphClient.metrics.GetGauge('order_queue_free_slots', labels=labels) == 0
+    assert 'queueIndex="3"' in graphClient.metrics.FormatPrometheusText()
+
+    orderManager.Close()
+    multiQueueOrderManager.Close()
+    assert graphClient.metrics.GetGauge('order_queue_free_slots', labels=labels) is None
+    assert 'queueIndex=' not in graphClient.metrics.FormatPrometheusText()
+    assert graphClient._ioChangeCallbacks == []
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from mujinproductioncycleclient.errors import ControllerResponseError, ControllerTimeoutError
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.mockcontroller import MockMujinController
+from mujinproductioncycleclient.orderjournal import JournaledOrderState, OrderJournal
+from mujinproductioncycleclient.ordermanager import ProductionCycleOrderManager
+
+
+def _GetOrderStates(orderJournal, queueIndices=(1, 2, None)):
+    return [(order.orderUniqueId, order.queueIndex, order.slot, order.state) for order in orderJournal.GetOrdersOfQueues(queueIndices)]
+
+
+def _RecordOrders(orderJournal):
+    orderJournal.RecordPending({'orderUniqueId': 'order0'}, None)
+    orderJournal.RecordPending({'orderUniqueId': 'order1'}, 1)
+    orderJournal.RecordReserved({'orderUniqueId': 'order1'}, 1, 3)
+    orderJournal.RecordReserved({'orderUniqueId': 'order2'}, 2, 1)
+    orderJournal.RecordWritten(['order2'])
+
+
+def test_InFlightOrdersAreRecoveredWhenReopened(tmp_path):
+    path = str(tmp_path / 'orders.journal')
+    orderJournal = OrderJournal(path)
+    _RecordOrders(orderJournal)
+    orderJournal.RecordReserved({'orderUniqueId': 'order3'}, 1, 4)
+    orderJournal.RecordRemoved(['order3'])
+    orderJournal.Close()
+
+    orderJournal = OrderJournal(path)
+    try:
+        assert _GetOrderStates(orderJournal) == [
+            ('order0', None, None, JournaledOrderState.Pending),
+            ('order1', 1, 3, JournaledOrderState.Reserved),
+            ('order2', 2, 1, JournaledOrderState.Written),
+        ]
+        assert [order.orderEntry for order in orderJournal.GetOrders(1)] == [{'orderUniqueId': 'order1'}]
+        assert [order.orderUniqueId for order in orderJournal.GetOrdersOfQueues([2, None])] == ['order0', 'order2']
+    finally:
+        orderJournal.Close()
+
+
+def test_TornRecordIsTruncatedWhenReopened(tmp_path):
+    path = str(tmp_path / 'orders.journal')
+    orderJournal = OrderJournal(path)
+    _RecordOrders(orderJournal)
+    orderJournal.Close()
+    with open(path, 'rb') as journalFile:
+        size = len(journalFile.read())
+
+    # record header promising 16 bytes of payload followed by only 3 of them
+    with open(path, 'ab') as journalFile:
+        journalFile.write(b'\x10\x00\x00\x00\x00\x00\x00\x00abc')
+    orderJournal = OrderJournal(path)
+    try:
+        assert [order.orderUniqueId for order in orderJournal.GetOrdersOfQueues([1, 2, None])] == ['order0', 'order1', 'order2']
+        with open(path, 'rb') as journalFile:
+            assert len(journalFile.read()) == size
+
+        # records appended after the truncated one are recovered
+        orderJournal.RecordRemoved(['order0'])
+        orderJournal.Close()
+        orderJournal = OrderJournal(path)
+        assert [order.orderUniqueId for order in orderJournal.GetOrdersOfQueues([1, 2, None])] == ['order1', 'order2']
+    finally:
+        orderJournal.Close()
+
+
+def test_CompactionKeepsOnlyInFlightOrders(tmp_path):
+    path = str(tmp_path / 'orders.journal')
+    orderJournal = OrderJournal(path, compactionThreshold=8)
+    _RecordOrders(orderJournal)
+    for index in range(3):
+        orderJournal.RecordReserved({'orderUniqueId': 'removed%d' % index}, 1, index + 1)
+    orderJournal.RecordRemoved(['removed0', 'removed1', 'removed2'])
+    orderJournal.Sync()
+    assert orderJournal.numCompactions == 1
+    orderStates = _GetOrderStates(orderJournal)
+    orderJournal.Close()
+
+    with open(path, 'rb') as journalFile:
+        data = journalFile.read()
+    assert b'removed' not in data
+    orderJournal = OrderJournal(path)
+    try:
+        assert _GetOrderStates(orderJournal) == orderStates
+    finally:
+        orderJournal.Close()
+
+
+def test_ReservedOrderOfUnknownWriteOutcomeIsResubmittedAfterRestart(tmp_path):
+    path = str(tmp_path / 'orders.journal')
+
+    async def _RunOrderManager(mockController, failWrite=None):
+        graphClient = MujinGraphClient(mockController.url)
+        subscriptionTask = asyncio.ensure_future(graphClient.SubscribeRobotBridgesState())
+        orderJournal = OrderJournal(path)
+        try:
+            await graphClient.WaitForIO('isRunningProductionCycle', lambda value: value is not None, timeout=5)
+            orderManager = ProductionCycleOrderManager(graphClient, orderJournal=orderJournal)
+            await orderManager.InitializeOrderPointers()
+            if failWrite is not None:
+                await failWrite(graphClient, orderManager)
+                await orderManager.QueueOrdersAsync([{'orderUniqueId': 'order2'}])
+            else:
+                # recovered orders are resubmitted in the background
+                for index in range(100):
+                    if all(order.state == JournaledOrderState.Written for order in orderJournal.GetOrders(1)):
+                        break
+                    await asyncio.sleep(0.01)
+            return _GetOrderStates(orderJournal)
+        finally:
+            orderJournal.Close()
+            subscriptionTask.cancel()
+            await graphClient.CloseAsync()
+
+    async def _FailWrites(graphClient, orderManager):
+        ioWriteBatcher = graphClient._ioWriteBatcher
+        setControllerIOVariablesAsync = ioWriteBatcher._setControllerIOVariablesAsync
+        errors = [ControllerTimeoutError('injected timeout'), ControllerResponseError('injected rejection', response={'errors': [{'message': 'rejected'}]})]
+
+        async def _FailOrderWrite(ioNameValues):
+            if len(errors) > 0 and any(ioName.startswith('productionQueue') for ioName, ioValue in ioNameValues):
+                raise errors.pop(0)
+            await setControllerIOVariablesAsync(ioNameValues)
+        ioWriteBatcher._setControllerIOVariablesAsync = _FailOrderWrite
+
+        for orderUniqueId in ('order0', 'order1'):
+            try:
+                await orderManager.QueueOrdersAsync([{'orderUniqueId': orderUniqueId}])
+            except (ControllerTimeoutError, ControllerResponseError):
+                pass
+        ioWriteBatcher._setControllerIOVariablesAsync = setControllerIOVariablesAsync
+
+    async def _Run():
+        async with MockMujinController(queueLength=10) as mockController:
+            orderStates = await _RunOrderManager(mockController, failWrite=_FailWrites)
+            # timed out write may have reached the controller, rejected write did not
+            assert orderStates == [
+                ('order0', 1, 1, JournaledOrderState.Reserved),
+                ('order2', 1, 1, JournaledOrderState.Written),
+            ]
+
+            orderStates = await _RunOrderManager(mockController)
+            queuedOrderUniqueIds = [(orderEntry or {}).get('orderUniqueId') for orderEntry in mockController.GetIOValue('productionQueue1Order')]
+            return orderStates, queuedOrderUniqueIds
+
+    orderStates, queuedOrderUniqueIds = asyncio.run(_Run())
+    # order0 never reached its reserved order queue entry, which order2 took after the write pointer was resynced, so it is written again after order2
+    assert queuedOrderUniqueIds[:3] == ['order2', 'order0', None]
+    assert orderStates == [
+        ('order2', 1, 1, JournaledOrderState.Written),
+        ('order0', 1, 2, JournaledOrderState.Written),
+    ]
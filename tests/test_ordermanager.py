@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from mujinproductioncycleclient.errors import ControllerTimeoutError
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.mockcontroller import MockMujinController
+from mujinproductioncycleclient.multiqueueordermanager import MultiQueueOrderManager
+from mujinproductioncycleclient.ordermanager import ProductionCycleOrderManager
+
+
+async def _ConnectClient(mockController):
+    """ Returns a MujinGraphClient subscribed to mockController, and its subscription task.
+    """
+    graphClient = MujinGraphClient(mockController.url)
+    subscriptionTask = asyncio.ensure_future(graphClient.SubscribeRobotBridgesState())
+    await graphClient.WaitForIO('isRunningProductionCycle', lambda value: value is not None, timeout=5)
+    return graphClient, subscriptionTask
+
+
+async def _DisconnectClient(graphClient, subscriptionTask):
+    subscriptionTask.cancel()
+    await graphClient.CloseAsync()
+
+
+def _GetQueuedOrderUniqueIds(mockController, queueIndex=1):
+    return [(orderEntry or {}).get('orderUniqueId') for orderEntry in mockController.GetIOValue('productionQueue%dOrder' % queueIndex)]
+
+
+def test_OrderAndResultPointersWrapAroundQueueEnd():
+    async def _Run():
+        async with MockMujinController(queueLength=4) as mockController:
+            # start with all pointers on the last order queue entry
+            mockController.SetIOValues([
+                ('location1OrderReadPointer', 4),
+                ('location1OrderWritePointer', 4),
+                ('location1OrderResultReadPointer', 4),
+                ('location1OrderResultWritePointer', 4),
+            ])
+            graphClient, subscriptionTask = await _ConnectClient(mockController)
+            try:
+                orderManager = ProductionCycleOrderManager(graphClient)
+                await orderManager.InitializeOrderPointers()
+
+                # one order queue entry is always left free, so only three of four order entries fit
+                rejectedOrderEntries = await orderManager.QueueOrdersAsync([{'orderUniqueId': 'order%d' % index} for index in range(4)])
+                assert rejectedOrderEntries == [{'orderUniqueId': 'order3'}]
+                assert _GetQueuedOrderUniqueIds(mockController) == ['order1', 'order2', None, 'order0']
+                assert mockController.GetIOValue('location1OrderWritePointer') == 3
+
+                await graphClient.SetControllerIOVariablesAsync([('startProductionCycle', True)])
+                await graphClient.WaitForIO('location1OrderResultWritePointer', lambda value: value == 3, timeout=5)
+                resultEntries = await orderManager.DequeueOrderResultsAsync()
+                assert [resultEntry['orderUniqueId'] for resultEntry in resultEntries] == ['order0', 'order1', 'order2']
+                assert mockController.GetIOValue('location1OrderResultReadPointer') == 3
+                assert orderManager.numUnreadOrderResults == 0
+            finally:
+                await _DisconnectClient(graphClient, subscriptionTask)
+
+    asyncio.run(_Run())
+
+
+def test_WaitForOrderResultWaitsWhileResultWritePointerIsInvalid():
+    async def _Run():
+        async with MockMujinController(queueLength=10) as mockController:
+            graphClient, subscriptionTask = await _ConnectClient(mockController)
+            try:
+                orderManager = ProductionCycleOrderManager(graphClient)
+                await orderManager.InitializeOrderPointers()
+
+                mockController.SetIOValues([('location1OrderResultWritePointer', 11)])
+                await graphClient.WaitForIO('location1OrderResultWritePointer', lambda value: value == 11, timeout=5)
+                with pytest.raises(asyncio.TimeoutError):
+                    await orderManager.WaitForOrderResult(timeout=0.1)
+                assert await orderManager.DequeueOrderResultsAsync() == []
+
+                mockController.SetIOValues([('productionQueue1Result[0]', {'orderUniqueId': 'order0'}), ('location1OrderResultWritePointer', 2)])
+                await orderManager.WaitForOrderResult(timeout=5)
+                return await orderManager.DequeueOrderResultsAsync()
+            finally:
+                await _DisconnectClient(graphClient, subscriptionTask)
+
+    assert asyncio.run(_Run()) == [{'orderUniqueId': 'order0'}]
+
+
+def test_ConcurrentDequeuesReadEachResultEntryOnce():
+    async def _Run():
+        async with MockMujinController(numQueues=2, queueLength=10, requestDelay=0.02) as mockController:
+            graphClient, subscriptionTask = await _ConnectClient(mockController)
+            try:
+                orderManagers = [ProductionCycleOrderManager(graphClient), MultiQueueOrderManager(graphClient, queueIndices=[2])]
+                for orderManager in orderManagers:
+                    await orderManager.InitializeOrderPointers()
+                await orderManagers[0].QueueOrdersAsync([{'orderUniqueId': 'order%d' % index} for index in range(3)])
+                await orderManagers[1].QueueOrdersAsync([{'orderUniqueId': 'order%d' % index} for index in range(3, 6)])
+                await graphClient.SetControllerIOVariablesAsync([('startProductionCycle', True)])
+                await graphClient.WaitForIO('location1OrderResultWritePointer', lambda value: value == 4, timeout=5)
+                await graphClient.WaitForIO('location2OrderResultWritePointer', lambda value: value == 4, timeout=5)
+
+                dequeuedOrderUniqueIds = []
+                for orderManager in orderManagers:
+                    resultEntriesOfDequeues = await asyncio.gather(orderManager.DequeueOrderResultsAsync(), orderManager.DequeueOrderResultsAsync())
+                    dequeuedOrderUniqueIds.append([[resultEntry['orderUniqueId'] for resultEntry in resultEntries] for resultEntries in resultEntriesOfDequeues])
+                return dequeuedOrderUniqueIds
+            finally:
+                await _DisconnectClient(graphClient, subscriptionTask)
+
+    assert asyncio.run(_Run()) == [
+        [['order0', 'order1', 'order2'], []],
+        [['order3', 'order4', 'order5'], []],
+    ]
+
+
+def _RunWritePointerResyncAfterFailedWrite(createOrderManager):
+    """ Fails the first write of an order entry while a second one is pipelined behind it, and queues a third one after both failed.
+
+    Returns:
+        tuple(list, int, int, list): Outcome of each queuing, order write pointer of the order manager, order write pointer of mock controller and order unique ids in order queue of mock controller.
+    """
+    async def _Run():
+        async with MockMujinController(numQueues=2, queueLength=10) as mockController:
+            graphClient, subscriptionTask = await _ConnectClient(mockController)
+            try:
+                orderManager = createOrderManager(graphClient)
+                await orderManager.InitializeOrderPointers()
+
+                # fail the first batch writing an order entry, slowly enough for the next order entry to be pipelined behind it
+                ioWriteBatcher = graphClient._ioWriteBatcher
+                setControllerIOVariablesAsync = ioWriteBatcher._setControllerIOVariablesAsync
+                failedWrites = []
+
+                async def _FailFirstOrderWrite(ioNameValues):
+                    if len(failedWrites) == 0 and any(ioName.startswith('productionQueue') for ioName, ioValue in ioNameValues):
+                        failedWrites.append(ioNameValues)
+                        await asyncio.sleep(0.05)
+                        raise ControllerTimeoutError('injected timeout')
+                    await setControllerIOVariablesAsync(ioNameValues)
+                ioWriteBatcher._setControllerIOVariablesAsync = _FailFirstOrderWrite
+
+                async def _QueueOrder(orderUniqueId):
+                    try:
+                        await orderManager.QueueOrdersAsync([{'orderUniqueId': orderUniqueId}])
+                    except ControllerTimeoutError:
+                        return 'failed'
+                    return 'queued'
+
+                firstTask = asyncio.ensure_future(_QueueOrder('order0'))
+                await asyncio.sleep(0.01)
+                outcomes = await asyncio.gather(firstTask, _QueueOrder('order1'))
+                outcomes.append(await _QueueOrder('order2'))
+
+                queueOrderManager = orderManager.GetOrderManager(1) if isinstance(orderManager, MultiQueueOrderManager) else orderManager
+                return outcomes, queueOrderManager._orderWritePointer, mockController.GetIOValue('location1OrderWritePointer'), _GetQueuedOrderUniqueIds(mockController)
+            finally:
+                await _DisconnectClient(graphClient, subscriptionTask)
+
+    return asyncio.run(_Run())
+
+
+def test_OrderWritePointerIsResyncedAfterFailedWrite():
+    outcomes, orderWritePointer, controllerOrderWritePointer, queuedOrderUniqueIds = _RunWritePointerResyncAfterFailedWrite(ProductionCycleOrderManager)
+    # pipelined write behind the failed one is not sent, so the next order entry goes to the entry the failed write left unacknowledged
+    assert outcomes == ['failed', 'failed', 'queued']
+    assert orderWritePointer == controllerOrderWritePointer == 2
+    assert queuedOrderUniqueIds[:2] == ['order2', None]
+
+
+def test_MultiQueueOrderWritePointerIsResyncedAfterFailedWrite():
+    outcomes, orderWritePointer, controllerOrderWritePointer, queuedOrderUniqueIds = _RunWritePointerResyncAfterFailedWrite(lambda graphClient: MultiQueueOrderManager(graphClient, queueIndices=[1]))
+    assert outcomes == ['failed', 'failed', 'queued']
+    assert orderWritePointer == controllerOrderWritePointer == 2
+    assert queuedOrderUniqueIds[:2] == ['order2', None]
+
+
+def test_SubmittedOrderWaitsWhileOrderWritePointerCannotBeResynced():
+    async def _Run():
+        async with MockMujinController(queueLength=10) as mockController:
+            graphClient, subscriptionTask = await _ConnectClient(mockController)
+            try:
+                orderManager = ProductionCycleOrderManager(graphClient)
+                await orderManager.InitializeOrderPointers()
+
+                # reading back the order write pointer fails once before the order can be written
+                resyncOrderWritePointerAsync = orderManager.ResyncOrderWritePointerAsync
+                failedResyncs = []
+
+                async def _FailFirstResync():
+                    if len(failedResyncs) == 0:
+                        failedResyncs.append(True)
+                        raise ControllerTimeoutError('injected timeout')
+                    await resyncOrderWritePointerAsync()
+                orderManager.ResyncOrderWritePointerAsync = _FailFirstResync
+
+                await asyncio.wait_for(orderManager.SubmitOrder({'orderUniqueId': 'order0'}), 5)
+                return len(failedResyncs), _GetQueuedOrderUniqueIds(mockController)[:2]
+            finally:
+                await _DisconnectClient(graphClient, subscriptionTask)
+
+    assert asyncio.run(_Run()) == (1, ['order0', None])
+
+
+def test_CancelledSubmissionIsDroppedWhileOrderQueueStaysFull():
+    async def _Run():
+        async with MockMujinController(queueLength=2) as mockController:
+            graphClient, subscriptionTask = await _ConnectClient(mockController)
+            try:
+                orderManager = ProductionCycleOrderManager(graphClient, maxPendingOrders=1)
+                await orderManager.InitializeOrderPointers()
+                await orderManager.SubmitOrder({'orderUniqueId': 'order0'})
+
+                # order queue is full and production cycle is not running, so the order read pointer never changes
+                with pytest.raises(asyncio.TimeoutError):
+                    await asyncio.wait_for(orderManager.SubmitOrder({'orderUniqueId': 'order1'}), 0.1)
+                for index in range(300):
+                    if orderManager.numPendingOrders == 0:
+                        break
+                    await asyncio.sleep(0.01)
+                numPendingOrders = orderManager.numPendingOrders
+
+                # the local pending queue has room again
+                submissionTask = asyncio.ensure_future(orderManager.SubmitOrder({'orderUniqueId': 'order2'}))
+                await asyncio.sleep(0.05)
+                submissionTask.cancel()
+                return numPendingOrders, orderManager.numPendingOrders, orderManager.orderTracker.GetTrackedOrder('order1')
+            finally:
+                await _DisconnectClient(graphClient, subscriptionTask)
+
+    assert asyncio.run(_Run()) == (0, 1, None)
+
+
+def test_QueueOrdersToUnmanagedQueueIndexRaises():
+    orderManager = MultiQueueOrderManager(MujinGraphClient(), queueIndices=[1, 2])
+    with pytest.raises(Exception, match='Queue index 3 is not managed'):
+        orderManager.QueueOrders([{'orderUniqueId': 'order0'}], queueIndex=3)
+    with pytest.raises(Exception, match='Queue index 3 is not managed'):
+        asyncio.run(orderManager.QueueOrdersAsync([{'orderUniqueId': 'order0'}], queueIndex=3))
+    assert orderManager.orderTracker.GetTrackedOrder('order0') is None
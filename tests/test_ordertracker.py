@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from mujinproductioncycleclient.ordertracker import OrderTracker
+
+
+def _CompleteOrder(orderTracker, orderUniqueId, queuedToResult):
+    """ Tracks an order through its lifecycle, taking queuedToResult seconds split evenly between the stages.
+    """
+    trackedOrder = orderTracker.AddOrder({'orderUniqueId': orderUniqueId})
+    trackedOrder.queuedTimestamp = 1000.0
+    orderTracker.MarkWriteAcknowledged([orderUniqueId], timestamp=1000.0 + queuedToResult / 4.0)
+    orderTracker.MarkPickedUp(orderUniqueId, timestamp=1000.0 + queuedToResult / 2.0)
+    return orderTracker.MarkResultReceived({'orderUniqueId': orderUniqueId, 'orderCycleFinishCode': 0}, timestamp=1000.0 + queuedToResult)
+
+
+def test_LatencyPercentilesAreNearestRank():
+    orderTracker = OrderTracker()
+    for index in range(10):
+        _CompleteOrder(orderTracker, 'order%d' % index, float(index + 1))
+    latencyStatistics = orderTracker.GetLatencyStatistics(percentiles=(0, 50, 90, 99, 100))
+    assert latencyStatistics['queuedToResult'] == {'count': 10, 'percentiles': {0: 1.0, 50: 5.0, 90: 9.0, 99: 10.0, 100: 10.0}}
+    assert latencyStatistics['pickedUpToResult']['percentiles'][50] == 2.5
+    assert orderTracker.numTrackedOrders == 0
+
+
+def test_LatencyPercentilesWithoutSamplesAreNone():
+    latencyStatistics = OrderTracker().GetLatencyStatistics(percentiles=(50,))
+    assert latencyStatistics['queuedToResult'] == {'count': 0, 'percentiles': {50: None}}
+
+
+def test_OnlyRecentLatencySamplesAreKept():
+    orderTracker = OrderTracker(maxLatencySamples=2)
+    for index, queuedToResult in enumerate((100.0, 1.0, 2.0)):
+        _CompleteOrder(orderTracker, 'order%d' % index, queuedToResult)
+    assert orderTracker.GetLatencyStatistics(percentiles=(100,))['queuedToResult'] == {'count': 2, 'percentiles': {100: 2.0}}
+
+
+def test_ResultFutureResolvesWithMatchingResultEntry():
+    async def _Run():
+        orderTracker = OrderTracker()
+        resultFuture = orderTracker.AddOrder({'orderUniqueId': 'order0'}, createResultFuture=True).resultFuture
+        assert orderTracker.MarkResultReceived({'orderUniqueId': 'unknown'}) is None
+        assert not resultFuture.done()
+        orderTracker.MarkResultReceived({'orderUniqueId': 'order0', 'orderCycleFinishCode': 0})
+        return await resultFuture
+
+    assert asyncio.run(_Run()) == {'orderUniqueId': 'order0', 'orderCycleFinishCode': 0}
+
+
+def test_OldestOrdersAreEvictedAboveMaxTrackedOrders():
+    async def _Run():
+        orderTracker = OrderTracker(maxTrackedOrders=2)
+        trackedOrders = [orderTracker.AddOrder({'orderUniqueId': 'order%d' % index}, createResultFuture=True) for index in range(3)]
+        return orderTracker, trackedOrders
+
+    orderTracker, trackedOrders = asyncio.run(_Run())
+    assert orderTracker.numTrackedOrders == 2
+    assert orderTracker.GetTrackedOrder('order0') is None
+    assert trackedOrders[0].resultFuture.cancelled()
+    assert not trackedOrders[1].resultFuture.done()
+    assert orderTracker.GetResultFuture('order2') is trackedOrders[2].resultFuture
+    assert orderTracker.AddOrder({'orderNumber': 1}) is None
+
+
+def test_FailedWriteFailsResultFuture():
+    async def _Run():
+        orderTracker = OrderTracker()
+        resultFuture = orderTracker.AddOrder({'orderUniqueId': 'order0'}, createResultFuture=True).resultFuture
+        orderTracker.MarkWriteFailed(['order0'], Exception('write failed'))
+        return orderTracker, resultFuture
+
+    orderTracker, resultFuture = asyncio.run(_Run())
+    assert str(resultFuture.exception()) == 'write failed'
+    assert orderTracker.numTrackedOrders == 0
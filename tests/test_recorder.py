@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+
+import pytest
+
+from mujinproductioncycleclient.graphqlclient import MujinGraphClient
+from mujinproductioncycleclient.mockcontroller import MockMujinController
+from mujinproductioncycleclient.recorder import GetRecordingFiles, ReadRecording, RecordType, StreamRecorder, StreamReplayer
+
+
+def test_MaxFilesBelowOneIsRejected(tmp_path):
+    basePath = str(tmp_path / 'recording')
+    with pytest.raises(Exception, match='at least 1'):
+        StreamRecorder(basePath, maxFiles=0)
+    assert GetRecordingFiles(basePath) == []
+
+
+def test_MaxFilesOfOneKeepsOnlyCurrentFile(tmp_path):
+    basePath = str(tmp_path / 'recording')
+    recorder = StreamRecorder(basePath, maxFileSize=32, maxFiles=1, bufferSize=0)
+    for index in range(3):
+        recorder.Record(RecordType.GraphQLRequest, b'request%d' % index + b'.' * 32, timestamp=index)
+    recorder.Close()
+    # each record fills a file, so the last file is empty
+    assert [path.rsplit('.', 1)[1] for path in GetRecordingFiles(basePath)] == ['000003']
+    assert list(ReadRecording(basePath)) == []
+
+
+def test_RecordsRotateAcrossFilesInOrder(tmp_path):
+    basePath = str(tmp_path / 'recording')
+    records = [(RecordType.GraphQLRequest, 1000.0 + index, b'request%d' % index + b'.' * 40) for index in range(5)]
+    recorder = StreamRecorder(basePath, maxFileSize=100, maxFiles=2, bufferSize=0)
+    for recordType, timestamp, payload in records:
+        recorder.Record(recordType, payload, timestamp=timestamp)
+    recorder.Close()
+    # 8 byte magic and two 61 byte records exceed maxFileSize, oldest file is deleted
+    assert [path.rsplit('.', 1)[1] for path in GetRecordingFiles(basePath)] == ['000001', '000002']
+    assert list(ReadRecording(basePath)) == records[2:]
+
+    # new recorder continues after existing files
+    recorder = StreamRecorder(basePath, maxFileSize=100)
+    recorder.Record(RecordType.GraphQLResponse, b'response', timestamp=2000.0)
+    recorder.Close()
+    assert [path.rsplit('.', 1)[1] for path in GetRecordingFiles(basePath)] == ['000001', '000002', '000003']
+    assert list(ReadRecording(basePath))[-1] == (RecordType.GraphQLResponse, 2000.0, b'response')
+
+
+def test_CompressedRecordsReadBackUnchanged(tmp_path):
+    records = [
+        (RecordType.SubscriptionMessage, 1000.0, b'{"type":"data","payload":{"data":{}}}' + b' ' * 1000),
+        (RecordType.GraphQLRequest, 1001.0, b'short'),
+        (RecordType.GraphQLResponse, 1002.0, os.urandom(512)),
+    ]
+    sizes = []
+    for compressionLevel in (None, 6):
+        basePath = str(tmp_path / ('recording%s' % compressionLevel))
+        recorder = StreamRecorder(basePath, compressionLevel=compressionLevel, compressionMinSize=256)
+        for recordType, timestamp, payload in records:
+            recorder.Record(recordType, payload, timestamp=timestamp)
+        recorder.Close()
+        assert list(ReadRecording(basePath)) == records
+        sizes.append(sum(os.path.getsize(path) for path in GetRecordingFiles(basePath)))
+    # only the compressible payload is stored compressed
+    assert sizes[0] - sizes[1] > 900
+
+
+def test_TruncatedRecordEndsRecording(tmp_path):
+    basePath = str(tmp_path / 'recording')
+    recorder = StreamRecorder(basePath)
+    recorder.Record(RecordType.GraphQLRequest, 'request', timestamp=1000.0)
+    recorder.Record(RecordType.GraphQLResponse, 'response', timestamp=1001.0)
+    recorder.Close()
+    path, = GetRecordingFiles(basePath)
+    with open(path, 'r+b') as recordingFile:
+        recordingFile.truncate(os.path.getsize(path) - 1)
+    assert list(ReadRecording(basePath)) == [(RecordType.GraphQLRequest, 1000.0, b'request')]
+
+
+def test_ReplayReproducesRecordedIOState(tmp_path):
+    basePath = str(tmp_path / 'recording')
+
+    async def _Record():
+        async with MockMujinController() as mockController:
+            recorder = StreamRecorder(basePath)
+            graphClient = MujinGraphClient(mockController.url, recorder=recorder)
+            subscriptionTask = asyncio.ensure_future(graphClient.SubscribeRobotBridgesState())
+            try:
+                await graphClient.WaitForIO('isRunningProductionCycle', lambda value: value is not None, timeout=5)
+                await graphClient.SetControllerIOVariablesBatched([('location1ContainerId', 'container1')])
+                await graphClient.WaitForIO('location1ContainerId', lambda value: value == 'container1', timeout=5)
+                return dict(graphClient.receivedIoMap), dict(graphClient.sentIoMap)
+            finally:
+                subscriptionTask.cancel()
+                await graphClient.CloseAsync()
+                recorder.Close()
+
+    async def _Replay():
+        graphClient = MujinGraphClient()
+        changedContainerIds = []
+        graphClient.RegisterIOChangeCallback(['location1ContainerId'], lambda changes: changedContainerIds.append(changes['location1ContainerId']))
+        replayer = StreamReplayer(basePath, speed=None)
+        numReplayedMessages = await replayer.Replay(graphClient)
+        return numReplayedMessages, changedContainerIds, dict(graphClient.receivedIoMap), dict(graphClient.sentIoMap)
+
+    receivedIoMap, sentIoMap = asyncio.run(_Record())
+    recordTypes = [recordType for recordType, timestamp, payload in ReadRecording(basePath)]
+    assert RecordType.GraphQLRequest in recordTypes and RecordType.GraphQLResponse in recordTypes
+    numReplayedMessages, changedContainerIds, replayedReceivedIoMap, replayedSentIoMap = asyncio.run(_Replay())
+    assert numReplayedMessages == recordTypes.count(RecordType.SubscriptionMessage)
+    assert changedContainerIds == ['container1']
+    assert replayedReceivedIoMap == receivedIoMap
+    assert replayedSentIoMap == sentIoMap